@@ -23,6 +23,21 @@ def create_app():
     # Initialiser MySQL
     mysql.init_app(app)
     
+    # Barcode numbers come from a hi/lo table on MySQL
+    from app.utils.sequences import use_mysql_hilo
+    use_mysql_hilo(mysql)
+    
+    # Container fill levels are maintained in container.CurrentAmount
+    from app.utils.container_fill import mysql_ensure_current_amount
+    try:
+        with app.app_context():
+            cursor = mysql.connection.cursor()
+            if mysql_ensure_current_amount(cursor):
+                mysql.connection.commit()
+            cursor.close()
+    except Exception as e:
+        print(f"Could not check container.CurrentAmount: {e}")
+    
     # Tilføj context processor for current_user
     from app.utils.auth import get_current_user
     @app.context_processor
@@ -63,6 +63,25 @@ def create_app():
     app.register_blueprint(system_mssql_bp)
     app.register_blueprint(printer_mssql_bp)
     
+    # Container fill levels are maintained in container.CurrentAmount
+    from app.utils.mssql_db import mssql_db
+    from app.utils.container_fill import ensure_current_amount
+    try:
+        with mssql_db.transaction() as cursor:
+            if ensure_current_amount(cursor):
+                print("Added container.CurrentAmount and backfilled it from containersample")
+    except Exception as e:
+        print(f"Could not check container.CurrentAmount: {e}")
+    
+    # Warm the in-memory search index in the background
+    if os.getenv('SEARCH_INDEX_ENABLED', 'true').lower() == 'true':
+        from app.utils.search_index import warm_search_index
+        warm_search_index()
+    
+    # Load reference data (units, suppliers, users, locations, ...) in the background
+    from app.utils.reference_cache import warm_reference_cache_async
+    warm_reference_cache_async()
+    
     # Registrer error handlers
     @app.errorhandler(404)
     def page_not_found(e):
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, jsonify, request
 from app.services.container_service import ContainerService
 from app.utils.auth import get_current_user
 from app.utils.validators import validate_container_data
+from app.utils.container_bulk import parse_container_items, ContainerBatchError
 
 container_bp = Blueprint('container', __name__)
 
@@ -11,8 +12,17 @@ def init_container(blueprint, mysql):
     @blueprint.route('/containers')
     def containers():
         try:
-            # Hent containere
-            containers = container_service.get_all_containers()
+            # Hent containere (one page, filtered and sorted in SQL)
+            containers, pagination = container_service.get_containers_page(
+                page=request.args.get('page', 1, type=int),
+                per_page=request.args.get('per_page', 50, type=int),
+                type_id=request.args.get('type_id', type=int),
+                location_id=request.args.get('location_id', type=int),
+                status=request.args.get('status') or None,
+                fill=request.args.get('fill') or None,
+                sort_by=request.args.get('sort_by', 'container_id'),
+                sort_order=request.args.get('sort_order', 'DESC')
+            )
             
             # Convert to format used by template
             containers_for_template = []
@@ -65,6 +75,7 @@ def init_container(blueprint, mysql):
             
             return render_template('sections/containers.html', 
                                 containers=containers_for_template,
+                                pagination=pagination,
                                 container_types=container_types,
                                 available_samples=available_samples,
                                 locations=locations)
@@ -141,9 +152,43 @@ def init_container(blueprint, mysql):
             current_user = get_current_user()
             user_id = current_user['UserID']
             
-            # Create container via service (includes automatic label printing)
-            result = container_service.create_container(data, user_id)
+            # Create container(s) via service - count > 1 creates several of the same type at once
+            result = container_service.create_containers(
+                data, user_id, count=data.get('count', 1), samples=data.get('samples')
+            )
+            if result.get('success'):
+                result['container_id'] = result['container_ids'][0]
+            
+            return jsonify(result)
+        except Exception as e:
+            print(f"API error: {e}")
+            import traceback
+            traceback.print_exc()
+            return jsonify({'success': False, 'error': str(e)}), 500
+    
+    @blueprint.route('/api/containers/<int:container_id>/samples:bulk', methods=['POST'])
+    def bulk_update_container_samples(container_id):
+        try:
+            data = request.get_json(silent=True) or {}
+            action = data.get('action', 'add')
+            if action not in ('add', 'remove'):
+                return jsonify({'success': False, 'error': "action must be 'add' or 'remove'"}), 400
+            try:
+                items = parse_container_items(data.get('samples'))
+            except ContainerBatchError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            
+            current_user = get_current_user()
+            user_id = current_user['UserID']
+            
+            if action == 'add':
+                result = container_service.bulk_add_samples(container_id, items, user_id, data.get('force_add', False))
+            else:
+                result = container_service.bulk_remove_samples(container_id, items, user_id)
             
+            if 'samples' in result and not result['success']:
+                result['error'] = result['failed'][0]['error'] if result['failed'] else 'Nothing to do'
+            result['action'] = action
             return jsonify(result)
         except Exception as e:
             print(f"API error: {e}")
@@ -512,4 +557,4 @@ def init_container(blueprint, mysql):
             print(f"API error getting container details: {e}")
             import traceback
             traceback.print_exc()
-            return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+            return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
@@ -1,15 +1,127 @@
 from flask import Blueprint, render_template, jsonify, request
-from app.utils.mssql_db import mssql_db
+from app.utils.mssql_db import mssql_db, id_list_filter, id_list_param
+from app.utils.search_index import search_index, index_container, remove_document, CONTAINER
+from app.utils.sample_picker import picker_search_condition, like_prefix, SEARCH_CANDIDATE_LIMIT
+from app.utils.mssql_pagination import encode_cursor, decode_cursor
+from app.utils.reference_cache import get_container_types as cached_container_types, get_locations, bump_version, CONTAINER_TYPE
+from app.utils.stock import add_to_container
+from app.utils.container_fill import container_fill, remove_sample_from_containers
+from app.utils.container_details import (
+    get_container_details as cached_container_details, parse_include,
+    invalidate_container_details, clear_container_details
+)
+from app.utils.container_bulk import (
+    create_containers, parse_container_count, parse_container_contents, parse_container_items,
+    bulk_add_to_container, bulk_remove_from_container, ContainerBatchError, ContainerCapacityError
+)
 from datetime import datetime
+import re
 
 container_mssql_bp = Blueprint('container_mssql', __name__)
 
+# Container page fill filters, on the maintained [container].[CurrentAmount]
+CONTAINER_FILL_LEVELS = {
+    'empty': "c.[CurrentAmount] = 0",
+    'partial': "c.[CurrentAmount] > 0 AND (ISNULL(c.[ContainerCapacity], 0) = 0 OR c.[CurrentAmount] < c.[ContainerCapacity])",
+    'full': "c.[ContainerCapacity] > 0 AND c.[CurrentAmount] >= c.[ContainerCapacity]",
+    'available': "ISNULL(c.[ContainerCapacity], 0) = 0 OR c.[CurrentAmount] < c.[ContainerCapacity]"
+}
+
+CONTAINERS_PER_PAGE = 50
+
 @container_mssql_bp.route('/containers')
 def containers():
+    """
+    Page shell only: the container table and the sample picker are filled
+    from /api/containers and /api/containers/available-samples page by page.
+    """
     try:
-        # Get containers with details
-        containers_results = mssql_db.execute_query("""
-            SELECT 
+        # Container types and storage locations come from the reference cache
+        container_types = cached_container_types()
+        locations = sorted(
+            get_locations(),
+            key=lambda l: (l['Rack'] is not None, l['Rack'] or 0, l['Section'] or 0, l['Shelf'] or 0)
+        )
+        
+        return render_template('sections/containers.html', 
+                            containers=[],
+                            container_types=container_types,
+                            available_samples=[],
+                            locations=locations,
+                            lazy=True)
+    except Exception as e:
+        print(f"Error loading containers: {e}")
+        import traceback
+        traceback.print_exc()
+        return render_template('sections/containers.html', 
+                            error=f"Error loading containers: {str(e)}",
+                            containers=[],
+                            container_types=[],
+                            available_samples=[],
+                            locations=[],
+                            lazy=True)
+
+def _container_search_condition(search):
+    """WHERE fragment for the container list search. Returns (sql, params)"""
+    cnt_match = re.fullmatch(r'cnt-?(\d+)', search, re.IGNORECASE)
+    if cnt_match:
+        return "c.[ContainerID] = ?", [int(cnt_match.group(1))]
+    
+    clauses = ["c.[Barcode] LIKE ?"]
+    params = [like_prefix(search)]
+    if search.isdigit():
+        clauses.append("c.[ContainerID] = ?")
+        params.append(int(search))
+    
+    candidate_ids = search_index.search(CONTAINER, search, limit=SEARCH_CANDIDATE_LIMIT + 1)
+    if candidate_ids is not None and len(candidate_ids) <= SEARCH_CANDIDATE_LIMIT:
+        if candidate_ids:
+            clauses.append(id_list_filter("c.[ContainerID]"))
+            params.append(id_list_param(candidate_ids))
+    else:
+        clauses.append("c.[Description] LIKE ?")
+        params.append(f"%{search}%")
+    
+    return "(" + " OR ".join(clauses) + ")", params
+
+@container_mssql_bp.route('/api/containers', methods=['GET'])
+def list_containers():
+    """
+    Containers for the container page, newest first. Keyset-paginated on
+    ContainerID (pass pagination.next_cursor back as ?cursor=) with no COUNT.
+    Fill levels come from the maintained CurrentAmount; the sample count is
+    only computed for the rows on the page.
+    """
+    try:
+        search = request.args.get('search', '').strip()
+        type_id = request.args.get('type_id', type=int)
+        location_id = request.args.get('location_id', type=int)
+        fill = request.args.get('fill', '').strip().lower()
+        per_page = max(1, min(request.args.get('per_page', CONTAINERS_PER_PAGE, type=int), 200))
+        cursor_values = decode_cursor(request.args.get('cursor'))
+        
+        conditions = []
+        params = []
+        if search:
+            search_sql, search_params = _container_search_condition(search)
+            conditions.append(search_sql)
+            params.extend(search_params)
+        if type_id:
+            conditions.append("c.[ContainerTypeID] = ?")
+            params.append(type_id)
+        if location_id:
+            conditions.append("c.[LocationID] = ?")
+            params.append(location_id)
+        if fill in CONTAINER_FILL_LEVELS:
+            conditions.append(f"({CONTAINER_FILL_LEVELS[fill]})")
+        if cursor_values:
+            conditions.append("c.[ContainerID] < ?")
+            params.append(cursor_values[0])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        # One extra row tells whether there is a next page
+        results = mssql_db.execute_query(f"""
+            SELECT TOP (?)
                 c.[ContainerID],
                 c.[Description],
                 c.[ContainerTypeID],
@@ -19,21 +131,24 @@ def containers():
                 ISNULL(c.[ContainerStatus], 'Active') as Status,
                 c.[LocationID],
                 sl.[LocationName],
-                COUNT(cs.[ContainerSampleID]) as SampleCount,
-                ISNULL(SUM(cs.[Amount]), 0) as TotalItems
+                cnt.[SampleCount],
+                c.[CurrentAmount] as TotalItems
             FROM [container] c
             LEFT JOIN [containertype] ct ON c.[ContainerTypeID] = ct.[ContainerTypeID]
             LEFT JOIN [storagelocation] sl ON c.[LocationID] = sl.[LocationID]
-            LEFT JOIN [containersample] cs ON c.[ContainerID] = cs.[ContainerID]
-            GROUP BY c.[ContainerID], c.[Description], c.[ContainerTypeID], c.[IsMixed], 
-                     c.[ContainerCapacity], ct.[TypeName], c.[ContainerStatus], 
-                     c.[LocationID], sl.[LocationName]
+            OUTER APPLY (
+                SELECT COUNT(*) as SampleCount FROM [containersample] cs WHERE cs.[ContainerID] = c.[ContainerID]
+            ) cnt
+            {where}
             ORDER BY c.[ContainerID] DESC
-        """, fetch_all=True)
+        """, [per_page + 1] + params, fetch_all=True) or []
         
-        containers_for_template = []
-        for row in containers_results:
-            containers_for_template.append({
+        has_next = len(results) > per_page
+        results = results[:per_page]
+        
+        containers = []
+        for row in results:
+            containers.append({
                 'ContainerID': row[0],
                 'Description': row[1],
                 'ContainerTypeID': row[2],
@@ -47,42 +162,51 @@ def containers():
                 'TotalItems': row[10]
             })
         
-        # Get container types
-        container_types_results = mssql_db.execute_query("""
-            SELECT [ContainerTypeID], [TypeName], [Description], [DefaultCapacity] 
-            FROM [containertype]
-        """, fetch_all=True)
-        container_types = []
-        for row in container_types_results:
-            container_types.append({
-                'ContainerTypeID': row[0],
-                'TypeName': row[1],
-                'Description': row[2],
-                'DefaultCapacity': row[3]
-            })
-        
-        # Get storage locations
-        locations_results = mssql_db.execute_query("""
-            SELECT [LocationID], [LocationName], [Rack], [Section], [Shelf]
-            FROM [storagelocation]
-            ORDER BY [Rack], [Section], [Shelf]
-        """, fetch_all=True)
-        locations = []
-        for row in locations_results:
-            locations.append({
-                'LocationID': row[0],
-                'LocationName': row[1],
-                'Rack': row[2],
-                'Section': row[3],
-                'Shelf': row[4]
-            })
-        
-        # Get available samples (not in containers)
-        available_samples_results = mssql_db.execute_query("""
-            SELECT 
+        return jsonify({
+            'success': True,
+            'containers': containers,
+            'pagination': {
+                'per_page': per_page,
+                'has_next': has_next,
+                'has_prev': cursor_values is not None,
+                'next_cursor': encode_cursor([results[-1][0]]) if has_next else None
+            }
+        })
+    except Exception as e:
+        print(f"API error listing containers: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@container_mssql_bp.route('/api/containers/available-samples', methods=['GET'])
+def get_samples_available_for_containers():
+    """
+    Picker for samples that can be packed: in storage, with stock left and
+    not in any container. Keyset-paginated on SampleID like the other
+    pickers; see picker_search_condition for how search terms match.
+    """
+    try:
+        search = request.args.get('search', '').strip()
+        per_page = max(1, min(request.args.get('per_page', 50, type=int), 200))
+        cursor_values = decode_cursor(request.args.get('cursor'))
+        
+        conditions = [
+            "s.[Status] = 'In Storage'",
+            "ss.[AmountRemaining] > 0",
+            "NOT EXISTS (SELECT 1 FROM [containersample] cs WHERE cs.[SampleStorageID] = ss.[StorageID])"
+        ]
+        params = []
+        if search:
+            search_sql, search_params = picker_search_condition(search)
+            conditions.append(search_sql)
+            params.extend(search_params)
+        if cursor_values:
+            conditions.append("s.[SampleID] < ?")
+            params.append(cursor_values[0])
+        
+        results = mssql_db.execute_query(f"""
+            SELECT TOP (?)
                 s.[SampleID],
-                'SMP-' + CAST(s.[SampleID] AS NVARCHAR) as SampleIDFormatted,
                 s.[Description],
+                s.[PartNumber],
                 ss.[AmountRemaining],
                 CASE
                     WHEN u.[UnitName] IS NULL THEN 'pcs'
@@ -92,37 +216,37 @@ def containers():
             FROM [sample] s
             JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
             LEFT JOIN [unit] u ON s.[UnitID] = u.[UnitID]
-            LEFT JOIN [containersample] cs ON ss.[StorageID] = cs.[SampleStorageID]
-            WHERE ss.[AmountRemaining] > 0
-            AND s.[Status] = 'In Storage'
-            AND cs.[ContainerSampleID] IS NULL
+            WHERE {' AND '.join(conditions)}
             ORDER BY s.[SampleID] DESC
-        """, fetch_all=True)
-        available_samples = []
-        for row in available_samples_results:
-            available_samples.append({
+        """, [per_page + 1] + params, fetch_all=True) or []
+        
+        has_next = len(results) > per_page
+        results = results[:per_page]
+        
+        samples = []
+        for row in results:
+            samples.append({
                 'SampleID': row[0],
-                'SampleIDFormatted': row[1],
-                'Description': row[2],
+                'SampleIDFormatted': f"SMP-{row[0]}",
+                'Description': row[1] or '',
+                'PartNumber': row[2] or '',
                 'AmountRemaining': row[3],
                 'Unit': row[4]
             })
         
-        return render_template('sections/containers.html', 
-                            containers=containers_for_template,
-                            container_types=container_types,
-                            available_samples=available_samples,
-                            locations=locations)
+        return jsonify({
+            'success': True,
+            'samples': samples,
+            'pagination': {
+                'per_page': per_page,
+                'has_next': has_next,
+                'has_prev': cursor_values is not None,
+                'next_cursor': encode_cursor([results[-1][0]]) if has_next else None
+            }
+        })
     except Exception as e:
-        print(f"Error loading containers: {e}")
-        import traceback
-        traceback.print_exc()
-        return render_template('sections/containers.html', 
-                            error=f"Error loading containers: {str(e)}",
-                            containers=[],
-                            container_types=[],
-                            available_samples=[],
-                            locations=[])
+        print(f"API error getting samples available for containers: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 @container_mssql_bp.route('/api/containers/<int:container_id>/location')
 def get_container_location(container_id):
@@ -184,6 +308,13 @@ def create_container():
         if not container_type_id and not new_container_type:
             return jsonify({'success': False, 'error': 'Container type is required'}), 400
         
+        # Several containers of the same type can be created at once
+        try:
+            count = parse_container_count(data.get('count'))
+            contents = parse_container_contents(data.get('samples'), count)
+        except ContainerBatchError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         # Use database transaction for container creation (same as sample registration)
         with mssql_db.get_connection() as conn:
             cursor = conn.cursor()
@@ -219,69 +350,37 @@ def create_container():
                     else:
                         raise Exception('Failed to create new container type')
                 
-                # Generate unique container barcode
-                from datetime import datetime
-                container_barcode = f"CNT{datetime.now().strftime('%Y%m%d%H%M%S')}"
-                
-                # Get container capacity from container type if not specified
-                container_capacity = data.get('capacity')
-                if not container_capacity and container_type_id:
-                    cursor.execute("""
-                        SELECT [DefaultCapacity] FROM [containertype] WHERE [ContainerTypeID] = ?
-                    """, (container_type_id,))
-                    capacity_result = cursor.fetchone()
-                    container_capacity = capacity_result[0] if capacity_result else 50
-                
-                # Create container
-                cursor.execute("""
-                    INSERT INTO [container] (
-                        [Barcode],
-                        [Description], 
-                        [ContainerTypeID], 
-                        [IsMixed], 
-                        [ContainerCapacity], 
-                        [LocationID],
-                        [ContainerStatus]
-                    ) 
-                    OUTPUT INSERTED.ContainerID
-                    VALUES (?, ?, ?, ?, ?, ?, 'Active')
-                """, (
-                    container_barcode,
+                # All containers (and any samples placed in them) in one batch
+                created = create_containers(
+                    cursor,
+                    count,
                     data.get('description'),
                     container_type_id,
-                    data.get('isMixed', False),
-                    container_capacity,
-                    data.get('locationId')
-                ))
-                
-                container_result = cursor.fetchone()
-                if not container_result:
-                    raise Exception('Failed to create container')
-                
-                container_id = container_result[0]
-                
-                # Log activity
-                cursor.execute("""
-                    INSERT INTO [history] (
-                        [Timestamp], 
-                        [ActionType], 
-                        [UserID], 
-                        [Notes]
-                    )
-                    VALUES (GETDATE(), 'Container created', ?, ?)
-                """, (
                     user_id,
-                    f"Container '{data.get('description')}' created with ID {container_id}"
-                ))
+                    location_id=data.get('locationId'),
+                    is_mixed=data.get('isMixed', False),
+                    capacity=data.get('capacity'),
+                    contents=contents,
+                    force=bool(data.get('force', False))
+                )
                 
                 conn.commit()
+                for container in created:
+                    index_container(container['container_id'], data.get('description'), container['barcode'])
+                if new_container_type:
+                    bump_version(CONTAINER_TYPE)
                 
                 return jsonify({
                     'success': True, 
-                    'container_id': container_id,
-                    'message': 'Container created successfully'
+                    'container_id': created[0]['container_id'],
+                    'container_ids': [container['container_id'] for container in created],
+                    'containers': created,
+                    'message': 'Container created successfully' if count == 1 else f'{count} containers created successfully'
                 })
                 
+            except ContainerBatchError as e:
+                conn.rollback()
+                return jsonify({'success': False, 'error': str(e), 'errors': e.errors}), 400
             except Exception as e:
                 conn.rollback()
                 raise
@@ -295,19 +394,17 @@ def create_container():
 @container_mssql_bp.route('/api/containers/available')
 def get_available_containers():
     try:
-        # Get containers with correct current amount calculation (same as overview page)
+        # Current amount is maintained on the container row (see container_fill)
         containers_results = mssql_db.execute_query("""
             SELECT 
                 c.[ContainerID],
                 c.[Description],
                 c.[ContainerCapacity],
-                ISNULL(SUM(cs.[Amount]), 0) as CurrentAmount,
+                c.[CurrentAmount],
                 ISNULL(sl.[LocationName], 'Unknown') as LocationName
             FROM [container] c
             LEFT JOIN [storagelocation] sl ON c.[LocationID] = sl.[LocationID]
-            LEFT JOIN [containersample] cs ON c.[ContainerID] = cs.[ContainerID]
             WHERE c.[ContainerStatus] = 'Active' OR c.[ContainerStatus] IS NULL
-            GROUP BY c.[ContainerID], c.[Description], c.[ContainerCapacity], sl.[LocationName]
             ORDER BY c.[ContainerID] DESC
         """, fetch_all=True)
         
@@ -336,19 +433,7 @@ def get_available_containers():
 @container_mssql_bp.route('/api/containers/types')
 def get_container_types():
     try:
-        container_types_results = mssql_db.execute_query("""
-            SELECT [ContainerTypeID], [TypeName], [Description], [DefaultCapacity] 
-            FROM [containertype]
-        """, fetch_all=True)
-        
-        container_types = []
-        for row in container_types_results:
-            container_types.append({
-                'ContainerTypeID': row[0],
-                'TypeName': row[1],
-                'Description': row[2],
-                'DefaultCapacity': row[3]
-            })
+        container_types = cached_container_types()
         
         return jsonify({'success': True, 'types': container_types})
     except Exception as e:
@@ -367,6 +452,7 @@ def delete_container_type(container_type_id):
         mssql_db.execute_query("""
             DELETE FROM [containertype] WHERE [ContainerTypeID] = ?
         """, (container_type_id,))
+        bump_version(CONTAINER_TYPE)
         
         return jsonify({'success': True, 'message': 'Container type deleted successfully'})
     except Exception as e:
@@ -483,28 +569,6 @@ def add_sample_to_container():
         amount = data.get('amount', 1)
         user_id = 1  # TODO: Implement proper user authentication
         
-        # Check container capacity
-        container_result = mssql_db.execute_query("""
-            SELECT 
-                c.[ContainerCapacity],
-                ISNULL(SUM(cs.[Amount]), 0) as CurrentAmount
-            FROM [container] c
-            LEFT JOIN [containersample] cs ON c.[ContainerID] = cs.[ContainerID]
-            WHERE c.[ContainerID] = ?
-            GROUP BY c.[ContainerID], c.[ContainerCapacity]
-        """, (container_id,), fetch_one=True)
-        
-        if container_result:
-            container_capacity = container_result[0]
-            current_amount = container_result[1] or 0
-            
-            if container_capacity and (current_amount + amount > container_capacity):
-                if not data.get('force_add', False):
-                    return jsonify({
-                        'success': False,
-                        'error': f'Cannot add {amount} samples to container. Current: {current_amount}, Capacity: {container_capacity}, Available: {container_capacity - current_amount}'
-                    })
-        
         # Get sample storage ID
         storage_result = mssql_db.execute_query("""
             SELECT [StorageID] FROM [samplestorage] WHERE [SampleID] = ?
@@ -515,27 +579,35 @@ def add_sample_to_container():
         
         storage_id = storage_result[0]
         
-        # Add sample to container
-        mssql_db.execute_query("""
-            INSERT INTO [containersample] ([ContainerID], [SampleStorageID], [Amount])
-            VALUES (?, ?, ?)
-        """, (container_id, storage_id, amount))
-        
-        # Log activity
-        mssql_db.execute_query("""
-            INSERT INTO [history] (
-                [Timestamp], 
-                [ActionType], 
-                [UserID], 
-                [SampleID],
-                [Notes]
-            )
-            VALUES (GETDATE(), 'Sample added to container', ?, ?, ?)
-        """, (
-            user_id,
-            sample_id,
-            f"Sample {sample_id} added to container {container_id} with amount {amount}"
-        ))
+        with mssql_db.transaction() as cursor:
+            # Add sample to container - the capacity check is part of the insert,
+            # so two concurrent adds cannot both squeeze into the last free slots
+            if not add_to_container(cursor, container_id, storage_id, amount, data.get('force_add', False)):
+                container_result = container_fill(cursor, container_id)
+                if not container_result:
+                    return jsonify({'success': False, 'error': f'Container {container_id} not found'}), 404
+                container_capacity, current_amount = container_result
+                return jsonify({
+                    'success': False,
+                    'error': f'Cannot add {amount} samples to container. Current: {current_amount}, Capacity: {container_capacity}, Available: {container_capacity - current_amount}'
+                })
+            
+            # Log activity
+            cursor.execute("""
+                INSERT INTO [history] (
+                    [Timestamp], 
+                    [ActionType], 
+                    [UserID], 
+                    [SampleID],
+                    [Notes]
+                )
+                VALUES (GETDATE(), 'Sample added to container', ?, ?, ?)
+            """, (
+                user_id,
+                sample_id,
+                f"Sample {sample_id} added to container {container_id} with amount {amount}"
+            ))
+        invalidate_container_details(container_id)
         
         return jsonify({
             'success': True,
@@ -548,6 +620,53 @@ def add_sample_to_container():
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@container_mssql_bp.route('/api/containers/<int:container_id>/samples:bulk', methods=['POST'])
+def bulk_update_container_samples(container_id):
+    """
+    Add or remove many samples in one transaction.
+    Body: {"action": "add" | "remove", "samples": [{"sampleId", "amount"}], "force_add": false}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        action = data.get('action', 'add')
+        if action not in ('add', 'remove'):
+            return jsonify({'success': False, 'error': "action must be 'add' or 'remove'"}), 400
+        try:
+            items = parse_container_items(data.get('samples'))
+        except ContainerBatchError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        user_id = 1  # TODO: Implement proper user authentication
+        
+        try:
+            with mssql_db.transaction() as cursor:
+                if action == 'add':
+                    done, failures = bulk_add_to_container(
+                        cursor, container_id, items, user_id, bool(data.get('force_add', False))
+                    )
+                else:
+                    done, failures = bulk_remove_from_container(cursor, container_id, items, user_id)
+        except ContainerCapacityError as e:
+            return jsonify(dict(e.as_dict(), success=False, error=str(e)))
+        except ContainerBatchError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        invalidate_container_details(container_id)
+        
+        verb = 'added to' if action == 'add' else 'removed from'
+        return jsonify({
+            'success': bool(done),
+            'action': action,
+            'samples': done,
+            'failed': failures,
+            'message': f'{len(done)} samples {verb} container' + (f', {len(failures)} failed' if failures else ''),
+            'error': None if done else (failures[0]['error'] if failures else 'Nothing to do')
+        })
+    except Exception as e:
+        print(f"API error in bulk container update: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @container_mssql_bp.route('/api/containers/remove-sample', methods=['POST'])
 def remove_sample_from_container():
     try:
@@ -556,13 +675,13 @@ def remove_sample_from_container():
         sample_id = data.get('sampleId')
         amount = data.get('amount', 1)
         
-        # Remove sample from container
-        result = mssql_db.execute_query("""
-            DELETE FROM [containersample] 
-            WHERE [ContainerID] = ? AND [SampleStorageID] = (
-                SELECT [StorageID] FROM [samplestorage] WHERE [SampleID] = ?
-            )
-        """, (container_id, sample_id))
+        # Remove sample from container and release its amount
+        with mssql_db.transaction() as cursor:
+            remove_sample_from_containers(cursor, sample_id, container_id)
+        if container_id:
+            invalidate_container_details(container_id)
+        else:
+            clear_container_details()
         
         return jsonify({'success': True, 'message': 'Sample removed from container successfully'})
     except Exception as e:
@@ -591,6 +710,8 @@ def delete_container(container_id):
         mssql_db.execute_query("""
             DELETE FROM [container] WHERE [ContainerID] = ?
         """, (container_id,))
+        remove_document(CONTAINER, container_id)
+        invalidate_container_details(container_id)
         
         # Log activity
         mssql_db.execute_query("""
@@ -619,104 +740,22 @@ def delete_container(container_id):
 
 @container_mssql_bp.route('/api/containers/<int:container_id>', methods=['GET'])
 def get_container_details(container_id):
+    """
+    Container details from the per-container cache (one batched query on a
+    miss). ?include=location,samples,serials,history limits the sections
+    returned; all of them by default, so no follow-up location fetch is needed.
+    """
     try:
-        # Get container details
-        container_result = mssql_db.execute_query("""
-            SELECT 
-                c.[ContainerID],
-                c.[Description],
-                c.[ContainerTypeID],
-                c.[IsMixed],
-                c.[ContainerCapacity],
-                ct.[TypeName],
-                ISNULL(c.[ContainerStatus], 'Active') as Status,
-                c.[LocationID]
-            FROM [container] c
-            LEFT JOIN [containertype] ct ON c.[ContainerTypeID] = ct.[ContainerTypeID]
-            WHERE c.[ContainerID] = ?
-        """, (container_id,), fetch_one=True)
+        try:
+            include = parse_include(request.args.get('include'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        if not container_result:
+        details = cached_container_details(container_id, include)
+        if details is None:
             return jsonify({'success': False, 'error': 'Container not found'}), 404
         
-        container = {
-            'ContainerID': container_result[0],
-            'Description': container_result[1],
-            'ContainerTypeID': container_result[2],
-            'IsMixed': container_result[3],
-            'ContainerCapacity': container_result[4],
-            'TypeName': container_result[5],
-            'Status': container_result[6],
-            'LocationID': container_result[7]
-        }
-        
-        # Get samples in container
-        samples_results = mssql_db.execute_query("""
-            SELECT 
-                s.[SampleID],
-                s.[Description],
-                s.[PartNumber],
-                cs.[Amount],
-                CASE
-                    WHEN u.[UnitName] IS NULL THEN 'pcs'
-                    WHEN LOWER(u.[UnitName]) = 'stk' THEN 'pcs'
-                    ELSE u.[UnitName]
-                END as Unit,
-                sl.[LocationName],
-                ss.[ExpireDate],
-                FORMAT(r.[ReceivedDate], 'dd-MM-yyyy') as RegisteredDate,
-                ss.[StorageID] as SampleStorageID
-            FROM [containersample] cs
-            JOIN [samplestorage] ss ON cs.[SampleStorageID] = ss.[StorageID]
-            JOIN [sample] s ON ss.[SampleID] = s.[SampleID]
-            LEFT JOIN [storagelocation] sl ON ss.[LocationID] = sl.[LocationID]
-            LEFT JOIN [reception] r ON s.[ReceptionID] = r.[ReceptionID]
-            LEFT JOIN [unit] u ON s.[UnitID] = u.[UnitID]
-            WHERE cs.[ContainerID] = ?
-        """, (container_id,), fetch_all=True)
-        
-        samples = []
-        for row in samples_results:
-            samples.append({
-                'SampleID': row[0],
-                'Description': row[1],
-                'PartNumber': row[2],
-                'Amount': row[3],
-                'Unit': row[4],
-                'LocationName': row[5],
-                'ExpireDate': row[6],
-                'RegisteredDate': row[7],
-                'SampleStorageID': row[8]
-            })
-        
-        # Get container history
-        history_results = mssql_db.execute_query("""
-            SELECT TOP 20
-                FORMAT(h.[Timestamp], 'dd-MM-yyyy HH:mm') as Timestamp,
-                h.[ActionType],
-                h.[Notes],
-                u.[Name] as UserName
-            FROM [history] h
-            LEFT JOIN [user] u ON h.[UserID] = u.[UserID]
-            WHERE h.[Notes] LIKE '%Container ' + CAST(? AS NVARCHAR) + '%'
-            ORDER BY h.[Timestamp] DESC
-        """, (container_id,), fetch_all=True)
-        
-        history = []
-        for row in history_results:
-            history.append({
-                'Timestamp': row[0],
-                'ActionType': row[1],
-                'Notes': row[2],
-                'UserName': row[3]
-            })
-        
-        return jsonify({
-            'success': True,
-            'container': container,
-            'samples': samples,
-            'history': history
-        })
+        return jsonify({'success': True, **details})
         
     except Exception as e:
         print(f"API error getting container details: {e}")
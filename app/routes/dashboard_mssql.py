@@ -1,5 +1,7 @@
 from flask import Blueprint, render_template, jsonify, request
 from app.utils.mssql_db import mssql_db
+from app.utils.search_index import schedule_rebuild
+from app.utils.reference_cache import bump_version, LOCATION
 
 dashboard_mssql_bp = Blueprint('dashboard_mssql', __name__)
 
@@ -616,6 +618,9 @@ def add_storage_section():
                 VALUES (?, ?)
             """, (location_name, lab_id))
         
+        schedule_rebuild()
+        bump_version(LOCATION)
+        
         return jsonify({
             'success': True, 
             'message': f'Section {section_num} created for rack {rack_num}'
@@ -686,6 +691,9 @@ def remove_storage_section():
                 'error': f'No locations were deleted. Pattern: {pattern}'
             }), 400
         
+        schedule_rebuild()
+        bump_version(LOCATION)
+        
         return jsonify({
             'success': True,
             'message': f'Section {section_num} on rack {rack_num} deleted ({affected_rows} locations)',
@@ -715,6 +723,7 @@ def add_storage_lab():
         """, (data.get('labName'),), fetch_one=True)
         
         lab_id = result[0] if result else None
+        bump_version(LOCATION)
         
         return jsonify({
             'success': True,
@@ -806,6 +815,10 @@ def update_section_shelves():
         else:
             message = f"No changes needed, section {section_num} on rack {rack_num} already has {shelf_count} shelves"
         
+        # Location names changed - refresh the search index in the background
+        schedule_rebuild()
+        bump_version(LOCATION)
+        
         return jsonify({
             'success': True,
             'message': message
@@ -839,6 +852,9 @@ def add_storage_rack():
                     VALUES (?, ?, ?, ?, ?)
                 """, (location_name, lab_id, rack_num, section, shelf))
         
+        schedule_rebuild()
+        bump_version(LOCATION)
+        
         return jsonify({
             'success': True,
             'message': f'Rack {rack_num} created with 2 sections and 10 slots'
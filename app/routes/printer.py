@@ -6,6 +6,7 @@ import tempfile
 import logging
 from datetime import datetime
 import uuid
+from app.utils.sequences import next_numbers, LABEL_BARCODE
 
 printer_bp = Blueprint('printer', __name__)
 mysql = None
@@ -93,24 +94,26 @@ def get_printer_config(label_type, printer_id=None):
 def generate_barcode(label_type, label_data):
     """
     Generate a unique barcode for the label if one isn't provided.
+    The suffix comes from the label barcode sequence, so labels printed in
+    the same second no longer share a barcode.
     """
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    if label_type in ['container', 'package']:
+        container_id = label_data.get('ContainerID', '')
+        return f"CNT-{container_id}"
     
+    number = next_numbers(LABEL_BARCODE)[0]
     if label_type == 'sample':
         sample_id = label_data.get('SampleID', '')
-        return f"SMP{sample_id}{timestamp[-6:]}"
-    elif label_type in ['container', 'package']:
-        container_id = label_data.get('ContainerID', '')
-        return f"CNT-{container_id}"
+        return f"SMP{sample_id}{number:06d}"
     elif label_type == 'test_sample':
         sample_id = label_data.get('SampleID', '')
         test_id = label_data.get('TestID', '')
-        return f"TST{sample_id}{test_id}{timestamp[-4:]}"
+        return f"TST{sample_id}{test_id}{number:04d}"
     elif label_type == 'location':
         location_name = label_data.get('LocationName', '').replace('.', '')
-        return f"LOC{location_name}{timestamp[-4:]}"
+        return f"LOC{location_name}{number:04d}"
     else:
-        return f"LAB{timestamp}"
+        return f"LAB{number:08d}"
 
 def generate_zpl_barcode(barcode_data, barcode_type='128', height=60, width=3):
     """
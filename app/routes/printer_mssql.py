@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app
 from app.utils.mssql_db import mssql_db
+from app.utils.serial_numbers import fetch_serial_numbers
+from app.utils.container_details import invalidate_container_details
 from datetime import datetime
 import os
 
@@ -133,6 +135,9 @@ def print_container_label_endpoint(container_id):
             first_sample_task = samples_result[0][5] or 'None'  # TaskName is index 5
         container_data['TaskName'] = first_sample_task
         
+        # Serial numbers for all samples in the container in one query
+        serials_by_sample = fetch_serial_numbers([row[0] for row in samples_result or []])
+        
         # Add sample information with proper barcode generation
         for sample_row in samples_result:
             sample_id = sample_row[0]
@@ -161,7 +166,8 @@ def print_container_label_endpoint(container_id):
                 'Description': sample_row[1] or '',
                 'PartNumber': sample_row[2] or '',
                 'Barcode': barcode_to_use,
-                'Amount': sample_row[4] or 1
+                'Amount': sample_row[4] or 1,
+                'SerialNumbers': serials_by_sample.get(sample_id, [])
             }
             container_data['samples'].append(sample_data)
         
@@ -184,6 +190,7 @@ def print_container_label_endpoint(container_id):
                     "UPDATE [container] SET [Barcode] = ? WHERE [ContainerID] = ?", 
                     (container_barcode, container_id)
                 )
+                invalidate_container_details(container_id)
                 current_app.logger.info(f"Generated and saved new container barcode: {container_barcode}")
             except Exception as e:
                 current_app.logger.error(f"Failed to save container barcode: {e}")
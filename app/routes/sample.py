@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, jsonify, request, url_for
 from app.services.sample_service import SampleService
 from app.utils.auth import get_current_user
 from app.utils.validators import validate_sample_data
+from app.utils.container_fill import mysql_release_capacity, mysql_remove_storage_from_containers
 from datetime import datetime, timedelta
 
 sample_bp = Blueprint('sample', __name__)
@@ -359,9 +360,9 @@ def init_sample(blueprint, mysql):
             storage_ids = [row[0] for row in cursor.fetchall()]
             
             if storage_ids:
-                # Remove container-sample links
+                # Remove container-sample links (and release the container amounts)
                 for storage_id in storage_ids:
-                    cursor.execute("DELETE FROM ContainerSample WHERE SampleStorageID = %s", (storage_id,))
+                    mysql_remove_storage_from_containers(cursor, storage_id)
             
             # Delete history records for this sample first
             cursor.execute("DELETE FROM History WHERE SampleID = %s", (sample_id,))
@@ -898,6 +899,7 @@ def init_sample(blueprint, mysql):
                             DELETE FROM ContainerSample
                             WHERE ContainerSampleID = %s
                         """, (container_sample_id,))
+                        mysql_release_capacity(cursor, container_id, container_amount)
                         
                         # Log container update
                         cursor.execute("""
@@ -923,6 +925,7 @@ def init_sample(blueprint, mysql):
                             SET Amount = %s
                             WHERE ContainerSampleID = %s
                         """, (new_container_amount, container_sample_id))
+                        mysql_release_capacity(cursor, container_id, disposal_amount)
                         
                         # Log container update
                         cursor.execute("""
@@ -1253,10 +1256,7 @@ def init_sample(blueprint, mysql):
                     # If we're moving ALL samples, just update the location
                     if move_amount == total_amount:
                         # Remove from any containers
-                        cursor.execute("""
-                            DELETE FROM ContainerSample 
-                            WHERE SampleStorageID = %s
-                        """, (storage_id,))
+                        mysql_remove_storage_from_containers(cursor, storage_id)
                         
                         # Update storage record with new location
                         cursor.execute("""
@@ -1453,6 +1453,7 @@ def init_sample(blueprint, mysql):
                         DELETE FROM ContainerSample 
                         WHERE ContainerSampleID = %s
                     """, (container_sample_id,))
+                    mysql_release_capacity(cursor, container_id, container_result[3] or 0)
                     
                     container_names.append(container_name)
                 
@@ -1,70 +1,82 @@
-from flask import Blueprint, render_template, jsonify, request
-from app.utils.mssql_db import mssql_db
+from flask import Blueprint, render_template, jsonify, request, current_app
+from app.utils.mssql_db import mssql_db, id_list_filter, id_list_param, fetch_result_sets
+from app.utils.search_index import (
+    search_index, index_sample, index_container, remove_document, SAMPLE
+)
+from app.utils.global_search import global_search as run_global_search
+from app.utils.serial_numbers import validate_serial_numbers as validate_serials_batch, fetch_serial_numbers
+from app.utils.sample_registration import (
+    RegistrationError, prepare_reception, prepare_specs,
+    check_against_database, create_container_types, insert_registration
+)
+from app.utils.sample_import import import_samples as run_sample_import, SampleImportError
+from app.utils.sample_bulk_ops import (
+    BulkOperationError, parse_sample_ids, parse_disposal_items, bulk_move, bulk_dispose
+)
+from app.utils.sample_picker import picker_search_condition, SEARCH_CANDIDATE_LIMIT
+from app.utils.stock import take_stock, InsufficientStockError
+from app.utils.container_fill import remove_sample_from_containers
+from app.utils.container_details import invalidate_container_details, clear_container_details
+from app.utils.label_queue import queue_sample_labels
+from app.utils.reference_cache import (
+    get_suppliers, get_users, get_units, get_locations, get_container_types, get_tasks,
+    get_sample_statuses, bump_version, SUPPLIER, CONTAINER_TYPE
+)
+from app.utils.mssql_pagination import (
+    normalize_sort_order, encode_cursor, decode_cursor,
+    keyset_predicate, keyset_order_by, approximate_row_count
+)
 from datetime import datetime, timedelta
+import re
 
 sample_mssql_bp = Blueprint('sample_mssql', __name__)
 
+# Sort keys supported by the /samples listing. Every expression is paired with
+# s.[SampleID] as tiebreaker for keyset pagination. They are raw (nullable)
+# columns so the seek and ORDER BY can use the (column, SampleID) indexes in
+# migration/mssql_indexes.sql; NULLs sort first.
+SAMPLE_SORT_KEYS = {
+    'sample_id': "s.[SampleID]",
+    'part_number': "s.[PartNumber]",
+    'description': "s.[Description]",
+    'registered_date': "r.[ReceivedDate]",
+    'reception_date': "r.[ReceivedDate]",
+    'amount': "ss.[AmountRemaining]",
+    'location': "sl.[LocationName]",
+    'status': "s.[Status]"
+}
+
+def _sample_search_condition(search):
+    """
+    Build the WHERE fragment for a free-text sample search.
+    Resolves candidate SampleIDs from the trigram index when it is warm and
+    falls back to LIKE scans otherwise. Returns (sql, params).
+    """
+    candidate_ids = search_index.search(SAMPLE, search, limit=SEARCH_CANDIDATE_LIMIT + 1)
+    if candidate_ids is not None and len(candidate_ids) <= SEARCH_CANDIDATE_LIMIT:
+        return id_list_filter("s.[SampleID]"), [id_list_param(candidate_ids)]
+    
+    search_term = f"%{search}%"
+    return """
+        (s.[Description] LIKE ? 
+         OR s.[PartNumber] LIKE ? 
+         OR s.[Barcode] LIKE ?
+         OR ('SMP-' + CAST(s.[SampleID] AS NVARCHAR)) LIKE ?)
+    """, [search_term, search_term, search_term, search_term]
+
 @sample_mssql_bp.route('/register')
 def register():
     try:
-        # Get suppliers
-        suppliers_results = mssql_db.execute_query("SELECT [SupplierID], [SupplierName] FROM [supplier]", fetch_all=True)
-        suppliers = [{'SupplierID': row[0], 'SupplierName': row[1]} for row in suppliers_results]
-        
-        # Get users
-        users_results = mssql_db.execute_query("SELECT [UserID], [Name] FROM [user]", fetch_all=True)
-        users = [{'UserID': row[0], 'Name': row[1]} for row in users_results]
-        
-        # Get units (translate 'stk' to 'pcs')
-        units_results = mssql_db.execute_query("SELECT [UnitID], [UnitName] FROM [unit] ORDER BY [UnitName]", fetch_all=True)
-        units = []
-        for row in units_results:
-            unit_name = row[1]
-            # Translate 'stk' to 'pcs' for consistency
-            if unit_name.lower() == 'stk':
-                unit_name = 'pcs'
-            units.append({'UnitID': row[0], 'UnitName': unit_name})
-        
-        # Get locations
-        locations_results = mssql_db.execute_query("""
-            SELECT l.[LocationID], l.[LocationName], lb.[LabName]
-            FROM [storagelocation] l
-            JOIN [lab] lb ON l.[LabID] = lb.[LabID]
-        """, fetch_all=True)
-        locations = []
-        for row in locations_results:
-            locations.append({
-                'LocationID': row[0],
-                'LocationName': row[1],
-                'LabName': row[2]
-            })
-        
-        # Get container types
-        container_types_results = mssql_db.execute_query("SELECT [ContainerTypeID], [TypeName], [Description], [DefaultCapacity] FROM [containertype]", fetch_all=True)
-        container_types = []
-        for row in container_types_results:
-            container_types.append({
-                'ContainerTypeID': row[0],
-                'TypeName': row[1],
-                'Description': row[2],
-                'DefaultCapacity': row[3]
-            })
-        
-        # Get active tasks
-        tasks_results = mssql_db.execute_query("""
-            SELECT [TaskID], [TaskNumber], [TaskName], [Status] 
-            FROM [task] 
-            WHERE [Status] IN ('Planning', 'Active', 'On Hold')
-            ORDER BY [TaskNumber] DESC
-        """, fetch_all=True)
-        tasks = []
-        for row in tasks_results:
-            tasks.append({
-                'TaskID': row[0],
-                'TaskNumber': row[1],
-                'TaskName': row[2],
-                'Status': row[3]
-            })
+        # Reference data comes from the process-wide cache (no queries when warm)
+        suppliers = get_suppliers()
+        users = get_users()
+        units = get_units()
+        locations = [
+            {'LocationID': l['LocationID'], 'LocationName': l['LocationName'], 'LabName': l['LabName']}
+            for l in get_locations(with_lab_only=True)
+        ]
+        container_types = get_container_types()
+        tasks = get_tasks(active_only=True)
         
         return render_template('sections/register.html', 
                             suppliers=suppliers,
@@ -106,18 +118,14 @@ def samples():
         
         # Get sort parameters
         sort_by = request.args.get('sort_by', 'sample_id')
-        sort_order = request.args.get('sort_order', 'DESC')
+        sort_order = normalize_sort_order(request.args.get('sort_order', 'DESC'))
+        if sort_by not in SAMPLE_SORT_KEYS:
+            sort_by = 'sample_id'
         
         # Get dropdown options for filters
-        locations = mssql_db.execute_query("""
-            SELECT [LocationID], [LocationName] FROM [storagelocation] ORDER BY [LocationName]
-        """, fetch_all=True)
-        locations = [{'LocationID': row[0], 'LocationName': row[1]} for row in locations or []]
+        locations = [{'LocationID': l['LocationID'], 'LocationName': l['LocationName']} for l in get_locations()]
         
-        statuses = mssql_db.execute_query("""
-            SELECT DISTINCT [Status] FROM [sample]
-        """, fetch_all=True)
-        statuses = [row[0] for row in statuses or []]
+        statuses = get_sample_statuses()
         
         # Build WHERE conditions for filtering
         where_conditions = []
@@ -125,14 +133,9 @@ def samples():
         
         # Add search filter
         if search:
-            where_conditions.append("""
-                (s.[Description] LIKE ? 
-                 OR s.[PartNumber] LIKE ? 
-                 OR ('SMP-' + CAST(s.[SampleID] AS NVARCHAR)) LIKE ?
-                 OR CAST(s.[SampleID] AS NVARCHAR) LIKE ?)
-            """)
-            search_term = f"%{search}%"
-            query_params.extend([search_term, search_term, search_term, search_term])
+            search_sql, search_params = _sample_search_condition(search)
+            where_conditions.append(search_sql)
+            query_params.extend(search_params)
         
         # Add location filter
         if location:
@@ -144,58 +147,62 @@ def samples():
             where_conditions.append("s.[Status] = ?")
             query_params.append(status)
         
-        # Add date range filters
+        # Add date range filters (sargable range on ReceivedDate)
         if date_from:
-            where_conditions.append("CAST(r.[ReceivedDate] AS DATE) >= ?")
+            where_conditions.append("r.[ReceivedDate] >= ?")
             query_params.append(date_from)
         
         if date_to:
-            where_conditions.append("CAST(r.[ReceivedDate] AS DATE) <= ?")
+            where_conditions.append("r.[ReceivedDate] < DATEADD(DAY, 1, CAST(? AS DATE))")
             query_params.append(date_to)
         
-        # Build WHERE clause
-        where_clause = ""
-        if where_conditions:
-            where_clause = "WHERE " + " AND ".join(where_conditions)
-        
-        # Count total filtered samples
-        count_query = f"""
-        SELECT COUNT(*) 
-        FROM [sample] s
-        JOIN [reception] r ON s.[ReceptionID] = r.[ReceptionID]
-        LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
-        LEFT JOIN [storagelocation] sl ON ss.[LocationID] = sl.[LocationID]
-        LEFT JOIN [unit] u ON s.[UnitID] = u.[UnitID]
-        {where_clause}
-        """
-        
-        total_filtered_samples = mssql_db.execute_query(count_query, query_params, fetch_one=True)[0]
+        # Count total samples. Unfiltered views use the approximate row count
+        # from partition metadata; filtered views only join what the filters need.
+        if not where_conditions:
+            total_filtered_samples = approximate_row_count('sample')
+        else:
+            count_joins = ""
+            if date_from or date_to:
+                count_joins += " JOIN [reception] r ON s.[ReceptionID] = r.[ReceptionID]"
+            if location:
+                count_joins += " LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]"
+            count_query = f"""
+            SELECT COUNT(*) 
+            FROM [sample] s{count_joins}
+            WHERE {" AND ".join(where_conditions)}
+            """
+            total_filtered_samples = mssql_db.execute_query(count_query, query_params, fetch_one=True)[0]
         
         # Get pagination parameters
-        page = int(request.args.get('page', 1))
+        page = max(int(request.args.get('page', 1)), 1)
         per_page = 20  # Show 20 samples per page
-        offset = (page - 1) * per_page
-        
-        # Build ORDER BY clause
-        order_by_clause = "ORDER BY "
-        if sort_by == 'sample_id':
-            order_by_clause += f"s.[SampleID] {sort_order}"
-        elif sort_by == 'part_number':
-            order_by_clause += f"s.[PartNumber] {sort_order}"
-        elif sort_by == 'description':
-            order_by_clause += f"s.[Description] {sort_order}"
-        elif sort_by in ['registered_date', 'reception_date']:
-            order_by_clause += f"r.[ReceivedDate] {sort_order}"
-        elif sort_by == 'amount':
-            order_by_clause += f"AmountRemaining {sort_order}"
-        elif sort_by == 'location':
-            order_by_clause += f"sl.[LocationName] {sort_order}"
-        elif sort_by == 'status':
-            order_by_clause += f"s.[Status] {sort_order}"
+        after_cursor = decode_cursor(request.args.get('after'))
+        before_cursor = decode_cursor(request.args.get('before'))
+        backwards = before_cursor is not None and after_cursor is None
+        seek_values = before_cursor if backwards else after_cursor
+        
+        # Each supported sort key maps to a deterministic sort expression with
+        # SampleID as tiebreaker; see migration/mssql_indexes.sql for the index plan
+        sort_expression = SAMPLE_SORT_KEYS.get(sort_by, SAMPLE_SORT_KEYS['sample_id'])
+        page_conditions = list(where_conditions)
+        page_params = list(query_params)
+        if seek_values and len(seek_values) == 2:
+            seek_sql, seek_params = keyset_predicate(
+                sort_expression, "s.[SampleID]", sort_order, seek_values, backwards, nullable=True
+            )
+            page_conditions.append(seek_sql)
+            page_params.extend(seek_params)
+            offset = 0
         else:
-            order_by_clause += f"s.[SampleID] {sort_order}"  # Default sort
+            # No cursor: first page, or a direct jump to a numbered page
+            offset = (page - 1) * per_page
+        
+        where_clause = ""
+        if page_conditions:
+            where_clause = "WHERE " + " AND ".join(page_conditions)
+        order_by_clause = keyset_order_by(sort_expression, "s.[SampleID]", sort_order, backwards)
         
-        # Get filtered and paginated samples
+        # Get filtered and paginated samples (one extra row tells us if there is a next page)
         query = f"""
         SELECT 
             s.[SampleID], 
@@ -212,7 +219,8 @@ def samples():
             END as Unit,
             ISNULL(sl.[LocationName], 'Disposed') as LocationName, 
             FORMAT(r.[ReceivedDate], 'dd-MM-yyyy HH:mm') AS Registered,
-            s.[Status] 
+            s.[Status],
+            {sort_expression} AS SortValue
         FROM [sample] s
         JOIN [reception] r ON s.[ReceptionID] = r.[ReceptionID]
         LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
@@ -223,13 +231,18 @@ def samples():
         OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
         
-        query_params.extend([offset, per_page])
-        db_results = mssql_db.execute_query(query, query_params, fetch_all=True)
+        page_params.extend([offset, per_page + 1])
+        db_results = list(mssql_db.execute_query(query, page_params, fetch_all=True) or [])
+        
+        has_more = len(db_results) > per_page
+        db_results = db_results[:per_page]
+        if backwards:
+            db_results.reverse()
         
         # Convert database results to template format
         samples_for_template = []
         
-        for row in db_results or []:
+        for row in db_results:
             sample = {
                 "ID": f"SMP-{row[0]}",
                 "PartNumber": row[1] or "",
@@ -241,10 +254,14 @@ def samples():
             }
             samples_for_template.append(sample)
         
+        # Cursors for the neighbouring pages
+        next_cursor = encode_cursor((db_results[-1][8], db_results[-1][0])) if db_results else None
+        prev_cursor = encode_cursor((db_results[0][8], db_results[0][0])) if db_results else None
+        
         # Calculate pagination info
-        total_pages = (total_filtered_samples + per_page - 1) // per_page
-        has_prev = page > 1
-        has_next = page < total_pages
+        total_pages = max((total_filtered_samples + per_page - 1) // per_page, 1)
+        has_prev = has_more if backwards else page > 1
+        has_next = True if backwards else has_more
         
         pagination_info = {
             'page': page,
@@ -268,7 +285,11 @@ def samples():
                             page=pagination_info['page'],
                             per_page=pagination_info['per_page'],
                             total_samples=pagination_info['total'],
-                            total_pages=pagination_info['pages'])
+                            total_pages=pagination_info['pages'],
+                            has_prev=pagination_info['has_prev'],
+                            has_next=pagination_info['has_next'],
+                            next_cursor=next_cursor,
+                            prev_cursor=prev_cursor)
                             
     except Exception as e:
         print(f"Error loading samples page: {e}")
@@ -372,10 +393,7 @@ def storage():
 def disposal_page():
     try:
         # Get users for disposal form
-        users_results = mssql_db.execute_query("""
-            SELECT [UserID], [Name] FROM [user] ORDER BY [Name]
-        """, fetch_all=True)
-        users = [{'UserID': row[0], 'Name': row[1]} for row in users_results]
+        users = get_users()
         
         # Get recent disposals (last 10) - include both manual disposals and automatic consumption
         recent_disposals_results = mssql_db.execute_query("""
@@ -507,380 +525,69 @@ def create_sample():
                 'error': 'Description is required'
             }), 400
         
-        # Create sample via database
-        # Generate barcode if not provided
-        barcode = data.get('barcode', f"BC{datetime.now().strftime('%Y%m%d%H%M%S')}")
-        
-        # Handle supplier ID - make sure it exists or use NULL
-        supplier_id = data.get('supplier')
-        print(f"DEBUG: Original supplier ID from request: {supplier_id} (type: {type(supplier_id)})")
         print(f"DEBUG: Full request data: {data}")
         
-        # Also debug what suppliers exist in database
+        # Registration runs as one pipeline on one connection: a validation
+        # batch (supplier, serials, location, container capacity) and a write
+        # batch (reception, sample, storage, history, serials, containers).
+        # A failure anywhere rolls back everything.
+        reception = prepare_reception(data)
         try:
-            all_suppliers = mssql_db.execute_query("""
-                SELECT TOP 5 [SupplierID], [SupplierName] FROM [supplier] ORDER BY [SupplierID]
-            """, fetch_all=True)
-            print(f"DEBUG: Available suppliers: {all_suppliers}")
-        except Exception as e:
-            print(f"DEBUG: Error checking suppliers: {e}")
-        
-        # Clean up supplier ID - handle empty strings, None, 0, etc.
-        if supplier_id in [None, '', '0', 0, 'null', 'undefined']:
-            supplier_id = None
-            print("DEBUG: Supplier ID set to None (empty/invalid)")
-        else:
-            try:
-                supplier_id = int(supplier_id)
-                # Verify supplier exists
-                supplier_check = mssql_db.execute_query("""
-                    SELECT [SupplierID] FROM [supplier] WHERE [SupplierID] = ?
-                """, (supplier_id,), fetch_one=True)
-                if not supplier_check:
-                    print(f"DEBUG: Supplier ID {supplier_id} not found in database, setting to None")
-                    supplier_id = None
-                else:
-                    print(f"DEBUG: Supplier ID {supplier_id} validated successfully")
-            except (ValueError, TypeError):
-                print(f"DEBUG: Invalid supplier ID format: {supplier_id}, setting to None")
-                supplier_id = None
-        
-        # Pre-validate serial numbers before creating anything
-        serial_numbers = data.get('serialNumbers', [])
-        if serial_numbers and data.get('hasSerialNumbers'):
-            print(f"DEBUG: Pre-validating {len(serial_numbers)} serial numbers")
-            for serial_number in serial_numbers:
-                if serial_number.strip():
-                    existing_check = mssql_db.execute_query("""
-                        SELECT [SampleID] FROM [sampleserialnumber] 
-                        WHERE [SerialNumber] = ? AND [IsActive] = 1
-                    """, (serial_number.strip(),), fetch_one=True)
-                    
-                    if existing_check:
-                        print(f"ERROR: Serial number '{serial_number.strip()}' already exists in sample {existing_check[0]}")
-                        return jsonify({
-                            'success': False,
-                            'error': f'Serial number "{serial_number.strip()}" already exists in the system'
-                        }), 400
-
-        # Use a single transaction for both reception and sample creation
-        print(f"DEBUG: About to create reception and sample in transaction with supplier_id={supplier_id}, user_id={user_id}")
-        
-        # Create everything in a single transaction
-        with mssql_db.transaction() as cursor:
-            # Create reception first  
-            source_type = 'External' if supplier_id else 'Internal'
-            cursor.execute("""
-                INSERT INTO [reception] ([SupplierID], [ReceivedDate], [UserID], [TrackingNumber], [SourceType], [Notes])
-                OUTPUT INSERTED.ReceptionID
-                VALUES (?, GETDATE(), ?, ?, ?, ?)
-            """, (
-                supplier_id,
-                user_id,
-                data.get('trackingNumber', ''),
-                source_type,
-                data.get('other', 'Registered via lab system')
-            ))
-            reception_result = cursor.fetchone()
-            
-            if not reception_result:
-                raise Exception('Failed to create reception')
-                
-            reception_id = reception_result[0]
-            
-            # Create sample using the reception ID
-            cursor.execute("""
-                INSERT INTO [sample] ([Barcode], [PartNumber], [IsUnique], [Type], [Description], [Status], 
-                                      [Amount], [UnitID], [OwnerID], [ReceptionID], [TaskID], [ExpireDate])
-                OUTPUT INSERTED.SampleID
-                VALUES (?, ?, ?, ?, ?, 'In Storage', ?, ?, ?, ?, ?, ?)
-            """, (
-                barcode,
-                data.get('partNumber', ''),
-                1 if data.get('hasSerialNumbers') else 0,
-                data.get('sampleType', 'single').lower(),
-                data.get('description'),
-                int(data.get('totalAmount', 1)),
-                data.get('unit'),
-                data.get('owner'),
-                reception_id,
-                data.get('task'),
-                data.get('expireDate')
-            ))
-            sample_result = cursor.fetchone()
-            
-            if not sample_result:
-                raise Exception('Failed to create sample')
-                
-            sample_id = sample_result[0]
-            print(f"DEBUG: Transaction completed - reception_id={reception_id}, sample_id={sample_id}")
-        
-        if sample_id:
-            # Insert storage record
-            mssql_db.execute_query("""
-                INSERT INTO [samplestorage] ([SampleID], [LocationID], [AmountRemaining], [ExpireDate])
-                VALUES (?, ?, ?, ?)
-            """, (
-                sample_id,
-                data.get('storageLocation', 1),
-                int(data.get('totalAmount', 1)),
-                data.get('expireDate')
-            ))
-            
-            # Log activity
-            mssql_db.execute_query("""
-                INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [Notes])
-                VALUES (GETDATE(), 'Sample registered', ?, ?, ?)
-            """, (
-                user_id,
-                sample_id,
-                f"Sample '{data.get('description')}' registered with {data.get('totalAmount', 1)} units"
-            ))
-            
-            # Insert serial numbers if provided (already pre-validated)
-            if serial_numbers and data.get('hasSerialNumbers'):
-                print(f"DEBUG: Inserting {len(serial_numbers)} pre-validated serial numbers for sample {sample_id}")
-                for serial_number in serial_numbers:
-                    if serial_number.strip():  # Only insert non-empty serial numbers
-                        mssql_db.execute_query("""
-                            INSERT INTO [sampleserialnumber] ([SampleID], [SerialNumber], [CreatedDate], [IsActive])
-                            VALUES (?, ?, GETDATE(), 1)
-                        """, (sample_id, serial_number.strip()))
-                        print(f"DEBUG: Inserted serial number: {serial_number.strip()}")
-            
-            # Handle containers if requested
-            container_ids = []
-            create_containers = data.get('storageOption') == 'container'
-            
-            if create_containers:
-                print(f"DEBUG: Processing container creation")
-                
-                # Check if using existing container
-                if data.get('useExistingContainer') and data.get('existingContainerId'):
-                    container_id = int(data.get('existingContainerId'))
-                    print(f"DEBUG: Using existing container with ID: {container_id}")
-                    
-                    # Check if existing container has enough capacity
-                    capacity_result = mssql_db.execute_query("""
-                        SELECT 
-                            c.[ContainerCapacity],
-                            ISNULL(SUM(cs.[Amount]), 0) as CurrentAmount
-                        FROM [container] c
-                        LEFT JOIN [containersample] cs ON c.[ContainerID] = cs.[ContainerID]
-                        WHERE c.[ContainerID] = ?
-                        GROUP BY c.[ContainerID], c.[ContainerCapacity]
-                    """, (container_id,), fetch_one=True)
-                    
-                    if capacity_result:
-                        container_capacity = capacity_result[0]
-                        current_amount = capacity_result[1] or 0
-                        total_amount = int(data.get('totalAmount', 1))
-                        
-                        if container_capacity and (current_amount + total_amount > container_capacity):
-                            return jsonify({
-                                'success': False,
-                                'error': f'Cannot add {total_amount} samples to container. Current: {current_amount}, Capacity: {container_capacity}, Available: {container_capacity - current_amount}'
-                            }), 400
-                    
-                    container_ids.append(container_id)
-                    
-                    # Add sample to existing container
-                    storage_result = mssql_db.execute_query("""
-                        SELECT [StorageID] FROM [samplestorage] WHERE [SampleID] = ?
-                    """, (sample_id,), fetch_one=True)
-                    
-                    if storage_result:
-                        storage_id = storage_result[0]
-                        mssql_db.execute_query("""
-                            INSERT INTO [containersample] ([ContainerID], [SampleStorageID], [Amount])
-                            VALUES (?, ?, ?)
-                        """, (container_id, storage_id, int(data.get('totalAmount', 1))))
-                
-                else:
-                    # Create new containers
-                    print(f"DEBUG: Creating new containers")
-                    container_count = int(data.get('containerCount', 1))
-                    container_description = data.get('containerDescription', '')
-                    
-                    # Initialize container_type_id
-                    container_type_id = data.get('containerTypeId')
-                    
-                    # Convert to int if it's a string
-                    if container_type_id and str(container_type_id).isdigit():
-                        container_type_id = int(container_type_id)
-                    
-                    # Only check if container type is required when not creating a new one
-                    new_container_type = data.get('newContainerType')
-                    if not container_type_id and not new_container_type:
-                        return jsonify({'success': False, 'error': 'Container type is required'}), 400
-                    
-                    print(f"DEBUG: Starting container creation transaction with count={container_count}")
-                    
-                    # Use single database transaction for both container type and container creation
-                    with mssql_db.get_connection() as conn:
-                        cursor = conn.cursor()
-                        try:
-                            print(f"DEBUG: Transaction started successfully")
-                            
-                            # Create new container type if needed within this transaction
-                            if new_container_type:
-                                print(f"DEBUG: Creating new container type in transaction: {new_container_type}")
-                                
-                                cursor.execute("""
-                                    INSERT INTO [containertype] ([TypeName], [Description], [DefaultCapacity])
-                                    OUTPUT INSERTED.ContainerTypeID
-                                    VALUES (?, ?, ?)
-                                """, (
-                                    new_container_type.get('typeName'),
-                                    new_container_type.get('description', ''),
-                                    int(new_container_type.get('capacity', 50))
-                                ))
-                                
-                                type_result = cursor.fetchone()
-                                if type_result:
-                                    container_type_id = type_result[0]
-                                    print(f"DEBUG: Created new container type with ID: {container_type_id}")
-                                
-                                    # Log the container type creation in same transaction
-                                    cursor.execute("""
-                                        INSERT INTO [history] ([ActionType], [UserID], [Notes], [Timestamp])
-                                        VALUES (?, ?, ?, GETDATE())
-                                    """, (
-                                        'Container type created',
-                                        user_id,
-                                        f"Container type '{new_container_type.get('typeName')}' created"
-                                    ))
-                                else:
-                                    raise Exception('Failed to create new container type')
-                            
-                            print(f"DEBUG: About to create container with final container_type_id={container_type_id}")
-                            
-                            for i in range(container_count):
-                                print(f"DEBUG: Creating container {i+1} of {container_count}")
-                                # Generate unique container barcode
-                                container_barcode = f"CNT{datetime.now().strftime('%Y%m%d%H%M%S')}{str(i).zfill(3)}"
-                                
-                                # Get container capacity from container type
-                                cursor.execute("""
-                                    SELECT [DefaultCapacity] FROM [containertype] WHERE [ContainerTypeID] = ?
-                                """, (container_type_id,))
-                                capacity_result = cursor.fetchone()
-                                container_capacity = capacity_result[0] if capacity_result else 50
-                                
-                                # Create container
-                                print(f"DEBUG: Creating container with barcode={container_barcode}, type_id={container_type_id}, capacity={container_capacity}")
-                                
-                                cursor.execute("""
-                                    INSERT INTO [container] (
-                                        [Barcode], 
-                                        [ContainerTypeID], 
-                                        [Description], 
-                                        [LocationID],
-                                        [ContainerCapacity], 
-                                        [IsMixed],
-                                        [ContainerStatus]
-                                    ) 
-                                    OUTPUT INSERTED.ContainerID
-                                    VALUES (?, ?, ?, ?, ?, ?, 'Active')
-                                """, (
-                                    container_barcode,
-                                    container_type_id,
-                                    container_description,
-                                    data.get('storageLocation', 1),
-                                    container_capacity,
-                                    data.get('containerIsMixed', False)
-                                ))
-                                
-                                container_result = cursor.fetchone()
-                                if container_result:
-                                    container_id = container_result[0]
-                                    container_ids.append(container_id)
-                                    print(f"DEBUG: Successfully created container with ID: {container_id}")
-                                    
-                                    # Add sample to new container in same transaction
-                                    cursor.execute("""
-                                        SELECT [StorageID] FROM [samplestorage] WHERE [SampleID] = ?
-                                    """, (sample_id,))
-                                    storage_result = cursor.fetchone()
-                                    
-                                    if storage_result:
-                                        storage_id = storage_result[0]
-                                        cursor.execute("""
-                                            INSERT INTO [containersample] ([ContainerID], [SampleStorageID], [Amount])
-                                            VALUES (?, ?, ?)
-                                        """, (container_id, storage_id, int(data.get('totalAmount', 1)) // container_count))
-                                        print(f"DEBUG: Added sample {sample_id} to container {container_id}")
-                                    else:
-                                        print(f"ERROR: Could not find storage record for sample {sample_id}")
-                                else:
-                                    print(f"ERROR: Container creation failed - no result returned")
-                            
-                            conn.commit()
-                        except Exception as e:
-                            conn.rollback()
-                            print(f"ERROR: Container creation transaction failed: {e}")
-                            raise
-            
-            # Get additional data for frontend
-            location_name = 'Unknown'
-            if data.get('storageLocation'):
-                location_result = mssql_db.execute_query("""
-                    SELECT [LocationName] FROM [storagelocation] WHERE [LocationID] = ?
-                """, (data.get('storageLocation'),), fetch_one=True)
-                if location_result:
-                    location_name = location_result[0]
-            
-            # Get unit name
-            unit_name = 'pcs'
-            if data.get('unit'):
-                unit_result = mssql_db.execute_query("""
-                    SELECT [UnitName] FROM [unit] WHERE [UnitID] = ?
-                """, (data.get('unit'),), fetch_one=True)
-                if unit_result:
-                    unit_name = unit_result[0]
+            spec = prepare_specs([data])[0]
             
-            # Get task name if applicable
-            task_name = None
-            if data.get('task'):
-                task_result = mssql_db.execute_query("""
-                    SELECT [TaskName] FROM [task] WHERE [TaskID] = ?
-                """, (data.get('task'),), fetch_one=True)
-                if task_result:
-                    task_name = task_result[0]
-            
-            response_data = {
-                'success': True,
-                'sample_id': sample_id,
-                'reception_id': reception_id,
-                'barcode': barcode,
-                'sample_data': {
-                    'SampleID': sample_id,
-                    'SampleIDFormatted': f'SMP-{sample_id}',
-                    'Description': data.get('description'),
-                    'Barcode': barcode,
-                    'PartNumber': data.get('partNumber', ''),
-                    'Type': data.get('sampleType', 'single'),
-                    'Amount': int(data.get('totalAmount', 1)),
-                    'UnitName': unit_name,
-                    'LocationName': location_name,
-                    'ExpireDate': data.get('expireDate', ''),
-                    'SerialNumbers': data.get('serialNumbers', []),
-                    'HasSerialNumbers': bool(data.get('hasSerialNumbers')),
-                    'TaskName': task_name
-                }
+            with mssql_db.transaction() as cursor:
+                reception['supplier_id'] = check_against_database(cursor, [spec], reception['supplier_id'])
+                print(f"DEBUG: Registering sample with supplier_id={reception['supplier_id']}, user_id={user_id}")
+                create_container_types(cursor, [spec], user_id)
+                reception_id, results = insert_registration(cursor, reception, [spec], user_id)
+        except RegistrationError as e:
+            print(f"ERROR: Sample registration rejected: {e.errors}")
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        result = results[0]
+        sample_id = result['sample_id']
+        barcode = result['barcode']
+        container_ids = result['container_ids']
+        print(f"DEBUG: Transaction completed - reception_id={reception_id}, sample_id={sample_id}, containers={container_ids}")
+        
+        index_sample(sample_id, data.get('description'), data.get('partNumber', ''), barcode)
+        if (spec['container'] or {}).get('new_type'):
+            bump_version(CONTAINER_TYPE)
+        for container_id, container_barcode in result['container_barcodes'].items():
+            index_container(container_id, data.get('containerDescription', ''), container_barcode)
+        invalidate_container_details((spec['container'] or {}).get('existing_id'))
+        
+        response_data = {
+            'success': True,
+            'sample_id': sample_id,
+            'reception_id': reception_id,
+            'barcode': barcode,
+            'sample_data': {
+                'SampleID': sample_id,
+                'SampleIDFormatted': f'SMP-{sample_id}',
+                'Description': data.get('description'),
+                'Barcode': barcode,
+                'PartNumber': data.get('partNumber', ''),
+                'Type': data.get('sampleType', 'single'),
+                'Amount': int(data.get('totalAmount', 1)),
+                'UnitName': result['unit_name'] or 'pcs',
+                'LocationName': (result['location_name'] if data.get('storageLocation') else None) or 'Unknown',
+                'ExpireDate': data.get('expireDate', ''),
+                'SerialNumbers': data.get('serialNumbers', []),
+                'HasSerialNumbers': bool(data.get('hasSerialNumbers')),
+                'TaskName': result['task_name']
             }
-            
-            # Add container information if containers were created
-            if create_containers:
-                if container_ids:
-                    response_data['container_ids'] = container_ids
-                    print(f"DEBUG: Added container_ids to response: {container_ids}")
-                else:
-                    print(f"DEBUG: Containers were requested but none were created successfully")
-            
-            return jsonify(response_data)
-        else:
-            return jsonify({'success': False, 'error': 'Failed to create sample'}), 500
+        }
+        
+        # Add container information if containers were created
+        if data.get('storageOption') == 'container':
+            if container_ids:
+                response_data['container_ids'] = container_ids
+                print(f"DEBUG: Added container_ids to response: {container_ids}")
+            else:
+                print(f"DEBUG: Containers were requested but none were created successfully")
+        
+        return jsonify(response_data)
             
     except Exception as e:
         print(f"API error: {e}")
@@ -888,6 +595,141 @@ def create_sample():
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@sample_mssql_bp.route('/api/samples/bulk', methods=['POST'])
+def create_samples_bulk():
+    """
+    Register many samples on one shared reception.
+    Body: {reception: {supplier, trackingNumber, other}, samples: [<POST /api/samples payload>...],
+           printLabels: bool}
+    Everything is validated first; nothing is written unless every sample is valid.
+    """
+    try:
+        data = request.json or {}
+        user_id = 1  # TODO: Implement proper user authentication
+        reception = prepare_reception(data.get('reception') or data)
+        
+        try:
+            prepared = prepare_specs(data.get('samples') or [])
+            
+            with mssql_db.transaction() as cursor:
+                reception['supplier_id'] = check_against_database(cursor, prepared, reception['supplier_id'])
+                create_container_types(cursor, prepared, user_id)
+                reception_id, results = insert_registration(cursor, reception, prepared, user_id)
+        except RegistrationError as e:
+            print(f"DEBUG: Bulk registration rejected: {e.errors}")
+            return jsonify({'success': False, 'error': str(e), 'errors': e.errors}), 400
+        
+        print(f"DEBUG: Bulk registration created {len(results)} samples on reception {reception_id}")
+        if any((spec['container'] or {}).get('new_type') for spec in prepared):
+            bump_version(CONTAINER_TYPE)
+        
+        for spec, result in zip(prepared, results):
+            index_sample(result['sample_id'], spec['description'], spec['part_number'], spec['barcode'])
+            container = spec['container'] or {}
+            for container_id, container_barcode in result['container_barcodes'].items():
+                index_container(container_id, container.get('description', ''), container_barcode)
+            invalidate_container_details(container.get('existing_id'))
+        
+        labels_queued = 0
+        if data.get('printLabels'):
+            labels_queued = queue_sample_labels(
+                current_app._get_current_object(),
+                _sample_label_data([result['sample_id'] for result in results])
+            )
+        
+        return jsonify({
+            'success': True,
+            'reception_id': reception_id,
+            'count': len(results),
+            'samples': [{
+                'index': result['index'],
+                'sample_id': result['sample_id'],
+                'SampleIDFormatted': f"SMP-{result['sample_id']}",
+                'barcode': result['barcode'],
+                'container_ids': result['container_ids']
+            } for result in results],
+            'labels_queued': labels_queued
+        })
+    except Exception as e:
+        print(f"API error in bulk registration: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _sample_label_data(sample_ids):
+    """Label data for print_sample_label, fetched for all samples in one query"""
+    rows = mssql_db.execute_query(f"""
+        SELECT s.[SampleID], s.[Description], s.[PartNumber], s.[Barcode], s.[Amount], s.[Type],
+               s.[ExpireDate], u.[UnitName], sl.[LocationName], t.[TaskName]
+        FROM [sample] s
+        LEFT JOIN [unit] u ON s.[UnitID] = u.[UnitID]
+        LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
+        LEFT JOIN [storagelocation] sl ON ss.[LocationID] = sl.[LocationID]
+        LEFT JOIN [task] t ON s.[TaskID] = t.[TaskID]
+        WHERE {id_list_filter('s.[SampleID]')}
+        ORDER BY s.[SampleID]
+    """, (id_list_param(sample_ids),), fetch_all=True)
+    
+    return [{
+        'SampleID': row[0],
+        'SampleIDFormatted': f'SMP-{row[0]}',
+        'Description': row[1] or '',
+        'PartNumber': row[2] or '',
+        'Barcode': row[3] or '',
+        'Amount': row[4] or 1,
+        'Type': row[5] or 'Standard',
+        'ExpireDate': row[6].strftime('%d-%m-%Y') if row[6] else '',
+        'UnitName': 'pcs' if (row[7] or '').lower() == 'stk' else (row[7] or 'pcs'),
+        'LocationName': row[8] or '',
+        'TaskName': row[9] or 'None'
+    } for row in rows or []]
+
+# Errors returned inline by the import endpoint; the CLI writes the full report
+IMPORT_MAX_REPORTED_ERRORS = 5000
+
+@sample_mssql_bp.route('/api/samples/import', methods=['POST'])
+def import_samples_file():
+    """
+    Import a supplier manifest (CSV or XLSX upload, form field 'file').
+    Form fields: supplier (name or ID), trackingNumber, dryRun ('true' validates only).
+    Valid rows are registered in chunks; invalid rows are reported by row number.
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+        
+        user_id = 1  # TODO: Implement proper user authentication
+        dry_run = request.form.get('dryRun', '').lower() == 'true'
+        
+        def log_progress(report):
+            print(f"DEBUG: Import {upload.filename}: {report.rows} rows read, "
+                  f"{report.imported} imported, {report.failed} failed")
+        
+        try:
+            report = run_sample_import(
+                upload.stream,
+                upload.filename,
+                supplier=request.form.get('supplier'),
+                tracking_number=request.form.get('trackingNumber', ''),
+                user_id=user_id,
+                dry_run=dry_run,
+                progress=log_progress,
+                max_errors=IMPORT_MAX_REPORTED_ERRORS
+            )
+        except SampleImportError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if report.stopped:
+            # Chunks before the failing one are committed; the report lists them
+            return jsonify(dict(report.as_dict(), success=False, error=report.stopped)), 500
+        return jsonify(dict(report.as_dict(), success=True))
+    except Exception as e:
+        print(f"API error in sample import: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @sample_mssql_bp.route('/api/samples/<int:sample_id>', methods=['DELETE'])
 def delete_sample(sample_id):
     try:
@@ -896,10 +738,13 @@ def delete_sample(sample_id):
         # Delete related records first (foreign key constraints)
         mssql_db.execute_query("DELETE FROM [history] WHERE [SampleID] = ?", (sample_id,))
         mssql_db.execute_query("DELETE FROM [testsampleusage] WHERE [SampleID] = ?", (sample_id,))
-        mssql_db.execute_query("DELETE FROM [containersample] WHERE [SampleStorageID] IN (SELECT [StorageID] FROM [samplestorage] WHERE [SampleID] = ?)", (sample_id,))
+        with mssql_db.transaction() as cursor:
+            remove_sample_from_containers(cursor, sample_id)
+        clear_container_details()
         mssql_db.execute_query("DELETE FROM [samplestorage] WHERE [SampleID] = ?", (sample_id,))
         mssql_db.execute_query("DELETE FROM [sampleserialnumber] WHERE [SampleID] = ?", (sample_id,))
         mssql_db.execute_query("DELETE FROM [sample] WHERE [SampleID] = ?", (sample_id,))
+        remove_document(SAMPLE, sample_id)
         
         # Log deletion
         mssql_db.execute_query("""
@@ -927,14 +772,8 @@ def get_active_samples():
         search_conditions = ""
         search_params = []
         if search:
-            search_conditions = """
-                AND (s.[Description] LIKE ? 
-                     OR s.[Barcode] LIKE ? 
-                     OR s.[PartNumber] LIKE ?
-                     OR ('SMP-' + CAST(s.[SampleID] AS NVARCHAR)) LIKE ?)
-            """
-            search_term = f"%{search}%"
-            search_params = [search_term, search_term, search_term, search_term]
+            search_sql, search_params = _sample_search_condition(search)
+            search_conditions = f"AND {search_sql}"
         
         # Get total count
         count_query = f"""
@@ -975,6 +814,9 @@ def get_active_samples():
         
         results = mssql_db.execute_query(main_query, search_params + [offset, per_page], fetch_all=True)
         
+        # Serial numbers for every unique sample on the page in one query
+        serials_by_sample = fetch_serial_numbers([row[0] for row in results or [] if row[8] == 1])
+        
         samples = []
         for row in results or []:
             sample_dict = {
@@ -990,13 +832,8 @@ def get_active_samples():
                 'IsUnique': row[8]
             }
             
-            # Get serial numbers for unique samples
             if sample_dict['IsUnique'] == 1:
-                serials = mssql_db.execute_query("""
-                    SELECT [SerialNumber] FROM [sampleserialnumber] 
-                    WHERE [SampleID] = ? AND [IsActive] = 1
-                """, (row[0],), fetch_all=True)
-                sample_dict['SerialNumbers'] = [s[0] for s in serials or []]
+                sample_dict['SerialNumbers'] = serials_by_sample.get(row[0], [])
                 sample_dict['AmountRemaining'] = len(sample_dict['SerialNumbers'])
             
             samples.append(sample_dict)
@@ -1024,14 +861,153 @@ def get_active_samples():
             'error': str(e)
         }), 500
 
+# Sections that /api/samples/<id>?include=... can add to the sample. Every
+# query reads @sample_id and becomes one result set of the same batch.
+SAMPLE_DETAIL_SECTIONS = {
+    'serials': """
+        SELECT [SerialNumber] FROM [sampleserialnumber]
+        WHERE [SampleID] = @sample_id AND [IsActive] = 1
+        ORDER BY [CreatedDate]
+    """,
+    'history': """
+        SELECT 
+            h.[LogID],
+            FORMAT(h.[Timestamp], 'dd-MM-yyyy HH:mm') as Timestamp,
+            h.[ActionType],
+            u.[Name] as UserName,
+            h.[Notes]
+        FROM [history] h
+        LEFT JOIN [user] u ON h.[UserID] = u.[UserID]
+        WHERE h.[SampleID] = @sample_id
+        ORDER BY h.[Timestamp] DESC
+    """,
+    'storage': """
+        SELECT ss.[StorageID], ss.[LocationID], sl.[LocationName], ss.[AmountRemaining],
+               FORMAT(ss.[ExpireDate], 'dd-MM-yyyy') as ExpireDate
+        FROM [samplestorage] ss
+        LEFT JOIN [storagelocation] sl ON ss.[LocationID] = sl.[LocationID]
+        WHERE ss.[SampleID] = @sample_id
+    """,
+    'container': """
+        SELECT c.[ContainerID], c.[Description], ct.[TypeName], c.[ContainerCapacity],
+               sl.[LocationName], cs.[Amount]
+        FROM [samplestorage] ss
+        JOIN [containersample] cs ON ss.[StorageID] = cs.[SampleStorageID]
+        JOIN [container] c ON cs.[ContainerID] = c.[ContainerID]
+        LEFT JOIN [containertype] ct ON c.[ContainerTypeID] = ct.[ContainerTypeID]
+        LEFT JOIN [storagelocation] sl ON c.[LocationID] = sl.[LocationID]
+        WHERE ss.[SampleID] = @sample_id
+    """,
+    'tests': """
+        SELECT tsu.[UsageID], tsu.[TestID], t.[TestNo], t.[TestName], tsu.[SampleIdentifier],
+               tsu.[AmountAllocated], tsu.[Status], FORMAT(tsu.[CreatedDate], 'dd-MM-yyyy HH:mm') as CreatedDate
+        FROM [testsampleusage] tsu
+        JOIN [test] t ON tsu.[TestID] = t.[TestID]
+        WHERE tsu.[SampleID] = @sample_id
+        ORDER BY tsu.[CreatedDate] DESC
+    """,
+    # Everything the move dialog offers as a destination
+    'move_targets': """
+        SELECT 
+            c.[ContainerID],
+            c.[Description],
+            c.[ContainerCapacity],
+            c.[CurrentAmount],
+            ISNULL(sl.[LocationName], 'Unknown') as LocationName
+        FROM [container] c
+        LEFT JOIN [storagelocation] sl ON c.[LocationID] = sl.[LocationID]
+        WHERE c.[ContainerStatus] = 'Active' OR c.[ContainerStatus] IS NULL
+        ORDER BY c.[ContainerID] DESC
+    """
+}
+
+# Sections returned when no include parameter is given (original response)
+DEFAULT_SAMPLE_SECTIONS = ('serials', 'history')
+
+def _build_sample_section(section, rows):
+    if section == 'serials':
+        return 'serial_numbers', [row[0] for row in rows]
+    if section == 'history':
+        return 'history', [{
+            'LogID': int(row[0]) if row[0] else None,
+            'Timestamp': str(row[1]) if row[1] else None,
+            'ActionType': row[2],
+            'UserName': row[3],
+            'Notes': row[4]
+        } for row in rows]
+    if section == 'storage':
+        return 'storage', [{
+            'StorageID': row[0],
+            'LocationID': row[1],
+            'LocationName': row[2],
+            'AmountRemaining': float(row[3]) if row[3] is not None else 0.0,
+            'ExpireDate': row[4]
+        } for row in rows]
+    if section == 'container':
+        return 'containers', [{
+            'ContainerID': row[0],
+            'Description': row[1],
+            'TypeName': row[2],
+            'ContainerCapacity': row[3],
+            'LocationName': row[4],
+            'Amount': row[5]
+        } for row in rows]
+    if section == 'tests':
+        return 'tests', [{
+            'UsageID': row[0],
+            'TestID': row[1],
+            'TestNo': row[2],
+            'TestName': row[3],
+            'SampleIdentifier': row[4],
+            'AmountAllocated': row[5],
+            'Status': row[6],
+            'CreatedDate': row[7]
+        } for row in rows]
+    # move_targets: available containers from the query, locations from the reference cache
+    containers = []
+    for row in rows:
+        current_amount = row[3] or 0
+        capacity = row[2] or 0
+        containers.append({
+            'ContainerID': row[0],
+            'Description': row[1],
+            'ContainerCapacity': capacity,
+            'CurrentAmount': current_amount,
+            'AvailableSpace': max(0, capacity - current_amount) if capacity > 0 else 0,
+            'LocationName': row[4] or 'Unknown'
+        })
+    locations = [{'LocationID': l['LocationID'], 'LocationName': l['LocationName']} for l in get_locations()]
+    return 'move_targets', {'containers': containers, 'locations': locations}
+
 @sample_mssql_bp.route('/api/samples/<int:sample_id>', methods=['GET'])
 def get_sample_details(sample_id):
     """
     Get detailed information about a specific sample - CRITICAL FOR DETAILS BUTTON!
+    
+    Optional query parameters:
+      include=serials,history,storage,container,tests,move_targets
+              sections to return (default: serials,history)
+      fields=Description,Unit,...
+              keys of the sample object to return (default: all)
+    The sample and every section are read with one batch on one connection.
     """
     try:
-        # Get sample basic info
-        sample_result = mssql_db.execute_query("""
+        include_param = request.args.get('include')
+        if include_param is None:
+            sections = list(DEFAULT_SAMPLE_SECTIONS)
+        else:
+            requested = [name.strip() for name in include_param.split(',') if name.strip()]
+            unknown = [name for name in requested if name not in SAMPLE_DETAIL_SECTIONS]
+            if unknown:
+                return jsonify({
+                    'success': False,
+                    'error': f"Unknown include section(s): {', '.join(unknown)}"
+                }), 400
+            sections = list(dict.fromkeys(requested))
+        
+        batch = ["""
+            SET NOCOUNT ON;
+            DECLARE @sample_id INT = ?;
             SELECT 
                 s.[SampleID],
                 s.[PartNumber],
@@ -1064,17 +1040,28 @@ def get_sample_details(sample_id):
             LEFT JOIN [container] c ON cs.[ContainerID] = c.[ContainerID]
             LEFT JOIN [unit] un ON s.[UnitID] = un.[UnitID]
             LEFT JOIN [supplier] sp ON r.[SupplierID] = sp.[SupplierID]
-            WHERE s.[SampleID] = ?
-        """, (sample_id,), fetch_one=True)
+            WHERE s.[SampleID] = @sample_id
+        """] + [SAMPLE_DETAIL_SECTIONS[section] for section in sections]
         
-        if not sample_result:
+        with mssql_db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(';\n'.join(batch), (sample_id,))
+                result_sets = fetch_result_sets(cursor, len(batch))
+            finally:
+                cursor.close()
+        
+        sample_rows = result_sets[0]
+        if not sample_rows:
             return jsonify({
                 'success': False,
                 'error': f'Sample with ID {sample_id} not found'
             }), 404
+        sample_result = sample_rows[0]
         
         sample = {
             'SampleID': str(sample_result[0]),
+            'SampleIDFormatted': f'SMP-{sample_result[0]}',
             'PartNumber': sample_result[1],
             'Description': sample_result[2],
             'Barcode': sample_result[3],
@@ -1093,44 +1080,19 @@ def get_sample_details(sample_id):
             'ReceivedBy': sample_result[16]
         }
         
-        # Get serial numbers
-        serial_results = mssql_db.execute_query("""
-            SELECT [SerialNumber] FROM [sampleserialnumber] 
-            WHERE [SampleID] = ? AND [IsActive] = 1
-            ORDER BY [CreatedDate]
-        """, (sample_id,), fetch_all=True)
-        serial_numbers = [row[0] for row in serial_results or []]
+        # Field projection - SampleID is always returned
+        fields_param = request.args.get('fields')
+        if fields_param:
+            fields = {name.strip() for name in fields_param.split(',') if name.strip()}
+            fields.add('SampleID')
+            sample = {key: value for key, value in sample.items() if key in fields}
         
-        # Get sample history
-        history_results = mssql_db.execute_query("""
-            SELECT 
-                h.[LogID],
-                FORMAT(h.[Timestamp], 'dd-MM-yyyy HH:mm') as Timestamp,
-                h.[ActionType],
-                u.[Name] as UserName,
-                h.[Notes]
-            FROM [history] h
-            LEFT JOIN [user] u ON h.[UserID] = u.[UserID]
-            WHERE h.[SampleID] = ?
-            ORDER BY h.[Timestamp] DESC
-        """, (sample_id,), fetch_all=True)
-        
-        history = []
-        for row in history_results or []:
-            history.append({
-                'LogID': int(row[0]) if row[0] else None,
-                'Timestamp': str(row[1]) if row[1] else None,
-                'ActionType': row[2],
-                'UserName': row[3],
-                'Notes': row[4]
-            })
+        response = {'success': True, 'sample': sample}
+        for section, rows in zip(sections, result_sets[1:]):
+            key, value = _build_sample_section(section, rows)
+            response[key] = value
         
-        return jsonify({
-            'success': True,
-            'sample': sample,
-            'history': history,
-            'serial_numbers': serial_numbers
-        })
+        return jsonify(response)
     except Exception as e:
         print(f"API error getting sample details: {e}")
         import traceback
@@ -1231,60 +1193,109 @@ def create_disposal():
         sample_id = data['sampleId']
         disposal_amount = int(data['amount'])
         
-        # Get current amount from storage
-        storage_result = mssql_db.execute_query("""
-            SELECT [StorageID], [AmountRemaining] 
-            FROM [samplestorage] 
-            WHERE [SampleID] = ? AND [AmountRemaining] > 0
-        """, (sample_id,), fetch_one=True)
+        # Log the disposal
+        notes = data.get('notes') or "Disposed through system"
+        notes = f"Amount: {disposal_amount} - {notes}"
         
-        if not storage_result:
+        # Guarded stock update - a concurrent allocation cannot make this overdraw
+        try:
+            with mssql_db.transaction() as cursor:
+                storage_id, new_amount = take_stock(cursor, sample_id, disposal_amount)
+                if storage_id is None:
+                    raise InsufficientStockError('No available storage for this sample')
+                
+                # If all amount is disposed, update sample status
+                if new_amount == 0:
+                    cursor.execute("""
+                        UPDATE [sample] 
+                        SET [Status] = 'Consumed' 
+                        WHERE [SampleID] = ?
+                    """, (sample_id,))
+                
+                cursor.execute("""
+                    INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [Notes])
+                    VALUES (GETDATE(), 'Disposed', ?, ?, ?)
+                """, (user_id, sample_id, notes))
+        except InsufficientStockError as e:
             return jsonify({
                 'success': False,
-                'error': 'No available storage for this sample'
+                'error': str(e)
             }), 400
         
-        storage_id = storage_result[0]
-        amount_remaining = storage_result[1]
+        return jsonify({
+            'success': True,
+            'message': f"Successfully disposed {disposal_amount} units of sample SMP-{sample_id}"
+        })
         
-        if disposal_amount > amount_remaining:
-            return jsonify({
-                'success': False,
-                'error': f'Requested amount ({disposal_amount}) exceeds available amount ({amount_remaining})'
-            }), 400
+    except Exception as e:
+        print(f"API error creating disposal: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@sample_mssql_bp.route('/api/samples/bulk-move', methods=['POST'])
+def bulk_move_samples():
+    """
+    Move many samples to one storage location.
+    Body: {sampleIds: [...], locationId}
+    Samples that cannot be moved are listed in 'failed'; the rest are moved.
+    """
+    try:
+        from app.utils.mssql_db import get_current_user_id
+        data = request.json or {}
+        user_id = get_current_user_id()  # Get actual current user
         
-        # Update storage amount
-        new_amount = amount_remaining - disposal_amount
-        mssql_db.execute_query("""
-            UPDATE [samplestorage] 
-            SET [AmountRemaining] = ?
-            WHERE [StorageID] = ?
-        """, (new_amount, storage_id))
+        if not data.get('locationId'):
+            return jsonify({'success': False, 'error': 'Location ID is required'}), 400
         
-        # If all amount is disposed, update sample status
-        if new_amount == 0:
-            mssql_db.execute_query("""
-                UPDATE [sample] 
-                SET [Status] = 'Consumed' 
-                WHERE [SampleID] = ?
-            """, (sample_id,))
+        try:
+            sample_ids = parse_sample_ids(data.get('sampleIds'))
+            with mssql_db.transaction() as cursor:
+                location_name, moved, failed = bulk_move(cursor, sample_ids, int(data['locationId']), user_id)
+        except BulkOperationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # Log the disposal
-        notes = data.get('notes') or "Disposed through system"
-        notes = f"Amount: {disposal_amount} - {notes}"
+        print(f"DEBUG: Bulk move to {location_name}: {len(moved)} moved, {len(failed)} failed")
+        return jsonify({
+            'success': True,
+            'message': f'{len(moved)} of {len(sample_ids)} samples moved to {location_name}',
+            'location_name': location_name,
+            'moved': moved,
+            'failed': failed
+        })
+    except Exception as e:
+        print(f"API error in bulk move: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@sample_mssql_bp.route('/api/samples/bulk-dispose', methods=['POST'])
+def bulk_dispose_samples():
+    """
+    Dispose many samples at once.
+    Body: {samples: [{sampleId, amount}], notes} or {sampleIds: [...], amount, notes};
+    without an amount everything remaining is disposed.
+    Samples that cannot be disposed are listed in 'failed'; the rest are disposed.
+    """
+    try:
+        from app.utils.mssql_db import get_current_user_id
+        data = request.json or {}
+        user_id = get_current_user_id()  # Get actual current user
         
-        mssql_db.execute_query("""
-            INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [Notes])
-            VALUES (GETDATE(), 'Disposed', ?, ?, ?)
-        """, (user_id, sample_id, notes))
+        try:
+            items = parse_disposal_items(data)
+            with mssql_db.transaction() as cursor:
+                disposed, failed = bulk_dispose(cursor, items, user_id, data.get('notes'))
+        except BulkOperationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
+        print(f"DEBUG: Bulk disposal: {len(disposed)} disposed, {len(failed)} failed")
         return jsonify({
             'success': True,
-            'message': f"Successfully disposed {disposal_amount} units of sample SMP-{sample_id}"
+            'message': f'{len(disposed)} of {len(items)} samples disposed',
+            'disposed': disposed,
+            'failed': failed
         })
-        
     except Exception as e:
-        print(f"API error creating disposal: {e}")
+        print(f"API error in bulk disposal: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1304,65 +1315,14 @@ def global_search():
                 'results': []
             })
         
-        search_param = f"%{search_term}%"
-        
-        # Search samples
-        sample_results = mssql_db.execute_query("""
-            SELECT TOP 10
-                'Sample' as result_type,
-                'SMP-' + CAST(s.[SampleID] AS NVARCHAR) as id,
-                s.[Description] as title,
-                ISNULL(s.[PartNumber], 'No part number') as subtitle,
-                s.[Status] as status,
-                '/storage?search=' + ? as url
-            FROM [sample] s
-            WHERE s.[Description] LIKE ? OR s.[PartNumber] LIKE ? OR s.[Barcode] LIKE ?
-        """, (search_term, search_param, search_param, search_param), fetch_all=True)
-        
-        # Search locations
-        location_results = mssql_db.execute_query("""
-            SELECT TOP 5
-                'Location' as result_type,
-                'LOC-' + CAST(sl.[LocationID] AS NVARCHAR) as id,
-                sl.[LocationName] as title,
-                l.[LabName] as subtitle,
-                'Active' as status,
-                '/storage?location=' + CAST(sl.[LocationID] AS NVARCHAR) as url
-            FROM [storagelocation] sl
-            JOIN [lab] l ON sl.[LabID] = l.[LabID]
-            WHERE sl.[LocationName] LIKE ?
-        """, (search_param,), fetch_all=True)
-        
-        # Search tests
-        test_results = mssql_db.execute_query("""
-            SELECT TOP 5
-                'Test' as result_type,
-                'TST-' + CAST(t.[TestID] AS NVARCHAR) as id,
-                'Test #' + CAST(t.[TestID] AS NVARCHAR) as title,
-                u.[Name] as subtitle,
-                t.[Status] as status,
-                '/testing' as url
-            FROM [test] t
-            JOIN [user] u ON t.[UserID] = u.[UserID]
-            WHERE CAST(t.[TestID] AS NVARCHAR) LIKE ?
-        """, (search_param,), fetch_all=True)
-        
-        # Combine results
-        results = []
-        for row in (sample_results or []) + (location_results or []) + (test_results or []):
-            results.append({
-                'result_type': row[0],
-                'id': row[1],
-                'title': row[2],
-                'subtitle': row[3],
-                'status': row[4],
-                'url': row[5]
-            })
+        # Identifier lookups or one ranked UNION ALL batch over all entity types
+        results, search_meta = run_global_search(search_term)
         
         return jsonify({
             'success': True,
             'query': search_term,
-            'results': results
+            'results': results,
+            'meta': search_meta
         })
     except Exception as e:
         print(f"API error in global search: {e}")
@@ -1519,12 +1479,9 @@ def remove_sample_from_container(sample_id):
         
         if container_result:
             # Remove from container
-            mssql_db.execute_query("""
-                DELETE FROM [containersample] 
-                WHERE [SampleStorageID] IN (
-                    SELECT [StorageID] FROM [samplestorage] WHERE [SampleID] = ?
-                )
-            """, (sample_id,))
+            with mssql_db.transaction() as cursor:
+                remove_sample_from_containers(cursor, sample_id)
+            invalidate_container_details(container_result[0])
             
             container_name = container_result[1] or f"Container {container_result[0]}"
             
@@ -1655,6 +1612,8 @@ def create_supplier():
         supplier_id = supplier_result[0] if supplier_result else None
         
         if supplier_id:
+            bump_version(SUPPLIER)
+            
             # Log the action
             mssql_db.execute_query("""
                 INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [Notes])
@@ -1711,41 +1670,8 @@ def validate_serial_numbers():
                     'error': 'Sample is not marked as unique'
                 }), 400
         
-        validation_results = []
-        duplicates = []
-        
-        for serial_num in serial_numbers:
-            # Check if serial number already exists
-            if sample_id:
-                # For existing samples, exclude self from duplicate check
-                existing = mssql_db.execute_query("""
-                    SELECT sn.[SampleID], s.[Description]
-                    FROM [sampleserialnumber] sn
-                    JOIN [sample] s ON sn.[SampleID] = s.[SampleID]
-                    WHERE sn.[SerialNumber] = ? AND sn.[SampleID] != ? AND sn.[IsActive] = 1
-                """, (serial_num, sample_id), fetch_one=True)
-            else:
-                # For new samples during registration, check all existing serial numbers
-                existing = mssql_db.execute_query("""
-                    SELECT sn.[SampleID], s.[Description]
-                    FROM [sampleserialnumber] sn
-                    JOIN [sample] s ON sn.[SampleID] = s.[SampleID]
-                    WHERE sn.[SerialNumber] = ? AND sn.[IsActive] = 1
-                """, (serial_num,), fetch_one=True)
-            
-            if existing:
-                validation_results.append({
-                    'serial_number': serial_num,
-                    'valid': False,
-                    'error': f'Already used by sample {existing[0]}: {existing[1]}'
-                })
-                duplicates.append(serial_num)
-            else:
-                validation_results.append({
-                    'serial_number': serial_num,
-                    'valid': True,
-                    'error': None
-                })
+        # One set-based lookup for the whole batch; in-batch repeats are flagged too
+        validation_results, duplicates = validate_serials_batch(serial_numbers, exclude_sample_id=sample_id)
         
         return jsonify({
             'success': True,
@@ -1863,50 +1789,34 @@ def get_last_sample():
 
 @sample_mssql_bp.route('/api/samples/available-for-task', methods=['GET'])
 def get_samples_available_for_task():
-    """Get samples available for assignment to tasks - CRITICAL FOR TASK MANAGEMENT!"""
+    """
+    Picker for samples that can be assigned to a task - CRITICAL FOR TASK MANAGEMENT!
+    Keyset-paginated on SampleID (pass pagination.next_cursor back as ?cursor=)
+    with no COUNT; see picker_search_condition for how search terms match.
+    """
     try:
         task_id = request.args.get('task_id', type=int)
         search = request.args.get('search', '').strip()
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
-        offset = (page - 1) * per_page
+        per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
+        cursor_values = decode_cursor(request.args.get('cursor'))
         
-        # Build search condition
-        search_condition = ""
-        search_params = []
+        conditions = [
+            "s.[Status] = 'In Storage'",
+            "(ss.[AmountRemaining] > 0 OR ss.[AmountRemaining] IS NULL)",
+            "(s.[TaskID] IS NULL OR s.[TaskID] != ?)"
+        ]
+        params = [task_id or 0]
         if search:
-            search_condition = """
-                AND (s.[SampleID] = ?
-                     OR s.[Description] LIKE ? 
-                     OR s.[PartNumber] LIKE ?
-                     OR s.[Barcode] LIKE ?
-                     OR CONCAT('SMP-', s.[SampleID]) LIKE ?)
-            """
-            search_term = f"%{search}%"
-            # Try to parse as SampleID (integer)
-            try:
-                sample_id_search = int(search.replace('SMP-', '').replace('smp-', ''))
-                search_params = [sample_id_search, search_term, search_term, search_term, search_term]
-            except ValueError:
-                # If not a valid integer, use 0 for SampleID search and rely on text searches
-                search_params = [0, search_term, search_term, search_term, search_term]
-        
-        # Get count of available samples
-        count_query = f"""
-            SELECT COUNT(*)
-            FROM [sample] s
-            LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
-            WHERE s.[Status] = 'In Storage' 
-            AND (ss.[AmountRemaining] > 0 OR ss.[AmountRemaining] IS NULL)
-            AND (s.[TaskID] IS NULL OR s.[TaskID] != ?)
-            {search_condition}
-        """
-        count_params = [task_id] + search_params if task_id else [0] + search_params
-        total_count = mssql_db.execute_query(count_query, count_params, fetch_one=True)[0]
-        
-        # Get available samples
-        main_query = f"""
-            SELECT 
+            search_sql, search_params = picker_search_condition(search)
+            conditions.append(search_sql)
+            params.extend(search_params)
+        if cursor_values:
+            conditions.append("s.[SampleID] < ?")
+            params.append(cursor_values[0])
+        
+        # One extra row tells whether there is a next page
+        results = mssql_db.execute_query(f"""
+            SELECT TOP (?)
                 s.[SampleID],
                 s.[Description],
                 s.[PartNumber],
@@ -1925,19 +1835,15 @@ def get_samples_available_for_task():
             LEFT JOIN [storagelocation] sl ON ss.[LocationID] = sl.[LocationID]
             LEFT JOIN [unit] un ON s.[UnitID] = un.[UnitID]
             LEFT JOIN [reception] r ON s.[ReceptionID] = r.[ReceptionID]
-            WHERE s.[Status] = 'In Storage' 
-            AND (ss.[AmountRemaining] > 0 OR ss.[AmountRemaining] IS NULL)
-            AND (s.[TaskID] IS NULL OR s.[TaskID] != ?)
-            {search_condition}
+            WHERE {' AND '.join(conditions)}
             ORDER BY s.[SampleID] DESC
-            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-        """
-        main_params = count_params + [offset, per_page]
+        """, [per_page + 1] + params, fetch_all=True) or []
         
-        results = mssql_db.execute_query(main_query, main_params, fetch_all=True)
+        has_next = len(results) > per_page
+        results = results[:per_page]
         
         samples = []
-        for row in results or []:
+        for row in results:
             samples.append({
                 'SampleID': row[0],
                 'SampleIDFormatted': f"SMP-{row[0]}",
@@ -1951,19 +1857,14 @@ def get_samples_available_for_task():
                 'RegisteredDate': row[8]
             })
         
-        # Calculate pagination
-        total_pages = (total_count + per_page - 1) // per_page
-        
         return jsonify({
             'success': True,
             'samples': samples,
             'pagination': {
-                'page': page,
                 'per_page': per_page,
-                'total': total_count,
-                'total_pages': total_pages,
-                'has_next': page < total_pages,
-                'has_prev': page > 1
+                'has_next': has_next,
+                'has_prev': cursor_values is not None,
+                'next_cursor': encode_cursor([results[-1][0]]) if has_next else None
             }
         })
     except Exception as e:
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, render_template, current_app
 from app.utils.mssql_db import mssql_db
+from app.utils.serial_numbers import fetch_serial_numbers
 from datetime import datetime
 import json
 import logging
@@ -51,7 +52,8 @@ def lookup_sample_by_barcode(barcode):
                 'LocationName': result[13] or 'Unknown',
                 'ContainerID': result[14],
                 'ContainerDescription': result[15],
-                'ReceivedBy': result[16]
+                'ReceivedBy': result[16],
+                'SerialNumbers': fetch_serial_numbers([result[0]]).get(result[0], [])
             }
             return sample_result
         
@@ -76,7 +78,9 @@ def lookup_sample_by_barcode(barcode):
         """, (barcode,), fetch_one=True)
         
         if result:
-            return format_sample_result(result, 'serial_number')
+            sample_result = format_sample_result(result, 'serial_number')
+            sample_result['SerialNumbers'] = fetch_serial_numbers([result[0]]).get(result[0], [])
+            return sample_result
         
         # Third try: EXACT container barcode lookup (strict matching)
         result = mssql_db.execute_query("""
@@ -1,5 +1,6 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 import socket
+from app.utils.container_fill import mysql_ensure_current_amount, mysql_reconcile_container_amounts
 
 system_bp = Blueprint('system', __name__)
 mysql = None
@@ -104,4 +105,34 @@ def migrate_expiration():
         return jsonify({
             'status': 'error',
             'message': f'Migration failed: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+@system_bp.route('/api/system/reconcile-container-amounts', methods=['POST'])
+def reconcile_container_amounts():
+    """
+    Add container.CurrentAmount if missing and check it against the
+    containersample totals. Body: {"dryRun": true} only reports drift.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        fix = not data.get('dryRun', False)
+        cursor = mysql.connection.cursor()
+        
+        added = mysql_ensure_current_amount(cursor)
+        drift = mysql_reconcile_container_amounts(cursor, fix=fix)
+        
+        mysql.connection.commit()
+        cursor.close()
+        
+        return jsonify({
+            'status': 'success',
+            'column_added': added,
+            'fixed': fix,
+            'containers': drift,
+            'message': f"{len(drift)} containers {'corrected' if fix else 'out of step'}"
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Reconciliation failed: {str(e)}'
+        }), 500
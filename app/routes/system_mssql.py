@@ -1,6 +1,10 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 import socket
+import time
 from app.utils.mssql_db import mssql_db
+from app.utils.batch_requests import run_batch, parse_batch_paths, BatchRequestError
+from app.utils.container_fill import reconcile_container_amounts
+from app.utils.container_details import invalidate_container_details
 
 system_mssql_bp = Blueprint('system_mssql', __name__)
 
@@ -99,4 +103,57 @@ def migrate_expiration():
         return jsonify({
             'status': 'error',
             'message': f'Migration failed: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+@system_mssql_bp.route('/api/system/reconcile-container-amounts', methods=['POST'])
+def reconcile_container_amounts_endpoint():
+    """
+    Check container.CurrentAmount against the containersample totals - MSSQL version.
+    Body: {"dryRun": true} only reports the containers that drifted.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        fix = not data.get('dryRun', False)
+        with mssql_db.transaction() as cursor:
+            drift = reconcile_container_amounts(cursor, fix=fix)
+        if fix:
+            invalidate_container_details(*(entry['container_id'] for entry in drift))
+        
+        return jsonify({
+            'status': 'success',
+            'fixed': fix,
+            'containers': drift,
+            'message': f"{len(drift)} containers {'corrected' if fix else 'out of step'}"
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Reconciliation failed: {str(e)}'
+        }), 500
+
+@system_mssql_bp.route('/api/batch', methods=['POST'])
+def batch_requests():
+    """
+    Run several GET /api/ requests in one round trip - MSSQL version.
+    Body: {"requests": ["/api/units", "/api/samples/12?include=serials", ...]}
+    Returns one entry per path with its own status, so a failing item does
+    not fail the batch.
+    """
+    try:
+        paths = parse_batch_paths(request.get_json(silent=True))
+    except BatchRequestError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    try:
+        started = time.time()
+        responses = run_batch(paths)
+        print(f"DEBUG: /api/batch ran {len(paths)} requests in {time.time() - started:.3f}s")
+        
+        return jsonify({
+            'status': 'success',
+            'responses': responses,
+            'failed': sum(1 for entry in responses if entry['status'] >= 400)
+        })
+    except Exception as e:
+        print(f"API error in batch_requests: {e}")
+        return jsonify({'status': 'error', 'message': f'Batch failed: {str(e)}'}), 500
@@ -1,5 +1,10 @@
 from flask import Blueprint, render_template, jsonify, request
 from app.utils.mssql_db import mssql_db
+from app.utils.search_index import index_task, remove_document, TASK
+from app.utils.reference_cache import get_users, bump_version, TASK as TASK_TABLE
+from app.utils.sample_picker import picker_search_condition
+from app.utils.sequences import next_task_number, peek_test_number
+from app.utils.mssql_pagination import encode_cursor, decode_cursor, keyset_predicate, keyset_order_by
 from datetime import datetime
 
 task_mssql_bp = Blueprint('task_mssql', __name__)
@@ -11,10 +16,7 @@ def tasks_page():
     """
     try:
         # Get users for assignment dropdowns
-        users_results = mssql_db.execute_query("""
-            SELECT [UserID], [Name] FROM [user] ORDER BY [Name]
-        """, fetch_all=True)
-        users = [{'UserID': row[0], 'Name': row[1]} for row in users_results]
+        users = get_users()
         
         return render_template('sections/tasks.html', users=users)
     except Exception as e:
@@ -179,15 +181,8 @@ def create_task():
         from app.utils.mssql_db import get_current_user_id
         user_id = get_current_user_id()  # Get actual current user
         
-        # Generate task number - use simpler format to match existing data
-        task_no_result = mssql_db.execute_query("""
-            SELECT MAX(CAST(SUBSTRING([TaskNumber], 5, LEN([TaskNumber]) - 4) AS INT)) + 1
-            FROM [task] 
-            WHERE [TaskNumber] LIKE 'TSK-%'
-        """, fetch_one=True)
-        
-        next_number = task_no_result[0] if task_no_result and task_no_result[0] else 1
-        task_number = f"TSK-{next_number:03d}"
+        # Generate task number from the task number sequence
+        task_number = next_task_number()
         
         # Create task (include CreatedBy which is required)
         result = mssql_db.execute_query("""
@@ -221,6 +216,8 @@ def create_task():
         
         if result:
             task_id = result[0]
+            index_task(task_id, task_number, data.get('task_name'))
+            bump_version(TASK_TABLE)
             
             # Log activity
             mssql_db.execute_query("""
@@ -450,6 +447,13 @@ def update_task(task_id):
         """
         
         mssql_db.execute_query(update_query, params)
+        bump_version(TASK_TABLE)
+        
+        if 'task_name' in data:
+            task_number_row = mssql_db.execute_query("""
+                SELECT [TaskNumber] FROM [task] WHERE [TaskID] = ?
+            """, (task_id,), fetch_one=True)
+            index_task(task_id, task_number_row[0] if task_number_row else None, data['task_name'])
         
         # Check if task was completed - if so, add special logging
         if 'status' in data and data['status'] == 'Completed':
@@ -530,6 +534,8 @@ def delete_task(task_id):
         mssql_db.execute_query("""
             DELETE FROM [task] WHERE [TaskID] = ?
         """, (task_id,))
+        remove_document(TASK, task_id)
+        bump_version(TASK_TABLE)
         
         # Log activity
         mssql_db.execute_query("""
@@ -761,17 +767,8 @@ def get_next_test_number(task_id):
     Get the next test number for a task.
     """
     try:
-        # Generate test number - use simple sequential format
-        # Only count base test numbers (not iterations like TST-001-1)
-        test_no_result = mssql_db.execute_query("""
-            SELECT MAX(CAST(SUBSTRING([TestNo], 5, LEN([TestNo]) - 4) AS INT)) + 1
-            FROM [test] 
-            WHERE [TestNo] LIKE 'TST-%' 
-            AND [TestNo] NOT LIKE 'TST-%-[0-9]%'
-        """, fetch_one=True)
-        
-        next_number = test_no_result[0] if test_no_result and test_no_result[0] else 1
-        test_no = f"TST-{next_number:03d}"
+        # Preview only: the number is assigned when the test is created
+        test_no = peek_test_number()
         
         return jsonify({
             'success': True,
@@ -789,11 +786,34 @@ def get_next_test_number(task_id):
 def get_task_available_samples(task_id):
     """
     Get available samples for a task that can be assigned to tests.
+    Keyset-paginated on (Description, SampleID); pass pagination.next_cursor
+    back as ?cursor=. ?search= matches like the other sample pickers.
     """
     try:
+        search = request.args.get('search', '').strip()
+        per_page = max(1, min(request.args.get('per_page', 50, type=int), 200))
+        cursor_values = decode_cursor(request.args.get('cursor'))
+        sort_expression = "ISNULL(s.[Description], '')"
+        
         # Get only samples that are assigned to this specific task
-        samples_results = mssql_db.execute_query("""
-            SELECT 
+        conditions = [
+            "s.[TaskID] = ?",
+            "s.[Status] = 'In Storage'",
+            "ISNULL(ss.[AmountRemaining], s.[Amount]) > 0"
+        ]
+        params = [task_id]
+        if search:
+            search_sql, search_params = picker_search_condition(search)
+            conditions.append(search_sql)
+            params.extend(search_params)
+        if cursor_values:
+            seek_sql, seek_params = keyset_predicate(sort_expression, "s.[SampleID]", 'ASC', cursor_values)
+            conditions.append(seek_sql)
+            params.extend(seek_params)
+        
+        # One extra row tells whether there is a next page
+        samples_results = mssql_db.execute_query(f"""
+            SELECT TOP (?)
                 s.[SampleID],
                 s.[Description], 
                 s.[PartNumber],
@@ -808,11 +828,12 @@ def get_task_available_samples(task_id):
             LEFT JOIN [unit] u ON s.[UnitID] = u.[UnitID]
             LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
             LEFT JOIN [storagelocation] sl ON ss.[LocationID] = sl.[LocationID]
-            WHERE s.[TaskID] = ?
-            AND s.[Status] = 'In Storage'
-            AND ISNULL(ss.[AmountRemaining], s.[Amount]) > 0
-            ORDER BY s.[Description]
-        """, (task_id,), fetch_all=True)
+            WHERE {' AND '.join(conditions)}
+            {keyset_order_by(sort_expression, "s.[SampleID]", 'ASC')}
+        """, [per_page + 1] + params, fetch_all=True) or []
+        
+        has_next = len(samples_results) > per_page
+        samples_results = samples_results[:per_page]
         
         samples = []
         for row in samples_results:
@@ -826,9 +847,16 @@ def get_task_available_samples(task_id):
                 'LocationName': row[5] or 'Unknown'
             })
         
+        last = samples_results[-1] if samples_results else None
         return jsonify({
             'success': True,
-            'samples': samples
+            'samples': samples,
+            'pagination': {
+                'per_page': per_page,
+                'has_next': has_next,
+                'has_prev': cursor_values is not None,
+                'next_cursor': encode_cursor([last[1] or '', last[0]]) if has_next else None
+            }
         })
         
     except Exception as e:
@@ -1,194 +1,131 @@
 from flask import Blueprint, render_template, jsonify, request
-from app.utils.mssql_db import mssql_db
+from app.utils.mssql_db import mssql_db, get_current_user_mssql, get_current_user_id
+from app.utils.search_index import index_test
+from app.utils.reference_cache import get_users, get_tasks
+from app.utils.mssql_pagination import encode_cursor, decode_cursor, keyset_predicate, keyset_order_by
+from app.utils.stock import take_stock, release_allocation, return_stock, InsufficientStockError
+from app.utils.sequences import next_test_number
+from app.utils.test_allocation import allocate_samples, parse_test_assignments, TestAllocationError
+from app.utils.test_completion import (
+    complete_test as complete_test_usages, parse_sample_completions, TestCompletionError
+)
 from datetime import datetime
 
 test_mssql_bp = Blueprint('test_mssql', __name__)
 
+# Active tests shown per page on /testing
+ACTIVE_TESTS_PER_PAGE = 24
+
+def _active_tests_page(cursor_values, per_page, user_id=None):
+    """
+    One page of active tests, newest first, keyset-paginated on
+    (CreatedDate, TestID). Sample counts come from one aggregate over the
+    page's usages only. Returns (tests, next_cursor).
+    """
+    conditions = ["t.[Status] IN ('Created', 'In Progress', 'Active')"]
+    params = []
+    if user_id is not None:
+        conditions.append("t.[UserID] = ?")
+        params.append(user_id)
+    if cursor_values:
+        seek_sql, seek_params = keyset_predicate("t.[CreatedDate]", "t.[TestID]", 'DESC', cursor_values)
+        conditions.append(seek_sql)
+        params.extend(seek_params)
+    
+    # One extra row tells whether there is a next page
+    rows = mssql_db.execute_query(f"""
+        WITH page AS (
+            SELECT TOP (?)
+                t.[TestID], t.[TestNo], t.[TestName], t.[Description], t.[Status], t.[CreatedDate], t.[UserID]
+            FROM [test] t
+            WHERE {' AND '.join(conditions)}
+            {keyset_order_by("t.[CreatedDate]", "t.[TestID]", 'DESC')}
+        )
+        SELECT
+            p.[TestID], p.[TestNo], p.[TestName], p.[Description], p.[Status], p.[CreatedDate],
+            u.[Name] as UserName,
+            ISNULL(agg.[SampleCount], 0) as SampleCount,
+            ISNULL(agg.[ActiveCount], 0) as ActiveSampleCount,
+            p.[UserID]
+        FROM page p
+        LEFT JOIN [user] u ON p.[UserID] = u.[UserID]
+        LEFT JOIN (
+            SELECT tsu.[TestID],
+                   COUNT(*) as SampleCount,
+                   SUM(CASE WHEN tsu.[Status] IN ('Allocated', 'Active') THEN 1 ELSE 0 END) as ActiveCount
+            FROM [testsampleusage] tsu
+            JOIN page ON page.[TestID] = tsu.[TestID]
+            GROUP BY tsu.[TestID]
+        ) agg ON agg.[TestID] = p.[TestID]
+        ORDER BY p.[CreatedDate] DESC, p.[TestID] DESC
+    """, [per_page + 1] + params, fetch_all=True) or []
+    
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    tests = []
+    for row in rows:
+        tests.append({
+            'id': row[0],  # Template expects 'id' for test.id
+            'test_id': row[0],  # Also provide test_id for API calls
+            'test_no': row[1],
+            'test_name': row[2],
+            'description': row[3],
+            'status': row[4],
+            'created_date': row[5],
+            'user_name': row[6],
+            'sample_count': row[7],
+            'active_sample_count': row[8],
+            'test_user_id': row[9]
+        })
+    
+    next_cursor = encode_cursor([rows[-1][5], rows[-1][0]]) if has_next else None
+    return tests, next_cursor
+
 @test_mssql_bp.route('/testing')
 def testing():
-    print("DEBUG: ===== TESTING ROUTE STARTED =====")
+    """
+    Test administration page: one page of active tests (?cursor= for older
+    ones, ?mine=1 for the current user's only). The create/add-samples modal
+    loads task samples on demand from /api/tasks/<id>/available-samples.
+    """
     try:
-        # Get current user - find noahw user instead of hardcoded 1
-        # DEBUG: Let's see all users first (Username column doesn't exist, use only Name)
-        all_users = mssql_db.execute_query("""
-            SELECT [UserID], [Name] FROM [user] ORDER BY [UserID]
-        """, fetch_all=True)
-        print(f"DEBUG: All users in database: {all_users}")
-        
-        # Try to find noahw user
-        noahw_user = mssql_db.execute_query("""
-            SELECT [UserID], [Name] FROM [user] 
-            WHERE [Name] LIKE '%noahw%' OR [Name] LIKE '%noah%'
-        """, fetch_one=True)
-        
-        if noahw_user:
-            user_id = noahw_user[0]
-            print(f"DEBUG: Found noahw user: {noahw_user}, using UserID: {user_id}")
-        else:
-            user_id = 1  # Fallback
-            print(f"DEBUG: Noahw user not found, using fallback user_id: {user_id}")
+        current_user = get_current_user_mssql()
+        mine = request.args.get('mine') == '1'
+        cursor_values = decode_cursor(request.args.get('cursor'))
         
-        # Get active tests (only for current user)
-        print("DEBUG: Fetching active tests...")
+        active_tests, next_cursor = _active_tests_page(
+            cursor_values, ACTIVE_TESTS_PER_PAGE, current_user['UserID'] if mine else None
+        )
         
-        # First, let's check what tests exist in the database at all
-        all_tests_results = mssql_db.execute_query("""
-            SELECT [TestID], [TestNo], [TestName], [Status], [UserID]
-            FROM [test] 
-            ORDER BY [CreatedDate] DESC
-        """, fetch_all=True)
-        print(f"DEBUG: Total tests in database: {len(all_tests_results) if all_tests_results else 0}")
-        if all_tests_results:
-            for test in all_tests_results:
-                print(f"DEBUG: Test - ID: {test[0]}, No: {test[1]}, Name: {test[2]}, Status: {test[3]}, UserID: {test[4]}")
-        
-        try:
-            # TEMPORARY FIX: Show all active tests regardless of user for debugging
-            active_tests_results = mssql_db.execute_query("""
-                SELECT 
-                    t.[TestID],
-                    t.[TestNo],
-                    t.[TestName],
-                    t.[Description],
-                    t.[Status],
-                    t.[CreatedDate],
-                    u.[Name] as UserName,
-                    COUNT(tsu.[UsageID]) as SampleCount,
-                    t.[UserID] as TestUserID
-                FROM [test] t
-                LEFT JOIN [user] u ON t.[UserID] = u.[UserID]
-                LEFT JOIN [testsampleusage] tsu ON t.[TestID] = tsu.[TestID]
-                WHERE t.[Status] IN ('Created', 'In Progress', 'Active')
-                GROUP BY t.[TestID], t.[TestNo], t.[TestName], t.[Description], t.[Status], t.[CreatedDate], u.[Name], t.[UserID]
-                ORDER BY t.[CreatedDate] DESC
-            """, fetch_all=True)
-            print(f"DEBUG: Active tests query success - found {len(active_tests_results) if active_tests_results else 0} tests")
-            if active_tests_results:
-                for test in active_tests_results:
-                    print(f"DEBUG: Active test - ID: {test[0]}, No: {test[1]}, Name: {test[2]}, Status: {test[4]}, TestUserID: {test[8]}")
-            print(f"DEBUG: Current user_id: {user_id}, showing all active tests for debugging")
-        except Exception as e:
-            print(f"ERROR: Active tests query failed: {e}")
-            active_tests_results = []
-        
-        active_tests = []
-        for row in active_tests_results:
-            active_tests.append({
-                'id': row[0],  # Template expects 'id' for test.id
-                'test_id': row[0],  # Also provide test_id for API calls
-                'test_no': row[1],  # Template expects 'test_no' for test.test_no
-                'test_name': row[2],  # Template expects 'test_name' for test.test_name
-                'description': row[3],  # Template expects 'description' for test.description
-                'status': row[4],  # Template expects 'status' for test.status
-                'created_date': row[5],  # Template expects 'created_date' for test.created_date
-                'user_name': row[6],  # Template expects 'user_name' for test.user_name
-                'sample_count': row[7],  # Template expects 'sample_count' for test.sample_count
-                'active_sample_count': row[7],  # Template also expects this field
-                'test_user_id': row[8]  # Added for debugging
-            })
-        
-        # Get available samples for test creation
-        print("DEBUG: Fetching available samples...")
-        try:
-            samples_results = mssql_db.execute_query("""
-                SELECT 
-                    s.[SampleID], 
-                    s.[Description], 
-                    s.[PartNumber],
-                    ISNULL(ss.[AmountRemaining], s.[Amount]) as AmountAvailable,
-                    sl.[LocationName],
-                    s.[Status]
-                FROM [sample] s
-                LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
-                LEFT JOIN [storagelocation] sl ON ss.[LocationID] = sl.[LocationID]
-                WHERE s.[Status] = 'In Storage'
-                AND ISNULL(ss.[AmountRemaining], s.[Amount]) > 0
-                ORDER BY s.[Description]
-            """, fetch_all=True)
-            print(f"DEBUG: Samples query success - found {len(samples_results) if samples_results else 0} samples")
-        except Exception as e:
-            print(f"ERROR: Samples query failed: {e}")
-            samples_results = []
+        # Users and tasks come from the reference cache
+        users = get_users()
+        tasks = [
+            {'TaskID': t['TaskID'], 'TaskNumber': f"TASK{t['TaskID']}", 'TaskName': t['TaskName'], 'Status': t['Status']}
+            for t in sorted(get_tasks(active_only=True), key=lambda t: t['TaskID'], reverse=True)
+        ]
         
-        samples = []
-        for row in samples_results:
-            samples.append({
-                "SampleID": row[0],
-                "SampleIDFormatted": f"SMP-{row[0]}",
-                "Description": row[1],
-                "PartNumber": row[2] or "",
-                "AmountAvailable": row[3],
-                "LocationName": row[4] or "Unknown",
-                "Status": row[5]
-            })
-        
-        # Get users
-        print("DEBUG: Fetching users...")
-        try:
-            users_results = mssql_db.execute_query("""
-                SELECT [UserID], [Name] FROM [user] ORDER BY [Name]
-            """, fetch_all=True)
-            print(f"DEBUG: Users query success - found {len(users_results) if users_results else 0} users")
-            users = [{'UserID': row[0], 'Name': row[1]} for row in users_results]
-        except Exception as e:
-            print(f"ERROR: Users query failed: {e}")
-            users = []
-        
-        # Get active tasks for test creation
-        print("DEBUG: Fetching tasks for test creation...")
-        try:
-            tasks_results = mssql_db.execute_query("""
-                SELECT [TaskID], 'TASK' + CAST([TaskID] AS NVARCHAR) as TaskNumber, [TaskName], [Status] 
-                FROM [task] 
-                WHERE [Status] IN ('Planning', 'Active', 'On Hold')
-                ORDER BY [TaskID] DESC
-            """, fetch_all=True)
-            print(f"DEBUG: Raw tasks query result: {tasks_results}")
-            tasks = [{'TaskID': row[0], 'TaskNumber': row[1], 'TaskName': row[2], 'Status': row[3]} for row in tasks_results]
-            print(f"DEBUG: Processed tasks for template: {tasks}")
-        except Exception as e:
-            print(f"ERROR: Tasks query failed: {e}")
-            import traceback
-            traceback.print_exc()
-            tasks = []
-        
-        print(f"DEBUG: Final data summary:")
-        print(f"  - Active tests: {len(active_tests)}")
-        print(f"  - Samples: {len(samples)}")
-        print(f"  - Users: {len(users)}")
-        print(f"  - Tasks: {len(tasks)}")
-        
-        print("DEBUG: About to render template...")
-        
-        try:
-            template_result = render_template('sections/testing.html', 
-                                active_tests=active_tests, 
-                                samples=samples,
-                                users=users,
-                                tasks=tasks)
-            print("DEBUG: Template rendered successfully!")
-            return template_result
-        except Exception as template_error:
-            print(f"ERROR: Template rendering failed: {template_error}")
-            import traceback
-            traceback.print_exc()
-            raise
-            
+        return render_template('sections/testing.html', 
+                            active_tests=active_tests, 
+                            users=users,
+                            tasks=tasks,
+                            current_user=current_user,
+                            tests_pagination={
+                                'mine': mine,
+                                'has_prev': cursor_values is not None,
+                                'has_next': next_cursor is not None,
+                                'next_cursor': next_cursor
+                            })
     except Exception as e:
-        print(f"ERROR: Main testing route exception: {e}")
+        print(f"Error loading test administration: {e}")
         import traceback
         traceback.print_exc()
-        
-        print("DEBUG: Returning error template...")
         return render_template('sections/testing.html', 
                             error="Error loading test administration",
                             active_tests=[],
                             samples=[],
                             users=[],
                             tasks=[])
-    
-    finally:
-        print("DEBUG: ===== TESTING ROUTE FINISHED =====")
 
 @test_mssql_bp.route('/api/tests', methods=['GET'])
 def get_tests():
@@ -260,30 +197,12 @@ def create_test():
     try:
         data = request.json
         
-        # Get current user - find noahw user instead of hardcoded 1
-        noahw_user = mssql_db.execute_query("""
-            SELECT [UserID], [Name] FROM [user] 
-            WHERE [Name] LIKE '%noahw%' OR [Name] LIKE '%noah%'
-        """, fetch_one=True)
-        
-        if noahw_user:
-            user_id = noahw_user[0]
-        else:
-            user_id = 1  # Fallback
+        user_id = get_current_user_id()
         
         print(f"DEBUG CREATE TEST: Received data: {data}")
         
-        # Generate test number - use simple sequential format
-        # Only count base test numbers (not iterations like TST-001-1)
-        test_no_result = mssql_db.execute_query("""
-            SELECT MAX(CAST(SUBSTRING([TestNo], 5, LEN([TestNo]) - 4) AS INT)) + 1
-            FROM [test] 
-            WHERE [TestNo] LIKE 'TST-%' 
-            AND [TestNo] NOT LIKE 'TST-%-[0-9]%'
-        """, fetch_one=True)
-        
-        next_number = test_no_result[0] if test_no_result and test_no_result[0] else 1
-        test_no = f"TST-{next_number:03d}"
+        # Generate test number from the test number sequence
+        test_no = next_test_number()
         
         print(f"DEBUG CREATE TEST: Generated test_no: {test_no}")
         
@@ -329,6 +248,7 @@ def create_test():
             test_id = result[0]
             
             print(f"DEBUG CREATE TEST: Successfully created test with ID: {test_id}")
+            index_test(test_id, test_no, data.get('testName'))
             
             # Verify the test was created correctly
             verify_result = mssql_db.execute_query("""
@@ -370,101 +290,34 @@ def create_test():
 
 @test_mssql_bp.route('/api/tests/<int:test_id>/add-samples', methods=['POST'])
 def add_samples_to_test(test_id):
+    """
+    Allocate samples to a test, all or nothing.
+    Body: {"samples": [{"sample_id", "amount", "notes"}]}
+    """
     try:
-        data = request.json
+        data = request.json or {}
         user_id = 1  # TODO: Implement proper user authentication
-        sample_assignments = data.get('samples', [])
         
-        added_samples = []
+        # One batch for the whole request: availability is checked for every
+        # sample before anything is written, and stock is taken with a guarded
+        # update so concurrent allocations cannot overdraw it
+        try:
+            assignments = parse_test_assignments(data.get('samples', []))
+            with mssql_db.transaction() as cursor:
+                allocated = allocate_samples(cursor, test_id, assignments, user_id)
+        except TestAllocationError as e:
+            return jsonify({'success': False, 'error': str(e)}), e.status_code
+        except InsufficientStockError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'shortages': getattr(e, 'shortages', [])
+            }), 400
         
-        for assignment in sample_assignments:
-            sample_id = assignment.get('sample_id')
-            amount = assignment.get('amount', 1)
-            notes = assignment.get('notes', '')
-            
-            # Check sample availability
-            available_result = mssql_db.execute_query("""
-                SELECT ISNULL(ss.[AmountRemaining], s.[Amount]) as Available
-                FROM [sample] s
-                LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
-                WHERE s.[SampleID] = ?
-            """, (sample_id,), fetch_one=True)
-            
-            if not available_result or available_result[0] < amount:
-                return jsonify({
-                    'success': False,
-                    'error': f'Insufficient amount available for sample {sample_id}'
-                }), 400
-            
-            # Get test number for sample identifier
-            test_result = mssql_db.execute_query("""
-                SELECT [TestNo] FROM [test] WHERE [TestID] = ?
-            """, (test_id,), fetch_one=True)
-            
-            test_no = test_result[0] if test_result else f"T{test_id}"
-            
-            # Generate unique sample identifier
-            sample_identifier = f"{test_no}_{sample_id}_{amount}"
-            
-            # Create test usage record
-            usage_result = mssql_db.execute_query("""
-                INSERT INTO [testsampleusage] (
-                    [TestID], 
-                    [SampleID], 
-                    [SampleIdentifier],
-                    [AmountAllocated],
-                    [AmountUsed], 
-                    [Status], 
-                    [CreatedDate], 
-                    [Notes],
-                    [CreatedBy]
-                ) 
-                OUTPUT INSERTED.UsageID
-                VALUES (?, ?, ?, ?, ?, 'Allocated', GETDATE(), ?, ?)
-            """, (test_id, sample_id, sample_identifier, amount, 0, notes, user_id), fetch_one=True)
-            
-            if usage_result:
-                usage_id = usage_result[0]
-                
-                # Update sample storage
-                mssql_db.execute_query("""
-                    UPDATE [samplestorage] 
-                    SET [AmountRemaining] = [AmountRemaining] - ?
-                    WHERE [SampleID] = ?
-                """, (amount, sample_id))
-                
-                # Update sample status to In Testing
-                mssql_db.execute_query("""
-                    UPDATE [sample] 
-                    SET [Status] = 'In Testing'
-                    WHERE [SampleID] = ?
-                """, (sample_id,))
-                
-                # Generate identifier
-                identifier = f"TST{test_id}SMP{sample_id}{usage_id}"
-                
-                added_samples.append({
-                    'usage_id': usage_id,
-                    'sample_id': sample_id,
-                    'amount': amount,
-                    'identifier': identifier
-                })
-                
-                # Log activity
-                mssql_db.execute_query("""
-                    INSERT INTO [history] (
-                        [Timestamp], 
-                        [ActionType], 
-                        [UserID], 
-                        [SampleID],
-                        [Notes]
-                    )
-                    VALUES (GETDATE(), 'Sample added to test', ?, ?, ?)
-                """, (
-                    user_id,
-                    sample_id,
-                    f"Sample {sample_id} added to test {test_id} with amount {amount}"
-                ))
+        added_samples = [dict(
+            allocation,
+            identifier=f"TST{test_id}SMP{allocation['sample_id']}{allocation['usage_id']}"
+        ) for allocation in allocated]
         
         return jsonify({
             'success': True,
@@ -601,179 +454,30 @@ def update_test_status(test_id):
 
 @test_mssql_bp.route('/api/tests/<int:test_id>/complete', methods=['POST'])
 def complete_test(test_id):
+    """
+    Complete a test and settle its sample usages in one transaction.
+    Body: {"sample_completions": [{"usage_id", "amount_used", "amount_returned", "notes"}]}
+    """
     try:
         from app.utils.mssql_db import get_current_user_id
-        data = request.json
+        data = request.json or {}
         user_id = get_current_user_id()  # Get actual current user
-        sample_completions = data.get('sample_completions', [])
-        
-        # Update test status to completed
-        mssql_db.execute_query("""
-            UPDATE [test] 
-            SET [Status] = 'Completed'
-            WHERE [TestID] = ?
-        """, (test_id,))
         
-        # Get test details for logging
-        test_result = mssql_db.execute_query("""
-            SELECT [TestNo] FROM [test] WHERE [TestID] = ?
-        """, (test_id,), fetch_one=True)
-        test_no = test_result[0] if test_result else f"TST-{test_id}"
-        
-        # Process sample completions
-        for completion in sample_completions:
-            usage_id = completion.get('usage_id')
-            amount_used = completion.get('amount_used', 0)
-            amount_returned = completion.get('amount_returned', 0)
-            notes = completion.get('notes', '')
-            
-            # Get current usage details
-            usage_result = mssql_db.execute_query("""
-                SELECT tu.[SampleID], tu.[AmountAllocated], tu.[AmountUsed]
-                FROM [testsampleusage] tu
-                WHERE tu.[UsageID] = ?
-            """, (usage_id,), fetch_one=True)
-            
-            if not usage_result:
-                continue
-                
-            sample_id, amount_allocated, current_amount_used = usage_result
-            total_amount_used = current_amount_used + amount_used
-            
-            # Update test usage with actual amounts used
-            mssql_db.execute_query("""
-                UPDATE [testsampleusage] 
-                SET [AmountUsed] = ?, 
-                    [Status] = CASE 
-                        WHEN ? >= [AmountAllocated] THEN 'Completed'
-                        ELSE 'Partial'
-                    END,
-                    [Notes] = ?
-                WHERE [UsageID] = ?
-            """, (total_amount_used, total_amount_used, notes, usage_id))
-            
-            # Always return unused amount to storage first
-            if amount_returned > 0:
-                mssql_db.execute_query("""
-                    UPDATE [samplestorage] 
-                    SET [AmountRemaining] = [AmountRemaining] + ?
-                    WHERE [SampleID] = ?
-                """, (amount_returned, sample_id,))
-            
-            # Check if sample was fully consumed (all allocated amount was used)
-            if total_amount_used >= amount_allocated:
-                # Sample is fully used - mark as consumed
-                mssql_db.execute_query("""
-                    UPDATE [sample] 
-                    SET [Status] = 'Consumed'
-                    WHERE [SampleID] = ?
-                """, (sample_id,))
-                
-                # Set remaining amount to 0 in storage (in case there was any remaining)
-                mssql_db.execute_query("""
-                    UPDATE [samplestorage] 
-                    SET [AmountRemaining] = 0
-                    WHERE [SampleID] = ?
-                """, (sample_id,))
-                
-                # Reduce total sample amount by the consumed amount
-                mssql_db.execute_query("""
-                    UPDATE [sample] 
-                    SET [Amount] = [Amount] - ?
-                    WHERE [SampleID] = ?
-                """, (amount_allocated, sample_id))
-                
-                # Log sample consumption in history with test number
-                mssql_db.execute_query("""
-                    INSERT INTO [history] (
-                        [Timestamp], 
-                        [ActionType], 
-                        [UserID], 
-                        [SampleID],
-                        [TestID],
-                        [Notes]
-                    )
-                    VALUES (GETDATE(), 'Sample consumed', ?, ?, ?, ?)
-                """, (
-                    user_id,
-                    sample_id,
-                    test_id,
-                    f"{amount_allocated}/{amount_allocated} of SMP-{sample_id} consumed in test {test_no}"
-                ))
-                
-            else:
-                # Check if sample has any other active test allocations
-                active_tests = mssql_db.execute_query("""
-                    SELECT COUNT(*)
-                    FROM [testsampleusage] tsu
-                    JOIN [test] t ON tsu.[TestID] = t.[TestID]
-                    WHERE tsu.[SampleID] = ?
-                    AND t.[Status] != 'Completed'
-                    AND tsu.[Status] IN ('Allocated', 'Active')
-                """, (sample_id,), fetch_one=True)
-                
-                has_active_tests = active_tests[0] if active_tests else 0
-                
-                # Update sample status based on whether it has active test allocations
-                if has_active_tests > 0:
-                    # Keep status as In Testing
-                    mssql_db.execute_query("""
-                        UPDATE [sample] 
-                        SET [Status] = 'In Testing'
-                        WHERE [SampleID] = ?
-                    """, (sample_id,))
-                else:
-                    # No more active tests - back to In Storage
-                    mssql_db.execute_query("""
-                        UPDATE [sample] 
-                        SET [Status] = 'In Storage'
-                        WHERE [SampleID] = ?
-                    """, (sample_id,))
-                
-                # Reduce total sample amount by the consumed amount only
-                if amount_used > 0:
-                    mssql_db.execute_query("""
-                        UPDATE [sample] 
-                        SET [Amount] = [Amount] - ?
-                        WHERE [SampleID] = ?
-                    """, (amount_used, sample_id))
-                
-                # Log partial consumption in history with test number
-                if amount_used > 0:
-                    mssql_db.execute_query("""
-                        INSERT INTO [history] (
-                            [Timestamp], 
-                            [ActionType], 
-                            [UserID], 
-                            [SampleID],
-                            [TestID],
-                            [Notes]
-                        )
-                        VALUES (GETDATE(), 'Sample partially consumed', ?, ?, ?, ?)
-                    """, (
-                        user_id,
-                        sample_id,
-                        test_id,
-                        f"{amount_used}/{amount_allocated} of SMP-{sample_id} consumed in test {test_no}, {amount_returned} returned"
-                    ))
+        try:
+            completions = parse_sample_completions(data.get('sample_completions', []))
+            with mssql_db.transaction() as cursor:
+                result = complete_test_usages(cursor, test_id, completions, user_id)
+        except TestCompletionError as e:
+            return jsonify({'success': False, 'error': str(e)}), e.status_code
         
-        # Log activity
-        mssql_db.execute_query("""
-            INSERT INTO [history] (
-                [Timestamp], 
-                [ActionType], 
-                [UserID], 
-                [Notes]
-            )
-            VALUES (GETDATE(), 'Test completed', ?, ?)
-        """, (
-            user_id,
-            f"Test {test_id} completed with {len(sample_completions)} sample completions"
-        ))
+        if result['skipped']:
+            print(f"DEBUG: Test {test_id} completion skipped usages not on the test: {result['skipped']}")
         
         return jsonify({
             'success': True,
-            'message': 'Test completed successfully'
+            'message': 'Test completed successfully',
+            'completed_usages': result['completed'],
+            'skipped_usages': result['skipped']
         })
         
     except Exception as e:
@@ -966,44 +670,34 @@ def move_sample_to_test(sample_id):
                 'error': 'Test ID is required'
             }), 400
         
-        # Check sample availability
-        available_result = mssql_db.execute_query("""
-            SELECT ISNULL(ss.[AmountRemaining], s.[Amount]) as Available
-            FROM [sample] s
-            LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
-            WHERE s.[SampleID] = ?
-        """, (sample_id,), fetch_one=True)
-        
-        if not available_result or available_result[0] < amount:
+        # Take the stock (guarded update) and create the usage record together
+        try:
+            with mssql_db.transaction() as cursor:
+                take_stock(cursor, sample_id, amount)
+                
+                # Create test usage record
+                cursor.execute("""
+                    INSERT INTO [testsampleusage] (
+                        [TestID], 
+                        [SampleID], 
+                        [AmountUsed], 
+                        [Status], 
+                        [CreatedDate], 
+                        [Notes]
+                    ) 
+                    OUTPUT INSERTED.TestUsageID
+                    VALUES (?, ?, ?, 'Active', GETDATE(), ?)
+                """, (test_id, sample_id, amount, f'Moved via scanner. {notes}'.strip()))
+                usage_result = cursor.fetchone()
+        except InsufficientStockError as e:
             return jsonify({
                 'success': False,
-                'error': f'Insufficient amount available for sample {sample_id}'
+                'error': str(e)
             }), 400
         
-        # Create test usage record
-        usage_result = mssql_db.execute_query("""
-            INSERT INTO [testsampleusage] (
-                [TestID], 
-                [SampleID], 
-                [AmountUsed], 
-                [Status], 
-                [CreatedDate], 
-                [Notes]
-            ) 
-            OUTPUT INSERTED.TestUsageID
-            VALUES (?, ?, ?, 'Active', GETDATE(), ?)
-        """, (test_id, sample_id, amount, f'Moved via scanner. {notes}'.strip()), fetch_one=True)
-        
         if usage_result:
             usage_id = usage_result[0]
             
-            # Update sample storage
-            mssql_db.execute_query("""
-                UPDATE [samplestorage] 
-                SET [AmountRemaining] = [AmountRemaining] - ?
-                WHERE [SampleID] = ?
-            """, (amount, sample_id))
-            
             # Generate identifier
             identifier = f"TST{test_id}SMP{sample_id}{usage_id}"
             
@@ -1168,6 +862,7 @@ def create_test_iteration():
             
             if result:
                 new_test_id = result[0]
+                index_test(new_test_id, new_test_no, test_name)
                 
                 # Log activity
                 mssql_db.execute_query("""
@@ -1219,63 +914,37 @@ def remove_sample_from_test(usage_id):
                 'error': 'Amount must be greater than 0'
             }), 400
         
-        # Get usage details
-        usage_result = mssql_db.execute_query("""
-            SELECT tu.[TestID], tu.[SampleID], tu.[AmountAllocated], tu.[AmountUsed], tu.[Status]
-            FROM [testsampleusage] tu
-            WHERE tu.[UsageID] = ?
-        """, (usage_id,), fetch_one=True)
-        
-        if not usage_result:
-            return jsonify({
-                'success': False,
-                'error': 'Sample usage not found'
-            }), 404
-        
-        test_id, sample_id, amount_allocated, amount_used, status = usage_result
-        available_amount = (amount_allocated or 0) - (amount_used or 0)
-        
-        if amount > available_amount:
+        # Guarded update on the usage record: two returns of the same
+        # allocation cannot both succeed, so stock is never returned twice
+        try:
+            with mssql_db.transaction() as cursor:
+                test_id, sample_id = release_allocation(cursor, usage_id, amount)
+                
+                # Return sample to storage
+                return_stock(cursor, sample_id, amount)
+                
+                # Log activity
+                cursor.execute("""
+                    INSERT INTO [history] (
+                        [Timestamp], 
+                        [ActionType], 
+                        [UserID], 
+                        [SampleID],
+                        [TestID],
+                        [Notes]
+                    )
+                    VALUES (GETDATE(), 'Sample returned from test', ?, ?, ?, ?)
+                """, (
+                    user_id,
+                    sample_id,
+                    test_id,
+                    f"Returned {amount} units from test to storage"
+                ))
+        except InsufficientStockError as e:
             return jsonify({
                 'success': False,
-                'error': f'Cannot return {amount}. Only {available_amount} available.'
-            }), 400
-        
-        # Update the usage record
-        mssql_db.execute_query("""
-            UPDATE [testsampleusage] 
-            SET [AmountUsed] = [AmountUsed] + ?,
-                [Status] = CASE 
-                    WHEN ([AmountAllocated] - ([AmountUsed] + ?)) <= 0 THEN 'Completed'
-                    ELSE [Status]
-                END
-            WHERE [UsageID] = ?
-        """, (amount, amount, usage_id))
-        
-        # Return sample to storage
-        mssql_db.execute_query("""
-            UPDATE [samplestorage] 
-            SET [AmountRemaining] = [AmountRemaining] + ?
-            WHERE [SampleID] = ?
-        """, (amount, sample_id))
-        
-        # Log activity
-        mssql_db.execute_query("""
-            INSERT INTO [history] (
-                [Timestamp], 
-                [ActionType], 
-                [UserID], 
-                [SampleID],
-                [TestID],
-                [Notes]
-            )
-            VALUES (GETDATE(), 'Sample returned from test', ?, ?, ?, ?)
-        """, (
-            user_id,
-            sample_id,
-            test_id,
-            f"Returned {amount} units from test to storage"
-        ))
+                'error': str(e)
+            }), 404 if e.requested is None else 400
         
         return jsonify({
             'success': True,
@@ -1,99 +1,169 @@
 from app.models.container import Container
 from app.utils.db import DatabaseManager
+from app.utils.sequences import next_container_barcodes
+from app.utils.container_bulk import parse_container_count, parse_container_contents, ContainerBatchError
+from app.utils.container_fill import (
+    mysql_ensure_current_amount, mysql_reserve_capacity, mysql_release_capacity, mysql_remove_storage_from_containers
+)
+
+# Sort keys for the container listing; ContainerID is the tiebreaker
+CONTAINER_SORT_KEYS = {
+    'container_id': 'c.ContainerID',
+    'description': 'c.Description',
+    'type': 'ct.TypeName',
+    'location': 'l.LocationName',
+    'status': 'Status',
+    'total_items': 'TotalItems',
+    'fill': 'FillRatio'
+}
+
+# Fill level filters, applied to the aggregated amounts
+CONTAINER_FILL_LEVELS = {
+    'empty': 'COALESCE(agg.TotalItems, 0) = 0',
+    'partial': 'COALESCE(agg.TotalItems, 0) > 0 AND (IFNULL(c.ContainerCapacity, 0) = 0 OR agg.TotalItems < c.ContainerCapacity)',
+    'full': 'c.ContainerCapacity > 0 AND COALESCE(agg.TotalItems, 0) >= c.ContainerCapacity',
+    'available': 'IFNULL(c.ContainerCapacity, 0) = 0 OR COALESCE(agg.TotalItems, 0) < c.ContainerCapacity'
+}
+
+CONTAINERS_PER_PAGE = 50
+
+# Containers with type, location and content totals in one pass; the
+# containersample aggregate is joined once instead of queried per container
+_CONTAINER_LIST_QUERY = """
+    SELECT 
+        c.ContainerID,
+        c.Description,
+        c.ContainerTypeID,
+        c.IsMixed,
+        c.ContainerCapacity,
+        COALESCE(c.ContainerStatus, 'Active') as Status,
+        c.LocationID,
+        ct.TypeName,
+        l.LocationName,
+        COALESCE(agg.SampleCount, 0) as SampleCount,
+        COALESCE(agg.TotalItems, 0) as TotalItems,
+        COALESCE(agg.TotalItems, 0) / NULLIF(c.ContainerCapacity, 0) as FillRatio
+    FROM container c
+    LEFT JOIN containertype ct ON c.ContainerTypeID = ct.ContainerTypeID
+    LEFT JOIN storagelocation l ON c.LocationID = l.LocationID
+    LEFT JOIN (
+        SELECT ContainerID, COUNT(*) as SampleCount, SUM(Amount) as TotalItems
+        FROM containersample
+        GROUP BY ContainerID
+    ) agg ON agg.ContainerID = c.ContainerID
+"""
 
 class ContainerService:
     def __init__(self, mysql):
         self.mysql = mysql
         self.db = DatabaseManager(mysql)
     
-    def get_all_containers(self):
-        print("DEBUG: Fetching containers...")
+    def _container_from_row(self, row):
+        """Container object with the joined type/location/content fields set"""
+        container = Container.from_db_row(row[:7])
+        container.type_name = row[7] or 'Unknown'
+        if container.location_id:
+            container.location_name = row[8] or 'Unknown'
+        else:
+            container.location_name = 'Not assigned'
+        container.sample_count = row[9]
+        container.total_items = row[10]
+        return container
+    
+    def _container_filters(self, type_id=None, location_id=None, status=None, fill=None):
+        conditions = []
+        params = []
+        if type_id:
+            conditions.append("c.ContainerTypeID = %s")
+            params.append(type_id)
+        if location_id:
+            conditions.append("c.LocationID = %s")
+            params.append(location_id)
+        if status:
+            conditions.append("COALESCE(c.ContainerStatus, 'Active') = %s")
+            params.append(status)
+        if fill in CONTAINER_FILL_LEVELS:
+            conditions.append(f"({CONTAINER_FILL_LEVELS[fill]})")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+    
+    def get_containers_page(self, page=1, per_page=CONTAINERS_PER_PAGE, type_id=None, location_id=None,
+                            status=None, fill=None, sort_by='container_id', sort_order='DESC'):
+        """
+        One page of containers plus pagination info, from a single aggregated
+        join (and one COUNT with the same filters).
+        fill is one of CONTAINER_FILL_LEVELS; sort_by one of CONTAINER_SORT_KEYS.
+        """
+        page = max(1, int(page or 1))
+        per_page = max(1, min(int(per_page or CONTAINERS_PER_PAGE), 500))
+        sort_expression = CONTAINER_SORT_KEYS.get(sort_by, CONTAINER_SORT_KEYS['container_id'])
+        sort_order = 'ASC' if str(sort_order).upper() == 'ASC' else 'DESC'
+        where, params = self._container_filters(type_id, location_id, status, fill)
+        
         try:
-            # Table name is already known to be 'container'
-            cursor = self.mysql.connection.cursor()
-            cursor.execute("SHOW TABLES LIKE 'container'")
-            table_exists = cursor.fetchone() is not None
-            
-            print(f"DEBUG: container table exists: {table_exists}")
-            
-            if not table_exists:
-                print("DEBUG: No container table exists!")
-                cursor.close()
-                return []
-            
-            table_name = "container"
-            cursor.close()
-            
-            # If table exists, continue fetching data
             query = f"""
-                SELECT 
-                    c.ContainerID,
-                    c.Description,
-                    c.ContainerTypeID,
-                    c.IsMixed,
-                    c.ContainerCapacity,
-                    'Active' as Status,
-                    c.LocationID
-                FROM {table_name} c
-                ORDER BY c.ContainerID DESC
+                {_CONTAINER_LIST_QUERY}
+                {where}
+                ORDER BY {sort_expression} {sort_order}, c.ContainerID {sort_order}
+                LIMIT %s OFFSET %s
             """
+            result, _ = self.db.execute_query(query, tuple(params + [per_page, (page - 1) * per_page]))
             
-            result, _ = self.db.execute_query(query)
-            print(f"DEBUG: Container query returned {len(result) if result else 0} rows")
-            
-            # If no results, return empty list
-            if not result:
-                print("DEBUG: No containers found in database")
-                return []
+            count_result, _ = self.db.execute_query(f"""
+                SELECT COUNT(*)
+                FROM container c
+                LEFT JOIN (
+                    SELECT ContainerID, SUM(Amount) as TotalItems
+                    FROM containersample
+                    GROUP BY ContainerID
+                ) agg ON agg.ContainerID = c.ContainerID
+                {where}
+            """, tuple(params))
+            total = count_result[0][0] if count_result else 0
+            print(f"DEBUG: Container page {page} returned {len(result) if result else 0} of {total} containers")
             
             containers = []
-            for row in result:
+            for row in result or []:
                 try:
-                    container = Container.from_db_row(row)
-                    
-                    # Add additional calculated fields using additional query
-                    container = self._add_container_info(container)
-                    
-                    containers.append(container)
+                    containers.append(self._container_from_row(row))
                 except Exception as e:
                     print(f"DEBUG: Error creating container object: {e}")
                     continue
             
-            return containers
+            total_pages = (total + per_page - 1) // per_page
+            return containers, {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'total_pages': total_pages,
+                'has_next': page < total_pages,
+                'has_prev': page > 1
+            }
         except Exception as e:
-            print(f"DEBUG: Error in get_all_containers: {e}")
+            print(f"DEBUG: Error in get_containers_page: {e}")
             import traceback
             traceback.print_exc()
-            return []
+            return [], {'page': page, 'per_page': per_page, 'total': 0, 'total_pages': 0,
+                        'has_next': False, 'has_prev': False}
+    
+    def get_all_containers(self, page=1, per_page=CONTAINERS_PER_PAGE, **filters):
+        """Containers for one page (see get_containers_page for filters and sorting)"""
+        containers, _ = self.get_containers_page(page, per_page, **filters)
+        return containers
             
     def get_container_by_id(self, container_id):
         print(f"DEBUG: Getting container with ID {container_id}")
         try:
-            query = f"""
-                SELECT 
-                    c.ContainerID,
-                    c.Description,
-                    c.ContainerTypeID,
-                    c.IsMixed,
-                    c.ContainerCapacity,
-                    'Active' as Status,
-                    c.LocationID
-                FROM container c
+            result, _ = self.db.execute_query(f"""
+                {_CONTAINER_LIST_QUERY}
                 WHERE c.ContainerID = %s
-            """
-            
-            result, _ = self.db.execute_query(query, (container_id,))
+            """, (container_id,))
             
             if not result or len(result) == 0:
                 print(f"DEBUG: No container found with ID {container_id}")
                 return None
             
-            container = Container.from_db_row(result[0])
-            
-            # Add additional calculated fields
-            container = self._add_container_info(container)
-            
-            return container
+            return self._container_from_row(result[0])
         except Exception as e:
             print(f"DEBUG: Error in get_container_by_id: {e}")
             import traceback
@@ -138,18 +208,17 @@ class ContainerService:
                     c.Description,
                     ct.TypeName,
                     c.ContainerCapacity,
-                    IFNULL(SUM(cs.Amount), 0) as CurrentAmount,
+                    c.CurrentAmount,
                     l.LocationName
                 FROM container c
                 LEFT JOIN ContainerType ct ON c.ContainerTypeID = ct.ContainerTypeID
-                LEFT JOIN ContainerSample cs ON c.ContainerID = cs.ContainerID
                 LEFT JOIN StorageLocation l ON c.LocationID = l.LocationID
-                GROUP BY c.ContainerID
-                HAVING CurrentAmount < c.ContainerCapacity OR c.ContainerCapacity IS NULL
+                WHERE c.CurrentAmount < c.ContainerCapacity OR c.ContainerCapacity IS NULL
             """
             
             # Direkte brug af MySQL cursor i stedet for db utils
             cursor = self.mysql.connection.cursor()
+            mysql_ensure_current_amount(cursor)
             cursor.execute(query)
             
             # Konverterer rå resultater til dict
@@ -182,138 +251,32 @@ class ContainerService:
             traceback.print_exc()
             return []
     
-    def _add_container_info(self, container):
-        try:
-            # Get container type name
-            cursor = self.mysql.connection.cursor()
-            
-            # Get type info
-            cursor.execute("""
-                SELECT TypeName 
-                FROM containertype 
-                WHERE ContainerTypeID = %s
-            """, (container.container_type_id,))
-            
-            type_result = cursor.fetchone()
-            if type_result:
-                container.type_name = type_result[0]
-            else:
-                container.type_name = 'Unknown'
-                
-            # Get location name
-            if hasattr(container, 'location_id') and container.location_id:
-                cursor.execute("""
-                    SELECT LocationName 
-                    FROM storagelocation 
-                    WHERE LocationID = %s
-                """, (container.location_id,))
-                
-                location_result = cursor.fetchone()
-                if location_result:
-                    container.location_name = location_result[0]
-                else:
-                    container.location_name = 'Unknown'
-            else:
-                container.location_name = 'Not assigned'
-                
-            # Get count of samples in container
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as SampleCount,
-                    IFNULL(SUM(Amount), 0) as TotalItems
-                FROM containersample 
-                WHERE ContainerID = %s
-            """, (container.id,))
-            
-            count_result = cursor.fetchone()
-            cursor.close()
-            
-            if count_result:
-                container.sample_count = count_result[0]
-                container.total_items = count_result[1]
-            else:
-                container.sample_count = 0
-                container.total_items = 0
-            
-            return container
-        except Exception as e:
-            print(f"DEBUG: Error in _add_container_info: {e}")
-            # Make sure we still return the container object even with errors
-            container.type_name = 'Standard'
-            container.sample_count = 0
-            container.total_items = 0
-            return container
+    def create_container(self, container_data, user_id):
+        """Create one container (see create_containers)"""
+        result = self.create_containers(container_data, user_id, count=1)
+        if result.get('success'):
+            result['container_id'] = result['container_ids'][0]
+        return result
     
-    def _generate_unique_container_barcode(self, cursor):
+    def create_containers(self, container_data, user_id, count=1, samples=None):
         """
-        Generate a unique container barcode that doesn't already exist in the database
+        Create count containers of the same type in one transaction.
+        The type's DefaultCapacity is looked up once, all containers go in with
+        one multi-row INSERT, and samples ([{sampleId, amount, containerIndex}])
+        are linked with one more. Barcodes come from the container block allocator.
         """
-        attempt = 1
-        max_attempts = 1000  # Prevent infinite loop
-        
-        while attempt <= max_attempts:
-            # First try with the AUTO_INCREMENT value
-            if attempt == 1:
-                cursor.execute("SELECT AUTO_INCREMENT FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'container'")
-                auto_increment_result = cursor.fetchone()
-                candidate_id = auto_increment_result[0] if auto_increment_result else 1
-            else:
-                # If AUTO_INCREMENT failed, find the highest existing ID and increment
-                cursor.execute("SELECT MAX(ContainerID) FROM container")
-                max_id_result = cursor.fetchone()
-                max_id = max_id_result[0] if max_id_result and max_id_result[0] else 0
-                candidate_id = max_id + attempt
-            
-            candidate_barcode = f"CNT-{candidate_id}"
-            
-            # Check if this barcode already exists
-            cursor.execute("SELECT COUNT(*) FROM container WHERE Barcode = %s", (candidate_barcode,))
-            exists = cursor.fetchone()[0] > 0
-            
-            if not exists:
-                print(f"DEBUG: Generated unique container barcode: {candidate_barcode}")
-                return candidate_barcode
-            
-            print(f"DEBUG: Barcode {candidate_barcode} already exists, trying next candidate")
-            attempt += 1
+        print(f"DEBUG: create_containers called with count={count} and data: {container_data}")
+        try:
+            count = parse_container_count(count)
+            contents = parse_container_contents(samples, count)
+        except ContainerBatchError as e:
+            return {'success': False, 'error': str(e)}
         
-        # If we couldn't find a unique barcode after max_attempts, use timestamp fallback
-        import time
-        timestamp_barcode = f"CNT-{int(time.time())}"
-        print(f"DEBUG: Using timestamp-based barcode as fallback: {timestamp_barcode}")
-        return timestamp_barcode
-    
-    def create_container(self, container_data, user_id):
-        print(f"DEBUG: create_container called with data: {container_data}")
-        # Extract key data for debugging
-        debug_info = {
-            'description': container_data.get('description'),
-            'locationId': container_data.get('locationId'),
-            'containerLocationId': container_data.get('containerLocationId'),
-            'storageLocation': container_data.get('storageLocation'),
-            'containerTypeId': container_data.get('containerTypeId'),
-            'newContainerType': container_data.get('newContainerType')
-        }
-        print(f"DEBUG: Key container data: {debug_info}")
         try:
             with self.db.transaction() as cursor:
-                # Use 'container' table
-                table_name = "container"
-                
-                # Verify the table exists
-                cursor.execute("SHOW TABLES LIKE 'container'")
-                if cursor.fetchone() is None:
-                    return {
-                        'success': False,
-                        'error': 'Container table does not exist'
-                    }
-                
-                print(f"DEBUG: Using table name: {table_name}")
+                mysql_ensure_current_amount(cursor)
                 container = Container.from_dict(container_data)
                 
-                # Print container object
-                print(f"DEBUG: Container object created: {container.__dict__}")
-                
                 # Get a location ID from various potential field names
                 location_id = container_data.get('locationId') or container_data.get('containerLocationId') or container_data.get('storageLocation')
                 print(f"DEBUG: Looking for location ID in data: {location_id}")
@@ -337,7 +300,6 @@ class ContainerService:
                 if new_container_type:
                     print(f"DEBUG: Creating new container type: {new_container_type}")
                     
-                    # Insert the new container type
                     cursor.execute("""
                         INSERT INTO ContainerType (
                             TypeName,
@@ -351,19 +313,12 @@ class ContainerService:
                         new_container_type.get('capacity')
                     ))
                     
-                    # Get the new container type ID
-                    container_type_id = cursor.lastrowid
-                    print(f"DEBUG: Created new container type with ID: {container_type_id}")
-                    
-                    # Update the container object with the new type ID
-                    container.container_type_id = container_type_id
+                    container.container_type_id = cursor.lastrowid
+                    print(f"DEBUG: Created new container type with ID: {container.container_type_id}")
                     
-                    # IMPORTANT: Always use the new container type's capacity for the container
-                    # This fixes the issue where capacity validation was preventing progression
+                    # Always use the new container type's capacity for the container
                     container.capacity = new_container_type.get('capacity')
-                    print(f"DEBUG: Using capacity {container.capacity} from new container type")
                     
-                    # Log the activity
                     cursor.execute("""
                         INSERT INTO History (
                             Timestamp, 
@@ -378,121 +333,66 @@ class ContainerService:
                         f"Container type '{new_container_type.get('typeName')}' created"
                     ))
                 
-                # Add the location_id to the insert query
-                if container.container_type_id:
-                    # Improved logic for container capacity determination
-                    # Priority: 1. Explicit capacity, 2. Default from type, 3. Reasonable fallback
-                    
-                    # Start with the explicitly provided capacity if any
-                    capacity = container.capacity
-                    
-                    # If no explicit capacity and not creating a new type, get default from container type
-                    if (capacity is None or capacity == 0) and not new_container_type:
-                        # Get default capacity from container type
-                        cursor.execute("""
-                            SELECT DefaultCapacity 
-                            FROM ContainerType 
-                            WHERE ContainerTypeID = %s
-                        """, (container.container_type_id,))
-                        
-                        type_result = cursor.fetchone()
-                        if type_result and type_result[0]:
-                            capacity = type_result[0]
-                            print(f"DEBUG: Using default capacity {capacity} from existing container type {container.container_type_id}")
-                        else:
-                            # If no default capacity is found, use a reasonable default
-                            capacity = 100
-                            print(f"DEBUG: No DefaultCapacity found for container type {container.container_type_id}, using standard default {capacity}")
-                    
-                    # Verify capacity is a valid number and greater than zero
-                    try:
-                        if capacity is not None:
-                            capacity = int(capacity)
-                            if capacity <= 0:
-                                capacity = 100
-                                print(f"DEBUG: Invalid capacity value ({capacity}), using standard default 100")
-                        else:
-                            capacity = 100
-                            print(f"DEBUG: No capacity specified, using standard default 100")
-                    except (ValueError, TypeError):
-                        capacity = 100
-                        print(f"DEBUG: Non-numeric capacity value, using standard default 100")
-                    
-                    # Generate unique container barcode
-                    container_barcode = self._generate_unique_container_barcode(cursor)
-                    
-                    query = f"""
-                        INSERT INTO {table_name} (
-                            Barcode,
-                            Description, 
-                            ContainerTypeID,
-                            IsMixed,
-                            ContainerCapacity,
-                            LocationID
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    """
-                    
-                    # Handle isMixed parameter from container_data
-                    is_mixed = container_data.get('isMixed', container.is_mixed)
-                    
-                    cursor.execute(query, (
-                        container_barcode,
-                        container.description,
-                        container.container_type_id,
-                        1 if is_mixed else 0,
-                        capacity,
-                        location_id
-                    ))
-                else:
-                    # Even when container type is not specified, we should properly handle capacity
-                    capacity = container.capacity
-                    
-                    # If no capacity is specified, use a reasonable default
-                    if capacity is None or capacity == 0:
-                        capacity = 100
-                        print(f"DEBUG: No container type or capacity specified, using standard default capacity {capacity}")
+                # Priority: 1. Explicit capacity, 2. Default from type (looked up once), 3. Reasonable fallback
+                capacity = container.capacity
+                if (capacity is None or capacity == 0) and container.container_type_id and not new_container_type:
+                    cursor.execute("""
+                        SELECT DefaultCapacity 
+                        FROM ContainerType 
+                        WHERE ContainerTypeID = %s
+                    """, (container.container_type_id,))
                     
-                    # Verify capacity is a valid number and greater than zero
-                    try:
-                        capacity = int(capacity)
-                        if capacity <= 0:
-                            capacity = 100
-                            print(f"DEBUG: Invalid capacity value ({capacity}), using standard default 100")
-                    except (ValueError, TypeError):
+                    type_result = cursor.fetchone()
+                    if type_result and type_result[0]:
+                        capacity = type_result[0]
+                        print(f"DEBUG: Using default capacity {capacity} from existing container type {container.container_type_id}")
+                try:
+                    capacity = int(capacity) if capacity is not None else 100
+                    if capacity <= 0:
                         capacity = 100
-                        print(f"DEBUG: Non-numeric capacity value, using standard default 100")
-                    
-                    # Generate unique container barcode
-                    container_barcode = self._generate_unique_container_barcode(cursor)
-                    
-                    query = f"""
-                        INSERT INTO {table_name} (
-                            Barcode,
-                            Description,
-                            IsMixed,
-                            ContainerCapacity,
-                            LocationID
-                        )
-                        VALUES (%s, %s, %s, %s, %s)
-                    """
-                    
-                    # Handle isMixed parameter from container_data
-                    is_mixed = container_data.get('isMixed', container.is_mixed)
-                    
-                    cursor.execute(query, (
-                        container_barcode,
-                        container.description,
-                        1 if is_mixed else 0,
-                        capacity,
-                        location_id
-                    ))
+                except (ValueError, TypeError):
+                    capacity = 100
+                    print(f"DEBUG: Non-numeric capacity value, using standard default 100")
                 
-                container_id = cursor.lastrowid
-                print(f"DEBUG: Container created with ID: {container_id}")
+                per_container = {}
+                for index, _, amount in contents:
+                    per_container[index] = per_container.get(index, 0) + amount
+                if not container_data.get('force'):
+                    for index, total in per_container.items():
+                        if total > capacity:
+                            # Raised (not returned) so a new container type is rolled back too
+                            raise ContainerBatchError(f'Container {index + 1} would hold {total} units, capacity is {capacity}')
                 
-                # Log the activity
-                cursor.execute("""
+                # Handle isMixed parameter from container_data
+                is_mixed = 1 if container_data.get('isMixed', container.is_mixed) else 0
+                barcodes = next_container_barcodes(count)
+                
+                # executemany sends this as a single multi-row INSERT
+                cursor.executemany("""
+                    INSERT INTO container (
+                        Barcode,
+                        Description, 
+                        ContainerTypeID,
+                        IsMixed,
+                        ContainerCapacity,
+                        LocationID
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, [
+                    (barcode, container.description, container.container_type_id, is_mixed, capacity, location_id)
+                    for barcode in barcodes
+                ])
+                
+                # Barcodes are unique, so they map the new rows back to their IDs
+                placeholders = ', '.join(['%s'] * count)
+                cursor.execute(f"""
+                    SELECT Barcode, ContainerID FROM container WHERE Barcode IN ({placeholders})
+                """, tuple(barcodes))
+                ids_by_barcode = dict(cursor.fetchall())
+                container_ids = [ids_by_barcode[barcode] for barcode in barcodes]
+                print(f"DEBUG: Created containers with IDs: {container_ids}")
+                
+                cursor.executemany("""
                     INSERT INTO History (
                         Timestamp, 
                         ActionType, 
@@ -500,23 +400,48 @@ class ContainerService:
                         Notes
                     )
                     VALUES (NOW(), %s, %s, %s)
-                """, (
-                    'Container created',
-                    user_id,
-                    f"Container {container_id} created: {container.description}"
-                ))
+                """, [
+                    ('Container created', user_id, f"Container {container_id} created: {container.description}")
+                    for container_id in container_ids
+                ])
                 
-                # Automatic printing is disabled - all printing handled by frontend
-                print(f"DEBUG: Container {container_id} created, automatic printing disabled")
+                if contents:
+                    sample_ids = sorted({sample_id for _, sample_id, _ in contents})
+                    placeholders = ', '.join(['%s'] * len(sample_ids))
+                    cursor.execute(f"""
+                        SELECT SampleID, MIN(StorageID)
+                        FROM samplestorage
+                        WHERE SampleID IN ({placeholders})
+                        GROUP BY SampleID
+                    """, tuple(sample_ids))
+                    storage_ids = dict(cursor.fetchall())
+                    missing = [sample_id for sample_id in sample_ids if sample_id not in storage_ids]
+                    if missing:
+                        raise ContainerBatchError(f'Sample SMP-{missing[0]} has no storage record')
+                    
+                    cursor.executemany("""
+                        INSERT INTO containersample (ContainerID, SampleStorageID, Amount)
+                        VALUES (%s, %s, %s)
+                    """, [
+                        (container_ids[index], storage_ids[sample_id], amount)
+                        for index, sample_id, amount in contents
+                    ])
+                    
+                    # New containers start with CurrentAmount = what was just put in them
+                    cursor.executemany("""
+                        UPDATE container SET CurrentAmount = %s WHERE ContainerID = %s
+                    """, [(total, container_ids[index]) for index, total in per_container.items()])
                 
-                result = {
+                return {
                     'success': True,
-                    'container_id': container_id
+                    'container_ids': container_ids,
+                    'barcodes': barcodes,
+                    'capacity': capacity
                 }
-                
-                return result
+        except ContainerBatchError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
-            print(f"DEBUG: Error in create_container: {e}")
+            print(f"DEBUG: Error in create_containers: {e}")
             import traceback
             traceback.print_exc()
             return {
@@ -529,14 +454,12 @@ class ContainerService:
         # Note: This function now MOVES samples to containers rather than adding them
         try:
             with self.db.transaction() as cursor:
-                # Container table is just named 'container' in this database
-                container_table = "container"
+                mysql_ensure_current_amount(cursor)
                 
-                # Check if container exists and get its capacity
-                cursor.execute(f"""
-                    SELECT c.ContainerID, c.ContainerCapacity, 
-                           IFNULL((SELECT SUM(cs.Amount) FROM ContainerSample cs WHERE cs.ContainerID = c.ContainerID), 0) as CurrentAmount 
-                    FROM {container_table} c
+                # Check if container exists and get its capacity (CurrentAmount is maintained, see container_fill)
+                cursor.execute("""
+                    SELECT c.ContainerID, c.ContainerCapacity, c.CurrentAmount
+                    FROM container c
                     WHERE c.ContainerID = %s
                 """, (container_id,))
                 
@@ -633,27 +556,30 @@ class ContainerService:
                         'error': 'This sample is already in another container. Please use the Move functionality in Sample Overview to move samples between containers.'
                     }
                 
+                # Reserve the space with one guarded update - the check and the
+                # increment are atomic, so concurrent adds cannot overfill the container
+                if not mysql_reserve_capacity(cursor, container_id, amount, force_add):
+                    # Discard anything written above (e.g. the container location)
+                    self.mysql.connection.rollback()
+                    cursor.execute("SELECT ContainerCapacity, CurrentAmount FROM container WHERE ContainerID = %s", (container_id,))
+                    container_capacity, current_amount = cursor.fetchone()
+                    available_space = container_capacity - current_amount
+                    return {
+                        'success': False,
+                        'warning': True,
+                        'capacity_exceeded': True,
+                        'error': f'Cannot add {amount} samples to container. Container has {available_space} of {container_capacity} units available (current: {current_amount})',
+                        'current_amount': current_amount,
+                        'new_amount': current_amount + amount,
+                        'capacity': container_capacity,
+                        'available_space': available_space
+                    }
+                
                 # Remove sample from original container if it exists (for Sample Overview moves)
                 if original_container_id and original_container_id != container_id:
-                    cursor.execute("""
-                        DELETE FROM containersample 
-                        WHERE SampleStorageID = %s AND ContainerID = %s
-                    """, (storage_id, original_container_id))
+                    mysql_remove_storage_from_containers(cursor, storage_id, original_container_id)
                     print(f"DEBUG: Removed sample from original container {original_container_id}")
                 
-                # Check if containersample table exists, create if it doesn't
-                cursor.execute("SHOW TABLES LIKE 'containersample'")
-                if cursor.fetchone() is None:
-                    print("DEBUG: Creating containersample table")
-                    cursor.execute("""
-                        CREATE TABLE containersample (
-                            ContainerSampleID INT AUTO_INCREMENT PRIMARY KEY,
-                            SampleStorageID INT NOT NULL,
-                            ContainerID INT NOT NULL,
-                            Amount INT NOT NULL DEFAULT 1
-                        )
-                    """)
-                
                 # Add the sample to the container
                 cursor.execute("""
                     INSERT INTO containersample (
@@ -827,6 +753,151 @@ class ContainerService:
                 'error': str(e)
             }
             
+    def bulk_add_samples(self, container_id, items, user_id, force_add=False):
+        """
+        Add many samples ([(sample_id, amount or None)]) to one container in one
+        transaction: one StorageID lookup, one guarded capacity update for the
+        total, then batched containersample and history inserts.
+        Returns {'success', 'samples', 'failed'} like the MSSQL endpoint.
+        """
+        try:
+            with self.db.transaction() as cursor:
+                mysql_ensure_current_amount(cursor)
+                
+                sample_ids = [sample_id for sample_id, _ in items]
+                placeholders = ', '.join(['%s'] * len(sample_ids))
+                cursor.execute(f"""
+                    SELECT s.SampleID, s.Status, MIN(ss.StorageID)
+                    FROM sample s
+                    LEFT JOIN samplestorage ss ON s.SampleID = ss.SampleID
+                    WHERE s.SampleID IN ({placeholders})
+                    GROUP BY s.SampleID, s.Status
+                """, tuple(sample_ids))
+                found = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+                
+                added = []
+                failures = []
+                for sample_id, amount in items:
+                    status, storage_id = found.get(sample_id, (None, None))
+                    if sample_id not in found:
+                        failures.append({'sample_id': sample_id, 'error': f'Sample with ID {sample_id} not found'})
+                    elif status == 'Disposed':
+                        failures.append({'sample_id': sample_id, 'error': 'Cannot add a disposed sample'})
+                    elif storage_id is None:
+                        failures.append({'sample_id': sample_id, 'error': 'Sample storage not found'})
+                    else:
+                        added.append({'sample_id': sample_id, 'amount': amount or 1, 'storage_id': storage_id})
+                
+                total = sum(entry['amount'] for entry in added)
+                if total and not mysql_reserve_capacity(cursor, container_id, total, force_add):
+                    cursor.execute("SELECT ContainerCapacity, CurrentAmount FROM container WHERE ContainerID = %s", (container_id,))
+                    container_row = cursor.fetchone()
+                    if not container_row:
+                        return {'success': False, 'error': f'Container with ID {container_id} does not exist'}
+                    capacity, current_amount = container_row
+                    return {
+                        'success': False,
+                        'capacity_exceeded': True,
+                        'error': f'Cannot add {total} units to container. Current: {current_amount}, Capacity: {capacity}, Available: {capacity - current_amount}',
+                        'capacity': capacity,
+                        'current_amount': current_amount,
+                        'new_amount': current_amount + total
+                    }
+                
+                if added:
+                    cursor.executemany("""
+                        INSERT INTO containersample (SampleStorageID, ContainerID, Amount)
+                        VALUES (%s, %s, %s)
+                    """, [(entry['storage_id'], container_id, entry['amount']) for entry in added])
+                    cursor.executemany("""
+                        INSERT INTO history (Timestamp, ActionType, UserID, SampleID, Notes)
+                        VALUES (NOW(), %s, %s, %s, %s)
+                    """, [
+                        ('Sample added to container', user_id, entry['sample_id'],
+                         f"Sample {entry['sample_id']} added to Container {container_id}, amount: {entry['amount']}")
+                        for entry in added
+                    ])
+                
+                return {
+                    'success': bool(added),
+                    'samples': [{'sample_id': entry['sample_id'], 'amount': entry['amount']} for entry in added],
+                    'failed': failures
+                }
+        except Exception as e:
+            print(f"DEBUG: Error in bulk_add_samples: {e}")
+            import traceback
+            traceback.print_exc()
+            return {'success': False, 'error': str(e)}
+    
+    def bulk_remove_samples(self, container_id, items, user_id):
+        """
+        Take many samples ([(sample_id, amount or None)]) out of one container in
+        one transaction. None removes everything the sample holds there.
+        """
+        try:
+            with self.db.transaction() as cursor:
+                mysql_ensure_current_amount(cursor)
+                
+                sample_ids = [sample_id for sample_id, _ in items]
+                placeholders = ', '.join(['%s'] * len(sample_ids))
+                cursor.execute(f"""
+                    SELECT ss.SampleID, cs.ContainerSampleID, cs.Amount
+                    FROM containersample cs
+                    JOIN samplestorage ss ON ss.StorageID = cs.SampleStorageID
+                    WHERE cs.ContainerID = %s AND ss.SampleID IN ({placeholders})
+                    ORDER BY cs.ContainerSampleID
+                """, (container_id,) + tuple(sample_ids))
+                links = {}
+                for sample_id, link_id, amount in cursor.fetchall():
+                    links.setdefault(sample_id, []).append((link_id, amount))
+                
+                deletes = []
+                reductions = []
+                removed = []
+                failures = []
+                for sample_id, amount in items:
+                    held = sum(link_amount for _, link_amount in links.get(sample_id, []))
+                    if not held:
+                        failures.append({'sample_id': sample_id, 'error': f'Sample {sample_id} is not in container {container_id}'})
+                    elif amount is None or amount >= held:
+                        deletes.extend((link_id,) for link_id, _ in links[sample_id])
+                        removed.append({'sample_id': sample_id, 'amount': held})
+                    else:
+                        link = next((link for link in links[sample_id] if link[1] >= amount), None)
+                        if link is None:
+                            failures.append({
+                                'sample_id': sample_id,
+                                'error': f'Amount {amount} is spread over several entries; remove all {held} instead'
+                            })
+                            continue
+                        if link[1] == amount:
+                            deletes.append((link[0],))
+                        else:
+                            reductions.append((amount, link[0]))
+                        removed.append({'sample_id': sample_id, 'amount': amount})
+                
+                if deletes:
+                    cursor.executemany("DELETE FROM containersample WHERE ContainerSampleID = %s", deletes)
+                if reductions:
+                    cursor.executemany("UPDATE containersample SET Amount = Amount - %s WHERE ContainerSampleID = %s", reductions)
+                if removed:
+                    mysql_release_capacity(cursor, container_id, sum(entry['amount'] for entry in removed))
+                    cursor.executemany("""
+                        INSERT INTO history (Timestamp, ActionType, UserID, SampleID, Notes)
+                        VALUES (NOW(), %s, %s, %s, %s)
+                    """, [
+                        ('Sample removed from container', user_id, entry['sample_id'],
+                         f"Sample {entry['sample_id']} removed from Container {container_id}, amount: {entry['amount']}")
+                        for entry in removed
+                    ])
+                
+                return {'success': bool(removed), 'samples': removed, 'failed': failures}
+        except Exception as e:
+            print(f"DEBUG: Error in bulk_remove_samples: {e}")
+            import traceback
+            traceback.print_exc()
+            return {'success': False, 'error': str(e)}
+    
     def delete_container(self, container_id, user_id):
         try:
             print(f"DEBUG: Deleting container {container_id}")
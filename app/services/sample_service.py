@@ -1,6 +1,7 @@
 from datetime import datetime
 from app.models.sample import Sample
 from app.utils.db import DatabaseManager
+from app.utils.sequences import next_sample_barcode
 
 class SampleService:
     def __init__(self, mysql):
@@ -212,7 +213,7 @@ class SampleService:
             # Generate a unique barcode if not provided
             base_barcode = sample_data.get('barcode', '')
             if not base_barcode:
-                base_barcode = f"BC{reception_id}-{int(datetime.now().timestamp())}"
+                base_barcode = next_sample_barcode()
             
             # Get sample data
             total_amount = int(sample_data.get('totalAmount', 0))
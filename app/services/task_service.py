@@ -1,6 +1,7 @@
 from datetime import datetime
 from app.models.task import Task, TaskSample
 from app.utils.db import DatabaseManager
+from app.utils.sequences import next_task_number, peek_task_test_number
 import json
 
 class TaskService:
@@ -207,8 +208,9 @@ class TaskService:
         task.created_by = user_id
         
         # Generate task number if not provided
-        if not task.task_number or not task.task_number.strip():
-            task.task_number = self._generate_task_number()
+        generated_number = not task.task_number or not task.task_number.strip()
+        if generated_number:
+            task.task_number = next_task_number()
         
         # Validate task data
         validation = task.validate()
@@ -219,9 +221,11 @@ class TaskService:
             }
         
         try:
-            # Check if task number already exists
+            # Check if a client-supplied task number already exists (generated ones are unique)
             existing_query = "SELECT TaskID FROM task WHERE TaskNumber = %s"
-            existing_result, _ = self.db.execute_query(existing_query, (task.task_number,))
+            existing_result = None
+            if not generated_number:
+                existing_result, _ = self.db.execute_query(existing_query, (task.task_number,))
             
             if existing_result:
                 return {
@@ -572,50 +576,14 @@ class TaskService:
     
     def generate_next_test_number(self, task_id):
         """
-        Generate the next test number for a task.
+        Preview the next test number for a task (see peek_task_test_number).
         """
         try:
-            cursor = self.mysql.connection.cursor()
-            cursor.execute("SELECT GetNextTaskTestNumber(%s)", (task_id,))
-            result = cursor.fetchone()
-            cursor.close()
-            
-            if result and result[0]:
-                return result[0]
-            else:
-                # Fallback method
-                return f"T{task_id}00.1"
-                
+            return peek_task_test_number(self.mysql, task_id)
         except Exception as e:
             print(f"Error generating test number: {e}")
             return f"T{task_id}00.1"
     
-    def _generate_task_number(self):
-        """
-        Generate next available task number in format TSK-XXX.
-        """
-        query = """
-            SELECT TaskNumber FROM task 
-            WHERE TaskNumber LIKE 'TSK-%' 
-            ORDER BY CAST(SUBSTRING(TaskNumber, 5) AS UNSIGNED) DESC 
-            LIMIT 1
-        """
-        
-        result, _ = self.db.execute_query(query)
-        
-        if result and result[0][0]:
-            # Extract number from TSK-XXX format
-            last_number = result[0][0]
-            try:
-                num_part = int(last_number.split('-')[1])
-                next_num = num_part + 1
-            except (ValueError, IndexError):
-                next_num = 1
-        else:
-            next_num = 1
-        
-        return f"TSK-{next_num:03d}"
-    
     def _log_task_activity(self, task_id, action_type, notes, user_id):
         """
         Log task activity to history table.
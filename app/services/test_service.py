@@ -1,5 +1,6 @@
 from datetime import datetime
 from app.utils.db import DatabaseManager
+from app.utils.sequences import next_test_number, next_task_test_number
 
 class TestService:
     def __init__(self, mysql):
@@ -77,18 +78,10 @@ class TestService:
                 
                 if task_id:
                     # Use task-specific test numbering
-                    cursor.execute("SELECT GetNextTaskTestNumber(%s)", (task_id,))
-                    test_no_result = cursor.fetchone()
-                    test_no = test_no_result[0] if test_no_result and test_no_result[0] else None
-                    
-                    if not test_no:
-                        # Fallback to regular numbering if task function fails
-                        cursor.execute("SELECT GetNextTestNumber()")
-                        test_no = cursor.fetchone()[0]
+                    test_no = next_task_test_number(self.mysql, task_id)
                 else:
                     # Use general test numbering
-                    cursor.execute("SELECT GetNextTestNumber()")
-                    test_no = cursor.fetchone()[0]
+                    test_no = next_test_number()
                 
                 # Insert test with optional task link
                 cursor.execute("""
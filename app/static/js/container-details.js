@@ -97,20 +97,25 @@ window.loadContainerDetails = function(containerId) {
                 document.getElementById('container-status').innerHTML = `<span class="badge bg-primary">${container.Status || 'Active'}</span>`;
                 document.getElementById('container-mixed').textContent = container.IsMixed ? 'Yes' : 'No';
                 
-                // Fetch and display location
-                fetch(`/api/containers/${containerId}/location`)
-                    .then(response => response.json())
-                    .then(locationData => {
-                        if (locationData.success && locationData.location) {
-                            document.getElementById('container-location').textContent = locationData.location.LocationName || '-';
-                        } else {
-                            document.getElementById('container-location').textContent = 'No location information';
-                        }
-                    })
-                    .catch(error => {
-                        console.error('Error fetching container location:', error);
-                        document.getElementById('container-location').textContent = 'Error loading location';
-                    });
+                // Location comes with the details; older backends need a second request
+                if ('location' in data) {
+                    document.getElementById('container-location').textContent =
+                        data.location ? (data.location.Path || data.location.LocationName || '-') : 'No location assigned';
+                } else {
+                    fetch(`/api/containers/${containerId}/location`)
+                        .then(response => response.json())
+                        .then(locationData => {
+                            if (locationData.success && locationData.location) {
+                                document.getElementById('container-location').textContent = locationData.location.LocationName || '-';
+                            } else {
+                                document.getElementById('container-location').textContent = 'No location information';
+                            }
+                        })
+                        .catch(error => {
+                            console.error('Error fetching container location:', error);
+                            document.getElementById('container-location').textContent = 'Error loading location';
+                        });
+                }
                 
                 // Display samples with more detail
                 if (data.samples && data.samples.length > 0) {
@@ -224,16 +229,73 @@ function setupSampleSelect() {
     // This could use a library like select2
 }
 
+// Selected sample IDs from the sample picker (single or multiple select)
+function getSelectedSampleIds(select) {
+    if (!select) return [];
+    return Array.from(select.selectedOptions || []).map(option => option.value).filter(value => value);
+}
+
+// Add or remove several samples in one request: samples is [{sampleId, amount}]
+function updateContainerSamplesBulk(containerId, action, samples, forceAdd = false) {
+    return fetch(`/api/containers/${containerId}/samples:bulk`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ action: action, samples: samples, force_add: forceAdd }),
+        cache: 'no-store'
+    })
+    .then(response => response.json());
+}
+
+// Pack several selected samples with one bulk request
+function proceedWithBulkAddSamples(containerId, sampleIds, amount, forceAdd = false) {
+    const samples = sampleIds.map(sampleId => ({ sampleId: sampleId, amount: amount }));
+    
+    updateContainerSamplesBulk(containerId, 'add', samples, forceAdd)
+    .then(data => {
+        if (data.success) {
+            showSuccessMessage(data.message || `${data.samples.length} samples added to container!`);
+            if (data.failed && data.failed.length > 0) {
+                showWarningMessage(data.failed.map(f => `SMP-${f.sample_id}: ${f.error}`).join('<br>'));
+            }
+            
+            const modal = bootstrap.Modal.getInstance(document.getElementById('addSampleToContainerModal'));
+            if (modal) modal.hide();
+            
+            if (typeof window.showContainerUpdatePrintPrompt === 'function') {
+                window.showContainerUpdatePrintPrompt(containerId, {
+                    description: `Container after adding ${data.samples.length} samples`,
+                    action: 'Samples added to container'
+                });
+            } else {
+                setTimeout(() => {
+                    window.location.reload();
+                }, 1500);
+            }
+        } else if (data.capacity_exceeded) {
+            showCapacityWarningConfirm(data.error, data.current_amount, data.new_amount, data.capacity, () => {
+                proceedWithBulkAddSamples(containerId, sampleIds, amount, true);
+            });
+        } else {
+            showErrorMessage(`Error adding samples: ${data.error}`);
+        }
+    })
+    .catch(error => {
+        showErrorMessage(`An error occurred: ${error}`);
+    });
+}
+
 // Add sample to container
 function addSampleToContainer(forceAdd = false) {
     console.log('🎯 CONTAINER-DETAILS: addSampleToContainer called with forceAdd:', forceAdd);
     const containerId = document.getElementById('targetContainerId').value;
-    const sampleId = document.getElementById('sampleSelect').value;
+    const sampleIds = getSelectedSampleIds(document.getElementById('sampleSelect'));
     const amount = parseInt(document.getElementById('sampleAmount').value) || 1;
-    console.log('🎯 CONTAINER-DETAILS: Add data - containerId:', containerId, 'sampleId:', sampleId, 'amount:', amount);
+    console.log('🎯 CONTAINER-DETAILS: Add data - containerId:', containerId, 'sampleIds:', sampleIds, 'amount:', amount);
     
     // Validation
-    if (!sampleId) {
+    if (sampleIds.length === 0) {
         showErrorMessage('Please select a sample');
         return;
     }
@@ -243,8 +305,13 @@ function addSampleToContainer(forceAdd = false) {
         return;
     }
     
+    if (sampleIds.length > 1) {
+        proceedWithBulkAddSamples(containerId, sampleIds, amount, forceAdd);
+        return;
+    }
+    
     // Proceed with add - backend now filters out samples already in containers
-    proceedWithAddSample(containerId, sampleId, amount, forceAdd);
+    proceedWithAddSample(containerId, sampleIds[0], amount, forceAdd);
 }
 
 function proceedWithAddSample(containerId, sampleId, amount, forceAdd = false) {
@@ -0,0 +1,196 @@
+// app/static/js/container-list.js
+// Lazy container page: the server renders an empty shell and the container
+// table and sample picker are loaded page by page from the JSON APIs.
+
+let containerListCursor = null;
+let containerListRequest = 0;
+let sampleSelectCursor = null;
+let sampleSelectRequest = 0;
+
+document.addEventListener('DOMContentLoaded', function() {
+    const tbody = document.getElementById('containerTableBody');
+    if (!tbody || tbody.dataset.lazy !== 'true') return;
+
+    loadContainerList();
+
+    const searchInput = document.getElementById('containerListSearch');
+    if (searchInput) {
+        let searchTimer = null;
+        searchInput.addEventListener('input', function() {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadContainerList(), 300);
+        });
+    }
+
+    const fillSelect = document.getElementById('containerListFill');
+    if (fillSelect) {
+        fillSelect.addEventListener('change', () => loadContainerList());
+    }
+
+    const moreButton = document.querySelector('#containerListMore button');
+    if (moreButton) {
+        moreButton.addEventListener('click', () => loadContainerList(containerListCursor));
+    }
+
+    // Rows are added after the page scripts bound their buttons, so handle them here
+    tbody.addEventListener('click', function(e) {
+        const button = e.target.closest('button[data-container-id]');
+        if (!button) return;
+        const containerId = button.getAttribute('data-container-id');
+
+        if (button.classList.contains('delete-container-btn')) {
+            deleteContainer(containerId);
+        } else if (button.classList.contains('add-sample-btn')) {
+            document.getElementById('targetContainerId').value = containerId;
+        } else if (button.classList.contains('container-details-btn')) {
+            loadContainerDetails(containerId);
+            new bootstrap.Modal(document.getElementById('containerDetailsModal')).show();
+        }
+    });
+
+    setupLazySampleSelect();
+});
+
+function escapeContainerText(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : String(value);
+    return div.innerHTML;
+}
+
+async function loadContainerList(cursor = null) {
+    const tbody = document.getElementById('containerTableBody');
+    const more = document.getElementById('containerListMore');
+    const search = (document.getElementById('containerListSearch') || {}).value || '';
+    const fill = (document.getElementById('containerListFill') || {}).value || '';
+    const request = ++containerListRequest;
+
+    let url = '/api/containers?per_page=50';
+    if (search.trim()) {
+        url += `&search=${encodeURIComponent(search.trim())}`;
+    }
+    if (fill) {
+        url += `&fill=${encodeURIComponent(fill)}`;
+    }
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+
+    try {
+        const response = await fetch(url, { cache: 'no-store' });
+        const data = await response.json();
+        // A newer search was started while this one was in flight
+        if (request !== containerListRequest) return;
+
+        if (!data.success) {
+            tbody.innerHTML = `<tr><td colspan="7" class="text-center text-danger">${escapeContainerText(data.error || 'Error loading containers')}</td></tr>`;
+            return;
+        }
+
+        if (!cursor) {
+            tbody.innerHTML = '';
+        }
+        data.containers.forEach(container => tbody.appendChild(renderContainerRow(container)));
+        if (!tbody.children.length) {
+            tbody.innerHTML = '<tr><td colspan="7" class="text-center">No containers found</td></tr>';
+        }
+
+        containerListCursor = data.pagination.next_cursor;
+        if (more) {
+            more.classList.toggle('d-none', !data.pagination.has_next);
+        }
+    } catch (error) {
+        console.error('Error loading containers:', error);
+        if (request === containerListRequest) {
+            tbody.innerHTML = '<tr><td colspan="7" class="text-center text-danger">Error loading containers</td></tr>';
+        }
+    }
+}
+
+function renderContainerRow(container) {
+    const row = document.createElement('tr');
+    row.dataset.containerId = container.ContainerID;
+    row.innerHTML = `
+        <td>${container.ContainerID}</td>
+        <td>${escapeContainerText(container.Description)}</td>
+        <td>${escapeContainerText(container.TypeName)}</td>
+        <td>${container.IsMixed ? 'Yes' : 'No'}</td>
+        <td>${container.SampleCount || 0} samples / ${container.TotalItems || 0} units</td>
+        <td>${escapeContainerText(container.LocationName || 'Unknown')}</td>
+        <td>
+            <button class="btn btn-sm btn-secondary container-details-btn" data-container-id="${container.ContainerID}">Details</button>
+            <button class="btn btn-sm btn-success add-sample-btn" data-container-id="${container.ContainerID}" data-bs-toggle="modal" data-bs-target="#addSampleToContainerModal">Add Sample</button>
+            <button class="btn btn-sm btn-outline-danger delete-container-btn" data-container-id="${container.ContainerID}">Delete</button>
+        </td>
+    `;
+    return row;
+}
+
+function setupLazySampleSelect() {
+    const sampleSelect = document.getElementById('sampleSelect');
+    if (!sampleSelect || sampleSelect.dataset.lazy !== 'true') return;
+
+    const modal = document.getElementById('addSampleToContainerModal');
+    if (modal) {
+        // Reload on every open so samples packed meanwhile drop out of the list
+        modal.addEventListener('show.bs.modal', () => loadSampleSelect());
+    }
+
+    const searchInput = document.getElementById('sampleSelectSearch');
+    if (searchInput) {
+        let searchTimer = null;
+        searchInput.addEventListener('input', function() {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadSampleSelect(), 300);
+        });
+    }
+
+    const moreButton = document.getElementById('sampleSelectMore');
+    if (moreButton) {
+        moreButton.addEventListener('click', () => loadSampleSelect(sampleSelectCursor));
+    }
+}
+
+async function loadSampleSelect(cursor = null) {
+    const sampleSelect = document.getElementById('sampleSelect');
+    const more = document.getElementById('sampleSelectMore');
+    const search = (document.getElementById('sampleSelectSearch') || {}).value || '';
+    const request = ++sampleSelectRequest;
+
+    let url = '/api/containers/available-samples?per_page=50';
+    if (search.trim()) {
+        url += `&search=${encodeURIComponent(search.trim())}`;
+    }
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+
+    try {
+        const response = await fetch(url, { cache: 'no-store' });
+        const data = await response.json();
+        if (request !== sampleSelectRequest) return;
+        if (!data.success) {
+            console.error('Error loading samples:', data.error);
+            return;
+        }
+
+        if (!cursor) {
+            // Keep the disabled placeholder option
+            while (sampleSelect.options.length > 1) {
+                sampleSelect.remove(1);
+            }
+        }
+        data.samples.forEach(sample => {
+            const option = document.createElement('option');
+            option.value = sample.SampleID;
+            option.textContent = `${sample.SampleIDFormatted}: ${sample.Description} (${sample.AmountRemaining} ${sample.Unit})`;
+            sampleSelect.appendChild(option);
+        });
+
+        sampleSelectCursor = data.pagination.next_cursor;
+        if (more) {
+            more.classList.toggle('d-none', !data.pagination.has_next);
+        }
+    } catch (error) {
+        console.error('Error loading samples:', error);
+    }
+}
@@ -126,8 +126,11 @@ function showContainerDetails(containerId) {
                 }
                 document.getElementById('container-mixed').textContent = isMixed;
                 
-                // Get location data
-                if (container.LocationID) {
+                // Location comes with the details; older backends need a second request
+                if ('location' in data) {
+                    document.getElementById('container-location').textContent =
+                        data.location ? (data.location.Path || data.location.LocationName || '-') : 'No location assigned';
+                } else if (container.LocationID) {
                     // Try the new API endpoint first
                     fetch(`/api/locations/${container.LocationID}`)
                         .then(response => {
@@ -355,7 +358,8 @@ function filterContainers(filter) {
 // Function to add sample to container
 function addSampleToContainer() {
     const containerId = document.getElementById('targetContainerId').value;
-    const sampleId = document.getElementById('sampleSelect').value;
+    const sampleIds = getSelectedSampleIds(document.getElementById('sampleSelect'));
+    const sampleId = sampleIds[0];
     const amount = parseInt(document.getElementById('sampleAmount').value) || 1;
     
     // Validation
@@ -369,6 +373,12 @@ function addSampleToContainer() {
         return;
     }
     
+    // Several samples go in with one bulk request (container-details.js)
+    if (sampleIds.length > 1) {
+        proceedWithBulkAddSamples(containerId, sampleIds, amount);
+        return;
+    }
+    
     // Create data object
     const data = {
         containerId: containerId,
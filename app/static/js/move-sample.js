@@ -77,27 +77,50 @@ function prepareMoveModal(source, sampleId) {
         if (sampleDetailsModal) {
             sampleDetailsModal.hide();
         }
-    } else {
-        // Called from table - need to fetch sample details first
-        fetchSampleDataForMove(sampleId);
+    }
+    
+    // Sample info, available containers and locations come from one request
+    const moveData = loadMoveDialogData(sampleId);
+    if (source !== 'modal') {
+        // Called from table - show the sample details from that request
+        fetchSampleDataForMove(sampleId, moveData);
     }
     
     // Set the sample ID in the hidden input
     document.getElementById('moveSampleId').value = sampleId;
     
-    // Fetch available containers and locations
-    fetchContainersForMove();
-    fetchLocationsForMove();
+    // Fill available containers and locations
+    fetchContainersForMove(moveData);
+    fetchLocationsForMove(moveData);
     
     // Show the move modal
     const modal = new bootstrap.Modal(moveModal);
     modal.show();
 }
 
-// Function to fetch sample data for the move modal
-function fetchSampleDataForMove(sampleId) {
-    fetch(`/api/samples/${sampleId}`)
-        .then(response => response.json())
+// Unit of the sample in the move modal (used for container unit validation)
+let moveSampleUnit = null;
+
+// Function to load everything the move modal needs with one request
+function loadMoveDialogData(sampleId) {
+    moveSampleUnit = null;
+    const fields = 'Description,PartNumber,Amount,Unit';
+    
+    const moveData = fetch(`/api/samples/${sampleId}?include=move_targets&fields=${fields}`)
+        .then(response => response.json());
+    moveData
+        .then(data => {
+            if (data.success && data.sample) {
+                moveSampleUnit = data.sample.Unit || 'pcs';
+            }
+        })
+        .catch(() => {});
+    return moveData;
+}
+
+// Function to show sample data in the move modal
+function fetchSampleDataForMove(sampleId, moveData) {
+    moveData
         .then(data => {
             if (data.success && data.sample) {
                 const sample = data.sample;
@@ -119,12 +142,12 @@ function fetchSampleDataForMove(sampleId) {
         });
 }
 
-// Function to fetch containers for the move modal
-function fetchContainersForMove() {
-    fetch('/api/containers/available')
-        .then(response => response.json())
+// Function to fill the container dropdown in the move modal
+function fetchContainersForMove(moveData) {
+    moveData
+        .then(data => data.move_targets || {})
         .then(data => {
-            if (data.success && data.containers) {
+            if (data.containers) {
                 const containerSelect = document.getElementById('moveContainerSelect');
                 containerSelect.innerHTML = '<option value="">-- Select Container --</option><option value="none">No Container</option>';
                 
@@ -167,12 +190,12 @@ function fetchContainersForMove() {
 }
 
 
-// Function to fetch locations for the move modal
-function fetchLocationsForMove() {
-    fetch('/api/basic-locations')
-        .then(response => response.json())
+// Function to fill the location dropdown in the move modal
+function fetchLocationsForMove(moveData) {
+    moveData
+        .then(data => data.move_targets || {})
         .then(data => {
-            if (data.success && data.locations) {
+            if (data.locations) {
                 const locationSelect = document.getElementById('moveLocationSelect');
                 locationSelect.innerHTML = '<option value="">-- Select Location --</option>';
                 
@@ -273,9 +296,12 @@ function moveToContainer(data) {
 
 // Function to validate unit type compatibility
 function validateUnitTypeForContainerMove(sampleId, containerId, callback) {
-    // First get the sample's unit type
-    fetch(`/api/samples/${sampleId}`)
-        .then(response => response.json())
+    // The sample's unit was loaded with the move dialog; fall back to fetching it
+    const sampleRequest = moveSampleUnit
+        ? Promise.resolve({ success: true, sample: { Unit: moveSampleUnit } })
+        : fetch(`/api/samples/${sampleId}?include=&fields=Unit`).then(response => response.json());
+    
+    sampleRequest
         .then(sampleData => {
             if (!sampleData.success) {
                 throw new Error('Could not fetch sample data');
@@ -140,6 +140,33 @@ function setupLazyLoading() {
     });
 }
 
+/**
+ * Fetch several GET /api/ paths in one round trip via /api/batch.
+ * Resolves to [{path, status, body, duration_ms}] in the order given.
+ */
+const BATCH_MAX_REQUESTS = 25;  // matches MAX_BATCH_REQUESTS on the server
+
+async function batchGet(paths) {
+    const chunks = [];
+    for (let i = 0; i < paths.length; i += BATCH_MAX_REQUESTS) {
+        chunks.push(paths.slice(i, i + BATCH_MAX_REQUESTS));
+    }
+
+    const results = await Promise.all(chunks.map(async chunk => {
+        const response = await fetch('/api/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ requests: chunk })
+        });
+        const data = await response.json();
+        if (!response.ok || data.status !== 'success') {
+            throw new Error(data.message || `Batch request failed with status ${response.status}`);
+        }
+        return data.responses;
+    }));
+    return results.flat();
+}
+
 /**
  * Batch API requests to reduce server load
  */
@@ -162,11 +189,34 @@ class RequestBatcher {
         });
     }
 
+    static isBatchable(req) {
+        const method = (req.options.method || 'GET').toUpperCase();
+        return method === 'GET' && typeof req.url === 'string' && req.url.startsWith('/api/');
+    }
+
     async flush() {
         if (this.queue.length === 0) return;
         
         const requests = this.queue.splice(0);
         
+        // Plain GETs to our own API go to the server in one /api/batch request
+        if (requests.length > 1 && requests.every(req => RequestBatcher.isBatchable(req))) {
+            try {
+                const responses = await batchGet(requests.map(req => req.url));
+                requests.forEach((req, index) => {
+                    const entry = responses[index];
+                    if (entry.status >= 400 && entry.body === null) {
+                        req.reject(new Error(`${req.url} failed with status ${entry.status}`));
+                    } else {
+                        req.resolve(entry.body);
+                    }
+                });
+            } catch (error) {
+                requests.forEach(req => req.reject(error));
+            }
+            return;
+        }
+        
         try {
             const responses = await Promise.all(
                 requests.map(req => fetch(req.url, req.options))
@@ -200,5 +250,6 @@ window.PerformanceUtils = {
     SimpleCache,
     VirtualTable,
     setupLazyLoading,
-    RequestBatcher
+    RequestBatcher,
+    batchGet
 };
\ No newline at end of file
@@ -590,8 +590,8 @@ function skipContainerUpdatePrint() {
 function showSampleLocationPrintPrompt(sampleId, updateInfo) {
     console.log('🖨️ Sample location print prompt called with:', { sampleId, updateInfo });
     
-    // First fetch sample data
-    fetch(`/api/samples/${sampleId}`)
+    // First fetch sample data (only the fields the prompt shows)
+    fetch(`/api/samples/${sampleId}?include=&fields=SampleIDFormatted,Barcode,Description`)
         .then(response => response.json())
         .then(data => {
             if (data.success && data.sample) {
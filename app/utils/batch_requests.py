@@ -0,0 +1,104 @@
+"""
+In-process dispatch of GET sub-requests for /api/batch.
+
+A page that needs five to ten JSON endpoints at boot can post their paths in
+one request. Each path is dispatched through the normal Flask routing inside
+the current app context, so the sub-requests share the batch request's
+database connection (mssql_db.shared_connection) and the cached current user
+instead of paying the per-request connection and lookup cost every time.
+
+Sub-requests run one after another: a pyodbc connection serves one statement
+at a time, so running them in parallel would need a connection per thread and
+lose the sharing that makes the batch cheap.
+"""
+import time
+import logging
+from urllib.parse import urlsplit
+
+from flask import current_app
+
+from app.utils.mssql_db import mssql_db
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_REQUESTS = 25
+BATCH_PATH = '/api/batch'
+
+
+class BatchRequestError(ValueError):
+    """The batch payload itself is invalid (as opposed to a failing item)"""
+
+
+def parse_batch_paths(data):
+    """
+    Accept {"requests": ["/api/...", ...]} (or {"requests": [{"path": "/api/..."}]})
+    and return the list of paths. Raises BatchRequestError on a bad payload.
+    """
+    items = (data or {}).get('requests')
+    if not isinstance(items, list) or not items:
+        raise BatchRequestError('requests must be a non-empty list of paths')
+    if len(items) > MAX_BATCH_REQUESTS:
+        raise BatchRequestError(f'A batch may contain at most {MAX_BATCH_REQUESTS} requests')
+
+    paths = []
+    for item in items:
+        path = item.get('path') if isinstance(item, dict) else item
+        if not isinstance(path, str) or not path.strip():
+            raise BatchRequestError('Each request must be a path string')
+        paths.append(path.strip())
+    return paths
+
+
+def _check_path(path):
+    """Only same-application /api/ GET paths may be batched; returns an error or None"""
+    parts = urlsplit(path)
+    if parts.scheme or parts.netloc:
+        return 'Only local paths can be batched'
+    if not parts.path.startswith('/api/'):
+        return 'Only /api/ paths can be batched'
+    if parts.path.rstrip('/') == BATCH_PATH:
+        return 'Batches cannot be nested'
+    return None
+
+
+def _dispatch(path):
+    """Run one GET through the app's routing and return its envelope entry"""
+    error = _check_path(path)
+    if error:
+        return {'path': path, 'status': 400, 'body': {'error': error}}
+
+    app = current_app._get_current_object()
+    parts = urlsplit(path)
+    try:
+        with app.test_request_context(
+            parts.path,
+            method='GET',
+            query_string=parts.query,
+            headers={'Accept': 'application/json'}
+        ):
+            response = app.full_dispatch_request()
+    except Exception as e:
+        logger.error(f"Batch sub-request {path} failed: {e}")
+        return {'path': path, 'status': 500, 'body': {'error': str(e)}}
+
+    if response.is_json:
+        body = response.get_json(silent=True)
+    else:
+        body = None
+    return {'path': path, 'status': response.status_code, 'body': body}
+
+
+def run_batch(paths):
+    """
+    Dispatch the paths in order on one shared connection.
+    Returns a list of {'path', 'status', 'body'} in request order; a failing
+    item only affects its own entry.
+    """
+    responses = []
+    with mssql_db.shared_connection():
+        for path in paths:
+            started = time.time()
+            entry = _dispatch(path)
+            entry['duration_ms'] = round((time.time() - started) * 1000, 1)
+            responses.append(entry)
+    return responses
@@ -0,0 +1,414 @@
+"""
+Bulk container creation for SQL Server.
+
+Creating N containers of one type used to be N round-trips: a DefaultCapacity
+lookup and a single-row INSERT ... OUTPUT per container. Here the whole set is
+one batch on the caller's transaction cursor:
+
+    capacity lookup (once) -> INSERT ... OUTPUT for all containers
+                           -> history -> containersample links
+
+Barcodes come from the container block allocator before the batch runs, and
+the containers and their contents go in as JSON parameters, so the batch size
+does not depend on the number of containers.
+
+Packing an existing container works the same way: bulk_add_to_container and
+bulk_remove_from_container resolve every StorageID in one pass, check the
+capacity once for the total and write the containersample and history rows
+as sets.
+"""
+import json
+
+from app.utils.sequences import next_container_barcodes
+
+MAX_BULK_CONTAINERS = 500
+
+DEFAULT_CONTAINER_CAPACITY = 50
+
+
+class ContainerBatchError(ValueError):
+    """The batch was rejected - errors is a list of {'index', 'sample_id', 'error'}"""
+
+    def __init__(self, message, errors=None):
+        self.errors = errors or []
+        super().__init__(message)
+
+
+class ContainerCapacityError(ContainerBatchError):
+    """The samples do not fit in the container together"""
+
+    def __init__(self, message, capacity, current_amount, requested):
+        self.capacity = capacity
+        self.current_amount = current_amount
+        self.requested = requested
+        super().__init__(message)
+
+    def as_dict(self):
+        return {
+            'capacity_exceeded': True,
+            'capacity': self.capacity,
+            'current_amount': self.current_amount,
+            'new_amount': self.current_amount + self.requested
+        }
+
+
+def parse_container_count(value):
+    try:
+        count = int(value if value not in (None, '') else 1)
+    except (ValueError, TypeError):
+        raise ContainerBatchError('count must be a number')
+    if count < 1 or count > MAX_BULK_CONTAINERS:
+        raise ContainerBatchError(f'count must be between 1 and {MAX_BULK_CONTAINERS}')
+    return count
+
+
+def parse_container_contents(values, count):
+    """
+    Samples to put in the new containers: [{sampleId, amount, containerIndex}].
+    containerIndex (0-based) defaults to 0. Returns [(index, sample_id, amount)].
+    """
+    if not values:
+        return []
+    if not isinstance(values, list):
+        raise ContainerBatchError('samples must be a list')
+    contents = []
+    for entry in values:
+        if not isinstance(entry, dict):
+            raise ContainerBatchError('Each sample must be an object with sampleId and amount')
+        try:
+            sample_id = int(str(entry.get('sampleId')).upper().replace('SMP-', ''))
+            amount = int(entry.get('amount', 1))
+            index = int(entry.get('containerIndex', 0))
+        except (ValueError, TypeError):
+            raise ContainerBatchError(f"Invalid sample entry: {entry}")
+        if amount <= 0:
+            raise ContainerBatchError(f'Amount for sample SMP-{sample_id} must be greater than 0')
+        if index < 0 or index >= count:
+            raise ContainerBatchError(f'containerIndex {index} is outside the {count} new containers')
+        contents.append((index, sample_id, amount))
+    return contents
+
+
+_CREATE_BATCH = """
+    SET NOCOUNT ON;
+    DECLARE @containers NVARCHAR(MAX) = ?, @contents NVARCHAR(MAX) = ?;
+    DECLARE @type_id INT = ?, @capacity INT = ?, @force BIT = ?, @user_id INT = ?;
+    DECLARE @new TABLE ([ContainerID] INT PRIMARY KEY, [Barcode] NVARCHAR(100));
+    DECLARE @links TABLE ([RowIndex] INT PRIMARY KEY, [Seq] INT, [SampleID] INT, [StorageID] INT NULL, [Amount] INT);
+    DECLARE @errors TABLE ([RowIndex] INT NULL, [SampleID] INT NULL, [Error] NVARCHAR(400));
+
+    -- One capacity lookup for every container in the batch
+    IF @capacity IS NULL
+        SELECT @capacity = [DefaultCapacity] FROM [containertype] WHERE [ContainerTypeID] = @type_id;
+    SET @capacity = ISNULL(@capacity, {default_capacity});
+
+    INSERT INTO @links ([RowIndex], [Seq], [SampleID], [StorageID], [Amount])
+    SELECT src.[RowIndex], src.[Seq], src.[SampleID], st.[StorageID], src.[Amount]
+    FROM OPENJSON(@contents) WITH ([RowIndex] INT, [Seq] INT, [SampleID] INT, [Amount] INT) src
+    OUTER APPLY (
+        SELECT TOP 1 [StorageID] FROM [samplestorage]
+        WHERE [SampleID] = src.[SampleID]
+        ORDER BY [StorageID]
+    ) st;
+
+    INSERT INTO @errors ([RowIndex], [SampleID], [Error])
+    SELECT [RowIndex], [SampleID], N'Sample has no storage record'
+    FROM @links WHERE [StorageID] IS NULL;
+
+    IF @force = 0 AND @capacity > 0
+        INSERT INTO @errors ([RowIndex], [SampleID], [Error])
+        SELECT NULL, NULL, CONCAT(N'Container ', [Seq] + 1, N' would hold ', SUM([Amount]),
+                                  N' units, capacity is ', @capacity)
+        FROM @links
+        GROUP BY [Seq]
+        HAVING SUM([Amount]) > @capacity;
+
+    IF NOT EXISTS (SELECT 1 FROM @errors)
+    BEGIN
+        -- CurrentAmount starts at what the batch puts in each container
+        INSERT INTO [container] ([Barcode], [Description], [ContainerTypeID], [IsMixed],
+                                 [ContainerCapacity], [LocationID], [ContainerStatus], [CurrentAmount])
+        OUTPUT INSERTED.[ContainerID], INSERTED.[Barcode] INTO @new
+        SELECT src.[Barcode], src.[Description], @type_id, src.[IsMixed], @capacity, src.[LocationID], 'Active',
+               ISNULL(l.[Total], 0)
+        FROM OPENJSON(@containers) WITH (
+            [Seq] INT, [Barcode] NVARCHAR(100), [Description] NVARCHAR(500), [IsMixed] BIT, [LocationID] INT
+        ) src
+        LEFT JOIN (SELECT [Seq], SUM([Amount]) AS [Total] FROM @links GROUP BY [Seq]) l ON l.[Seq] = src.[Seq];
+
+        INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [Notes])
+        SELECT GETDATE(), 'Container created', @user_id,
+               CONCAT(N'Container ''', src.[Description], N''' created with ID ', n.[ContainerID])
+        FROM @new n
+        JOIN OPENJSON(@containers) WITH ([Barcode] NVARCHAR(100), [Description] NVARCHAR(500)) src
+            ON src.[Barcode] = n.[Barcode];
+
+        INSERT INTO [containersample] ([ContainerID], [SampleStorageID], [Amount])
+        SELECT n.[ContainerID], l.[StorageID], l.[Amount]
+        FROM @links l
+        JOIN OPENJSON(@containers) WITH ([Seq] INT, [Barcode] NVARCHAR(100)) src ON src.[Seq] = l.[Seq]
+        JOIN @new n ON n.[Barcode] = src.[Barcode];
+    END
+
+    SELECT [RowIndex], [SampleID], [Error] FROM @errors;
+    SELECT src.[Seq], n.[ContainerID], n.[Barcode], @capacity
+    FROM @new n
+    JOIN OPENJSON(@containers) WITH ([Seq] INT, [Barcode] NVARCHAR(100)) src ON src.[Barcode] = n.[Barcode]
+    ORDER BY src.[Seq];
+""".replace('{default_capacity}', str(DEFAULT_CONTAINER_CAPACITY))
+
+
+def create_containers(cursor, count, description, container_type_id, user_id, location_id=None,
+                      is_mixed=False, capacity=None, contents=None, force=False):
+    """
+    Create count containers of one type in one batch and link contents to them.
+    contents is [(container_index, sample_id, amount)] as from parse_container_contents.
+    Returns [{'container_id', 'barcode', 'capacity'}] in creation order.
+    Raises ContainerBatchError (nothing written) if a sample has no storage
+    record or a container would exceed its capacity without force.
+    """
+    barcodes = next_container_barcodes(count)
+    container_rows = [{
+        'Seq': seq,
+        'Barcode': barcode,
+        'Description': description,
+        'IsMixed': 1 if is_mixed else 0,
+        'LocationID': location_id
+    } for seq, barcode in enumerate(barcodes)]
+    content_rows = [
+        {'RowIndex': row_index, 'Seq': index, 'SampleID': sample_id, 'Amount': amount}
+        for row_index, (index, sample_id, amount) in enumerate(contents or [])
+    ]
+
+    cursor.execute(_CREATE_BATCH, (
+        json.dumps(container_rows),
+        json.dumps(content_rows),
+        container_type_id,
+        int(capacity) if capacity not in (None, '', 0) else None,
+        1 if force else 0,
+        user_id
+    ))
+    errors = [{'index': row[0], 'sample_id': row[1], 'error': row[2]} for row in cursor.fetchall()]
+    cursor.nextset()
+    created = [{'container_id': row[1], 'barcode': row[2], 'capacity': row[3]} for row in cursor.fetchall()]
+    if errors:
+        raise ContainerBatchError(errors[0]['error'], errors)
+    if len(created) != count:
+        raise Exception('Failed to create containers')
+    return created
+
+
+def parse_container_items(values):
+    """
+    Samples for a bulk add/remove: [{sampleId, amount}]. A missing amount
+    means 1 for adds and everything held for removes. Returns [(sample_id, amount or None)].
+    """
+    if not isinstance(values, list) or not values:
+        raise ContainerBatchError('samples must be a non-empty list')
+    if len(values) > MAX_BULK_CONTAINERS:
+        raise ContainerBatchError(f'At most {MAX_BULK_CONTAINERS} samples can be processed at once')
+    items = []
+    seen = set()
+    for entry in values:
+        if not isinstance(entry, dict):
+            raise ContainerBatchError('Each sample must be an object with sampleId and amount')
+        try:
+            sample_id = int(str(entry.get('sampleId')).upper().replace('SMP-', ''))
+            amount = entry.get('amount')
+            amount = int(amount) if amount not in (None, '', 'all') else None
+        except (ValueError, TypeError):
+            raise ContainerBatchError(f"Invalid sample entry: {entry}")
+        if amount is not None and amount <= 0:
+            raise ContainerBatchError(f'Amount for sample SMP-{sample_id} must be greater than 0')
+        if sample_id in seen:
+            raise ContainerBatchError(f'Sample SMP-{sample_id} is listed more than once')
+        seen.add(sample_id)
+        items.append((sample_id, amount))
+    return items
+
+
+def _items_param(items, default_amount=None):
+    return json.dumps([
+        {'RowIndex': index, 'SampleID': sample_id, 'Amount': amount if amount is not None else default_amount}
+        for index, (sample_id, amount) in enumerate(items)
+    ])
+
+
+_BULK_ADD_BATCH = """
+    SET NOCOUNT ON;
+    DECLARE @container_id INT = ?, @items NVARCHAR(MAX) = ?, @force BIT = ?, @user_id INT = ?;
+    DECLARE @requested TABLE ([RowIndex] INT PRIMARY KEY, [SampleID] INT, [Amount] INT,
+                              [Found] BIT, [Status] NVARCHAR(50), [StorageID] INT NULL);
+    DECLARE @total INT, @reserved BIT = 0;
+
+    -- StorageIDs for every sample in one pass
+    INSERT INTO @requested ([RowIndex], [SampleID], [Amount], [Found], [Status], [StorageID])
+    SELECT src.[RowIndex], src.[SampleID], src.[Amount],
+           CASE WHEN s.[SampleID] IS NULL THEN 0 ELSE 1 END, s.[Status], st.[StorageID]
+    FROM OPENJSON(@items) WITH ([RowIndex] INT, [SampleID] INT, [Amount] INT) src
+    LEFT JOIN [sample] s ON s.[SampleID] = src.[SampleID]
+    OUTER APPLY (
+        SELECT TOP 1 [StorageID] FROM [samplestorage]
+        WHERE [SampleID] = src.[SampleID]
+        ORDER BY [StorageID]
+    ) st;
+
+    SELECT @total = ISNULL(SUM([Amount]), 0)
+    FROM @requested
+    WHERE [StorageID] IS NOT NULL AND ISNULL([Status], '') <> 'Disposed';
+
+    -- One guarded capacity check for the whole set (see container_fill)
+    IF @total > 0
+    BEGIN
+        UPDATE [container]
+        SET [CurrentAmount] = [CurrentAmount] + @total
+        WHERE [ContainerID] = @container_id
+          AND (@force = 1 OR ISNULL([ContainerCapacity], 0) = 0 OR [CurrentAmount] + @total <= [ContainerCapacity]);
+        IF @@ROWCOUNT > 0 SET @reserved = 1;
+    END
+
+    IF @reserved = 1
+    BEGIN
+        INSERT INTO [containersample] ([ContainerID], [SampleStorageID], [Amount])
+        SELECT @container_id, [StorageID], [Amount]
+        FROM @requested
+        WHERE [StorageID] IS NOT NULL AND ISNULL([Status], '') <> 'Disposed';
+
+        INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [Notes])
+        SELECT GETDATE(), 'Sample added to container', @user_id, [SampleID],
+               CONCAT(N'Sample ', [SampleID], N' added to container ', @container_id, N' with amount ', [Amount])
+        FROM @requested
+        WHERE [StorageID] IS NOT NULL AND ISNULL([Status], '') <> 'Disposed';
+    END
+
+    SELECT [ContainerCapacity], [CurrentAmount], @total, @reserved FROM [container] WHERE [ContainerID] = @container_id;
+    SELECT [RowIndex], [SampleID], [Amount], [Found], [Status], [StorageID] FROM @requested ORDER BY [RowIndex];
+"""
+
+
+def bulk_add_to_container(cursor, container_id, items, user_id, force=False):
+    """
+    Add many samples to one container in one batch. items is [(sample_id, amount or None)].
+    Samples that are missing, disposed or have no storage record are reported
+    and skipped; the rest are added together only if their total fits.
+    Returns (added, failures) in request order.
+    """
+    cursor.execute(_BULK_ADD_BATCH, (container_id, _items_param(items, 1), 1 if force else 0, user_id))
+    container_row = cursor.fetchone()
+    if not container_row:
+        raise ContainerBatchError(f'Container {container_id} not found')
+    capacity, current_amount, total, reserved = container_row
+    cursor.nextset()
+    rows = cursor.fetchall()
+
+    if total and not reserved:
+        raise ContainerCapacityError(
+            f'Cannot add {total} units to container. Current: {current_amount}, '
+            f'Capacity: {capacity}, Available: {capacity - current_amount}',
+            capacity, current_amount, total
+        )
+
+    added = []
+    failures = []
+    for _, sample_id, amount, found, status, storage_id in rows:
+        if not found:
+            failures.append({'sample_id': sample_id, 'error': f'Sample with ID {sample_id} not found'})
+        elif status == 'Disposed':
+            failures.append({'sample_id': sample_id, 'error': 'Cannot add a disposed sample'})
+        elif storage_id is None:
+            failures.append({'sample_id': sample_id, 'error': 'Sample storage not found'})
+        else:
+            added.append({'sample_id': sample_id, 'amount': amount})
+    return added, failures
+
+
+_BULK_REMOVE_BATCH = """
+    SET NOCOUNT ON;
+    DECLARE @container_id INT = ?, @items NVARCHAR(MAX) = ?, @user_id INT = ?;
+    DECLARE @requested TABLE ([RowIndex] INT PRIMARY KEY, [SampleID] INT, [Amount] INT NULL, [Held] INT);
+    DECLARE @changed TABLE ([SampleID] INT, [Amount] INT, [ContainerSampleID] INT NULL, [Remaining] INT NULL);
+
+    INSERT INTO @requested ([RowIndex], [SampleID], [Amount], [Held])
+    SELECT src.[RowIndex], src.[SampleID], src.[Amount], ISNULL(h.[Held], 0)
+    FROM OPENJSON(@items) WITH ([RowIndex] INT, [SampleID] INT, [Amount] INT) src
+    OUTER APPLY (
+        SELECT SUM(cs.[Amount]) AS [Held]
+        FROM [containersample] cs
+        JOIN [samplestorage] ss ON ss.[StorageID] = cs.[SampleStorageID]
+        WHERE cs.[ContainerID] = @container_id AND ss.[SampleID] = src.[SampleID]
+    ) h;
+
+    -- Everything held (or no amount given): drop the links
+    DELETE cs
+    OUTPUT r.[SampleID], DELETED.[Amount], NULL, NULL INTO @changed
+    FROM [containersample] cs
+    JOIN [samplestorage] ss ON ss.[StorageID] = cs.[SampleStorageID]
+    JOIN @requested r ON r.[SampleID] = ss.[SampleID]
+    WHERE cs.[ContainerID] = @container_id AND r.[Held] > 0
+      AND (r.[Amount] IS NULL OR r.[Amount] >= r.[Held]);
+
+    -- Part of it: reduce the first link that holds enough
+    UPDATE cs
+    SET cs.[Amount] = cs.[Amount] - r.[Amount]
+    OUTPUT r.[SampleID], r.[Amount], INSERTED.[ContainerSampleID], INSERTED.[Amount] INTO @changed
+    FROM [containersample] cs
+    JOIN @requested r ON cs.[ContainerSampleID] = (
+        SELECT TOP 1 c2.[ContainerSampleID]
+        FROM [containersample] c2
+        JOIN [samplestorage] ss ON ss.[StorageID] = c2.[SampleStorageID]
+        WHERE c2.[ContainerID] = @container_id AND ss.[SampleID] = r.[SampleID] AND c2.[Amount] >= r.[Amount]
+        ORDER BY c2.[ContainerSampleID]
+    )
+    WHERE r.[Amount] IS NOT NULL AND r.[Amount] < r.[Held];
+
+    -- A link reduced to nothing is removed rather than left at zero
+    DELETE cs
+    FROM [containersample] cs
+    JOIN @changed ch ON ch.[ContainerSampleID] = cs.[ContainerSampleID]
+    WHERE ch.[Remaining] = 0;
+
+    UPDATE [container]
+    SET [CurrentAmount] = CASE WHEN [CurrentAmount] > t.[Total] THEN [CurrentAmount] - t.[Total] ELSE 0 END
+    FROM [container]
+    CROSS JOIN (SELECT SUM([Amount]) AS [Total] FROM @changed) t
+    WHERE [ContainerID] = @container_id AND t.[Total] IS NOT NULL;
+
+    INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [Notes])
+    SELECT GETDATE(), 'Sample removed from container', @user_id, [SampleID],
+           CONCAT(N'Sample ', [SampleID], N' removed from container ', @container_id, N' with amount ', SUM([Amount]))
+    FROM @changed
+    GROUP BY [SampleID];
+
+    SELECT COUNT(*) FROM [container] WHERE [ContainerID] = @container_id;
+    SELECT r.[RowIndex], r.[SampleID], r.[Amount], r.[Held], c.[Removed]
+    FROM @requested r
+    LEFT JOIN (SELECT [SampleID], SUM([Amount]) AS [Removed] FROM @changed GROUP BY [SampleID]) c
+        ON c.[SampleID] = r.[SampleID]
+    ORDER BY r.[RowIndex];
+"""
+
+
+def bulk_remove_from_container(cursor, container_id, items, user_id):
+    """
+    Take many samples (or part of their amounts) out of one container in one batch.
+    items is [(sample_id, amount or None)]; None removes everything the sample holds.
+    Returns (removed, failures) in request order.
+    """
+    cursor.execute(_BULK_REMOVE_BATCH, (container_id, _items_param(items), user_id))
+    if not cursor.fetchone()[0]:
+        raise ContainerBatchError(f'Container {container_id} not found')
+    cursor.nextset()
+
+    removed = []
+    failures = []
+    for _, sample_id, amount, held, removed_amount in cursor.fetchall():
+        if removed_amount:
+            removed.append({'sample_id': sample_id, 'amount': removed_amount})
+        elif not held:
+            failures.append({'sample_id': sample_id, 'error': f'Sample {sample_id} is not in container {container_id}'})
+        else:
+            failures.append({
+                'sample_id': sample_id,
+                'error': f'Amount {amount} is spread over several entries; remove all {held} instead'
+            })
+    return removed, failures
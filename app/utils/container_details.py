@@ -0,0 +1,234 @@
+"""
+Cached container details for the details modal (SQL Server).
+
+The container, its type and location path, the member samples with their
+serial numbers and the recent history are read in one batch (one result set
+each) and kept per container. Routes that change a container or its
+containersample rows call invalidate_container_details(container_id), or
+clear_container_details() when a change may touch any container; the next
+read reloads it. Entries also expire after CONTAINER_DETAILS_TTL seconds as
+a safety net for edits to member samples and writes made by other processes.
+
+Callers pick the sections they need with include (see DETAIL_SECTIONS);
+the cached document always holds all of them.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.mssql_db import mssql_db, fetch_result_sets
+
+CONTAINER_DETAILS_TTL = int(os.getenv('CONTAINER_DETAILS_TTL', '60'))
+CONTAINER_DETAILS_MAX_ENTRIES = 500
+CONTAINER_HISTORY_LIMIT = 20
+
+LOCATION = 'location'
+SAMPLES = 'samples'
+SERIALS = 'serials'
+HISTORY = 'history'
+
+# serials adds SerialNumbers to each sample and implies samples
+DETAIL_SECTIONS = (LOCATION, SAMPLES, SERIALS, HISTORY)
+
+_DETAILS_BATCH = f"""
+    SET NOCOUNT ON;
+    DECLARE @container_id INT = ?;
+    -- History has no container key; match "Container <id>" with the id ending there
+    DECLARE @history_note NVARCHAR(40) = N'%Container ' + CAST(@container_id AS NVARCHAR(20));
+
+    SELECT
+        c.[ContainerID], c.[Description], c.[ContainerTypeID], c.[IsMixed], c.[ContainerCapacity],
+        ct.[TypeName], ISNULL(c.[ContainerStatus], 'Active'), c.[LocationID], c.[Barcode], c.[CurrentAmount],
+        sl.[LocationName], sl.[Rack], sl.[Section], sl.[Shelf], lb.[LabName]
+    FROM [container] c
+    LEFT JOIN [containertype] ct ON c.[ContainerTypeID] = ct.[ContainerTypeID]
+    LEFT JOIN [storagelocation] sl ON c.[LocationID] = sl.[LocationID]
+    LEFT JOIN [lab] lb ON sl.[LabID] = lb.[LabID]
+    WHERE c.[ContainerID] = @container_id;
+
+    SELECT
+        s.[SampleID], s.[Description], s.[PartNumber], cs.[Amount],
+        CASE
+            WHEN u.[UnitName] IS NULL THEN 'pcs'
+            WHEN LOWER(u.[UnitName]) = 'stk' THEN 'pcs'
+            ELSE u.[UnitName]
+        END,
+        sl.[LocationName], ss.[ExpireDate], FORMAT(r.[ReceivedDate], 'dd-MM-yyyy'), ss.[StorageID]
+    FROM [containersample] cs
+    JOIN [samplestorage] ss ON cs.[SampleStorageID] = ss.[StorageID]
+    JOIN [sample] s ON ss.[SampleID] = s.[SampleID]
+    LEFT JOIN [storagelocation] sl ON ss.[LocationID] = sl.[LocationID]
+    LEFT JOIN [reception] r ON s.[ReceptionID] = r.[ReceptionID]
+    LEFT JOIN [unit] u ON s.[UnitID] = u.[UnitID]
+    WHERE cs.[ContainerID] = @container_id
+    ORDER BY s.[SampleID];
+
+    SELECT sn.[SampleID], sn.[SerialNumber]
+    FROM [sampleserialnumber] sn
+    WHERE sn.[IsActive] = 1
+      AND sn.[SampleID] IN (
+          SELECT ss.[SampleID]
+          FROM [containersample] cs
+          JOIN [samplestorage] ss ON cs.[SampleStorageID] = ss.[StorageID]
+          WHERE cs.[ContainerID] = @container_id
+      )
+    ORDER BY sn.[SampleID], sn.[SerialNumber];
+
+    SELECT TOP {CONTAINER_HISTORY_LIMIT}
+        FORMAT(h.[Timestamp], 'dd-MM-yyyy HH:mm'), h.[ActionType], h.[Notes], u.[Name]
+    FROM [history] h
+    LEFT JOIN [user] u ON h.[UserID] = u.[UserID]
+    WHERE h.[Notes] LIKE @history_note + N'[ ,:;.)]%' OR h.[Notes] LIKE @history_note
+    ORDER BY h.[Timestamp] DESC;
+"""
+
+_lock = threading.Lock()
+_generation = 0
+_versions = {}
+# container_id -> (generation, version, loaded_at, document), oldest first
+_entries = OrderedDict()
+
+
+def parse_include(value):
+    """Sections requested by ?include=a,b (all of them when empty)"""
+    if not value:
+        return set(DETAIL_SECTIONS)
+    include = {part.strip().lower() for part in value.split(',') if part.strip()}
+    unknown = include - set(DETAIL_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown include section(s): {', '.join(sorted(unknown))}. "
+                         f"Valid: {', '.join(DETAIL_SECTIONS)}")
+    if SERIALS in include:
+        include.add(SAMPLES)
+    return include
+
+
+def invalidate_container_details(*container_ids):
+    """Drop cached details for these containers; the next read reloads them"""
+    with _lock:
+        for container_id in container_ids:
+            if container_id is None:
+                continue
+            container_id = int(container_id)
+            _versions[container_id] = _versions.get(container_id, 0) + 1
+            _entries.pop(container_id, None)
+
+
+def clear_container_details():
+    """Drop every cached container (for changes that may touch any of them)"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _entries.clear()
+
+
+def _load(container_id):
+    with mssql_db.get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(_DETAILS_BATCH, (container_id,))
+            container_rows, sample_rows, serial_rows, history_rows = fetch_result_sets(cursor, 4)
+        finally:
+            cursor.close()
+
+    if not container_rows:
+        return None
+    row = container_rows[0]
+
+    serials = {}
+    for sample_id, serial_number in serial_rows:
+        serials.setdefault(sample_id, []).append(serial_number)
+
+    location = None
+    if row[7] is not None:
+        path = [part for part in (row[14], row[10]) if part]
+        location = {
+            'LocationID': row[7],
+            'LocationName': row[10],
+            'Rack': row[11],
+            'Section': row[12],
+            'Shelf': row[13],
+            'LabName': row[14],
+            'Path': ' / '.join(path)
+        }
+
+    return {
+        'container': {
+            'ContainerID': row[0],
+            'Description': row[1],
+            'ContainerTypeID': row[2],
+            'IsMixed': row[3],
+            'ContainerCapacity': row[4],
+            'TypeName': row[5],
+            'Status': row[6],
+            'LocationID': row[7],
+            'Barcode': row[8],
+            'CurrentAmount': row[9],
+            'LocationName': row[10]
+        },
+        'location': location,
+        'samples': [{
+            'SampleID': r[0],
+            'Description': r[1],
+            'PartNumber': r[2],
+            'Amount': r[3],
+            'Unit': r[4],
+            'LocationName': r[5],
+            'ExpireDate': r[6],
+            'RegisteredDate': r[7],
+            'SampleStorageID': r[8],
+            'SerialNumbers': serials.get(r[0], [])
+        } for r in sample_rows],
+        'history': [{
+            'Timestamp': r[0],
+            'ActionType': r[1],
+            'Notes': r[2],
+            'UserName': r[3]
+        } for r in history_rows]
+    }
+
+
+def _project(document, include):
+    result = {'container': copy.deepcopy(document['container'])}
+    if LOCATION in include:
+        result['location'] = copy.deepcopy(document['location'])
+    if SAMPLES in include:
+        samples = copy.deepcopy(document['samples'])
+        if SERIALS not in include:
+            for sample in samples:
+                sample.pop('SerialNumbers', None)
+        result['samples'] = samples
+    if HISTORY in include:
+        result['history'] = copy.deepcopy(document['history'])
+    return result
+
+
+def get_container_details(container_id, include=None):
+    """
+    Details for one container restricted to the include sections, or None if
+    it does not exist. Returns {'container', ['location'], ['samples'], ['history']}.
+    """
+    include = set(DETAIL_SECTIONS) if include is None else include
+    with _lock:
+        generation = _generation
+        version = _versions.get(container_id, 0)
+        entry = _entries.get(container_id)
+        if entry and entry[0] == generation and entry[1] == version \
+                and time.time() - entry[2] < CONTAINER_DETAILS_TTL:
+            _entries.move_to_end(container_id)
+            return _project(entry[3], include)
+
+    document = _load(container_id)
+    if document is None:
+        return None
+
+    with _lock:
+        # Skip if the container was invalidated while we were loading
+        if _generation == generation and _versions.get(container_id, 0) == version:
+            _entries[container_id] = (generation, version, time.time(), document)
+            _entries.move_to_end(container_id)
+            while len(_entries) > CONTAINER_DETAILS_MAX_ENTRIES:
+                _entries.popitem(last=False)
+    return _project(document, include)
@@ -0,0 +1,248 @@
+"""
+Maintained fill levels for containers ([container].[CurrentAmount]).
+
+Capacity checks used to sum containersample.Amount for the container, compare
+the total in Python and insert afterwards, so two technicians filling the
+same box at once could both pass the check. The running total now lives on
+the container row and every add goes through one guarded statement:
+
+    UPDATE container SET CurrentAmount = CurrentAmount + @amount
+    WHERE ContainerID = @id AND CurrentAmount + @amount <= ContainerCapacity
+
+The database re-checks the predicate on the row it updates, so the check is
+O(1) and atomic; no updated row means the amount does not fit. Removals
+subtract from the same column. Anything that changes containersample
+without going through these helpers makes CurrentAmount drift - run
+reconcile_container_amounts (or reconcile_containers_mssql.py) to repair it.
+
+SQL Server helpers take a pyodbc cursor; the mysql_* variants take a MySQLdb
+cursor. Both expect to run inside the caller's transaction. The column is
+added (and backfilled) at startup by ensure_current_amount /
+mysql_ensure_current_amount, so no manual migration is needed.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+_ENSURE_CURRENT_AMOUNT = """
+    SET NOCOUNT ON;
+    DECLARE @added BIT = 0;
+    IF COL_LENGTH('dbo.container', 'CurrentAmount') IS NULL
+    BEGIN
+        BEGIN TRY
+            ALTER TABLE [dbo].[container]
+                ADD [CurrentAmount] INT NOT NULL CONSTRAINT [DF_container_CurrentAmount] DEFAULT 0;
+            SET @added = 1;
+        END TRY
+        BEGIN CATCH
+            -- Another process added it first
+            IF COL_LENGTH('dbo.container', 'CurrentAmount') IS NULL THROW;
+        END CATCH
+    END
+    IF @added = 1
+        -- Dynamic SQL: the column did not exist when this batch was compiled
+        EXEC(N'
+            UPDATE c
+            SET c.[CurrentAmount] = ISNULL(t.[Total], 0)
+            FROM [dbo].[container] c
+            LEFT JOIN (
+                SELECT [ContainerID], SUM([Amount]) AS [Total]
+                FROM [dbo].[containersample]
+                GROUP BY [ContainerID]
+            ) t ON t.[ContainerID] = c.[ContainerID]
+            WHERE c.[CurrentAmount] <> ISNULL(t.[Total], 0);
+        ');
+    SELECT @added;
+"""
+
+
+def ensure_current_amount(cursor):
+    """
+    Add container.CurrentAmount (backfilled from containersample) if it is
+    missing - the same step as migration/mssql_indexes.sql, run at startup so
+    registrations and container routes never depend on the manual migration.
+    Returns True if the column was added.
+    """
+    cursor.execute(_ENSURE_CURRENT_AMOUNT)
+    return bool(cursor.fetchone()[0])
+
+
+def reserve_capacity(cursor, container_id, amount, force=False):
+    """Add amount to the container's CurrentAmount if it fits; returns True if reserved"""
+    # OUTPUT instead of cursor.rowcount: after any SET NOCOUNT ON batch on the
+    # same session pyodbc reports -1 for every statement
+    cursor.execute("""
+        UPDATE [container]
+        SET [CurrentAmount] = [CurrentAmount] + ?
+        OUTPUT INSERTED.[ContainerID]
+        WHERE [ContainerID] = ?
+          AND (? = 1 OR ISNULL([ContainerCapacity], 0) = 0 OR [CurrentAmount] + ? <= [ContainerCapacity])
+    """, (amount, container_id, 1 if force else 0, amount))
+    return cursor.fetchone() is not None
+
+
+def container_fill(cursor, container_id):
+    """(capacity, current_amount) for a container, or None if it does not exist"""
+    cursor.execute("""
+        SELECT [ContainerCapacity], [CurrentAmount] FROM [container] WHERE [ContainerID] = ?
+    """, (container_id,))
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else None
+
+
+_REMOVE_SAMPLE_FROM_CONTAINERS = """
+    SET NOCOUNT ON;
+    DECLARE @sample_id INT = ?, @container_id INT = ?;
+    DECLARE @removed TABLE ([ContainerID] INT, [Amount] INT);
+
+    DELETE cs
+    OUTPUT DELETED.[ContainerID], DELETED.[Amount] INTO @removed
+    FROM [containersample] cs
+    JOIN [samplestorage] ss ON ss.[StorageID] = cs.[SampleStorageID]
+    WHERE ss.[SampleID] = @sample_id
+      AND (@container_id IS NULL OR cs.[ContainerID] = @container_id);
+
+    UPDATE c
+    SET c.[CurrentAmount] = CASE WHEN c.[CurrentAmount] > r.[Amount] THEN c.[CurrentAmount] - r.[Amount] ELSE 0 END
+    FROM [container] c
+    JOIN (SELECT [ContainerID], SUM([Amount]) AS [Amount] FROM @removed GROUP BY [ContainerID]) r
+        ON r.[ContainerID] = c.[ContainerID];
+
+    SELECT COUNT(*) FROM @removed;
+"""
+
+
+def remove_sample_from_containers(cursor, sample_id, container_id=None):
+    """
+    Unlink a sample from one container (or all of them) and release the
+    amounts it held. Returns the number of containersample rows removed.
+    """
+    cursor.execute(_REMOVE_SAMPLE_FROM_CONTAINERS, (sample_id, container_id))
+    return cursor.fetchone()[0]
+
+
+_RECONCILE = """
+    SET NOCOUNT ON;
+    DECLARE @fix BIT = ?;
+    DECLARE @drift TABLE ([ContainerID] INT PRIMARY KEY, [Recorded] INT, [Actual] INT);
+
+    INSERT INTO @drift ([ContainerID], [Recorded], [Actual])
+    SELECT c.[ContainerID], c.[CurrentAmount], ISNULL(t.[Total], 0)
+    FROM [container] c
+    LEFT JOIN (
+        SELECT [ContainerID], SUM([Amount]) AS [Total] FROM [containersample] GROUP BY [ContainerID]
+    ) t ON t.[ContainerID] = c.[ContainerID]
+    WHERE c.[CurrentAmount] <> ISNULL(t.[Total], 0);
+
+    IF @fix = 1
+        UPDATE c
+        SET c.[CurrentAmount] = d.[Actual]
+        FROM [container] c
+        JOIN @drift d ON d.[ContainerID] = c.[ContainerID];
+
+    SELECT [ContainerID], [Recorded], [Actual] FROM @drift ORDER BY [ContainerID];
+"""
+
+
+def reconcile_container_amounts(cursor, fix=True):
+    """
+    Compare CurrentAmount with the containersample totals and (with fix)
+    correct containers that drifted. Returns [{'container_id', 'recorded', 'actual'}].
+    """
+    cursor.execute(_RECONCILE, (1 if fix else 0,))
+    drift = [{'container_id': row[0], 'recorded': row[1], 'actual': row[2]} for row in cursor.fetchall()]
+    if drift:
+        logger.warning(f"{len(drift)} containers had a CurrentAmount that did not match their contents"
+                       f"{' - corrected' if fix else ''}")
+    return drift
+
+
+# MySQL
+
+_mysql_column_ready = False
+
+
+def mysql_ensure_current_amount(cursor):
+    """
+    Add container.CurrentAmount (backfilled from containersample) if it is
+    missing. Checked once per process; call it before the transaction writes
+    anything, since ALTER TABLE commits implicitly in MySQL.
+    """
+    global _mysql_column_ready
+    if _mysql_column_ready:
+        return False
+    cursor.execute("SHOW COLUMNS FROM container LIKE 'CurrentAmount'")
+    added = cursor.fetchone() is None
+    if added:
+        cursor.execute("ALTER TABLE container ADD COLUMN CurrentAmount INT NOT NULL DEFAULT 0")
+        mysql_reconcile_container_amounts(cursor)
+    _mysql_column_ready = True
+    return added
+
+
+def mysql_reserve_capacity(cursor, container_id, amount, force=False):
+    """MySQL variant of reserve_capacity"""
+    cursor.execute("""
+        UPDATE container
+        SET CurrentAmount = CurrentAmount + %s
+        WHERE ContainerID = %s
+          AND (%s = 1 OR IFNULL(ContainerCapacity, 0) = 0 OR CurrentAmount + %s <= ContainerCapacity)
+    """, (amount, container_id, 1 if force else 0, amount))
+    return cursor.rowcount > 0
+
+
+def mysql_release_capacity(cursor, container_id, amount):
+    """Subtract amount from the container's CurrentAmount (never below zero)"""
+    cursor.execute("""
+        UPDATE container
+        SET CurrentAmount = GREATEST(CurrentAmount - %s, 0)
+        WHERE ContainerID = %s
+    """, (amount, container_id))
+
+
+def mysql_remove_storage_from_containers(cursor, storage_id, container_id=None):
+    """Unlink a storage row from one container (or all) and release the amounts it held"""
+    if container_id is None:
+        cursor.execute("""
+            SELECT ContainerID, SUM(Amount) FROM containersample
+            WHERE SampleStorageID = %s GROUP BY ContainerID
+        """, (storage_id,))
+    else:
+        cursor.execute("""
+            SELECT ContainerID, SUM(Amount) FROM containersample
+            WHERE SampleStorageID = %s AND ContainerID = %s GROUP BY ContainerID
+        """, (storage_id, container_id))
+    held = cursor.fetchall()
+    for held_container_id, amount in held:
+        cursor.execute("""
+            DELETE FROM containersample WHERE SampleStorageID = %s AND ContainerID = %s
+        """, (storage_id, held_container_id))
+        mysql_release_capacity(cursor, held_container_id, amount or 0)
+    return len(held)
+
+
+def mysql_reconcile_container_amounts(cursor, fix=True):
+    """MySQL variant of reconcile_container_amounts"""
+    cursor.execute("""
+        SELECT c.ContainerID, c.CurrentAmount, IFNULL(t.Total, 0)
+        FROM container c
+        LEFT JOIN (
+            SELECT ContainerID, SUM(Amount) AS Total FROM containersample GROUP BY ContainerID
+        ) t ON t.ContainerID = c.ContainerID
+        WHERE c.CurrentAmount <> IFNULL(t.Total, 0)
+    """)
+    drift = [{'container_id': row[0], 'recorded': row[1], 'actual': row[2]} for row in cursor.fetchall()]
+    if fix and drift:
+        cursor.execute("""
+            UPDATE container c
+            LEFT JOIN (
+                SELECT ContainerID, SUM(Amount) AS Total FROM containersample GROUP BY ContainerID
+            ) t ON t.ContainerID = c.ContainerID
+            SET c.CurrentAmount = IFNULL(t.Total, 0)
+            WHERE c.CurrentAmount <> IFNULL(t.Total, 0)
+        """)
+    if drift:
+        logger.warning(f"{len(drift)} containers had a CurrentAmount that did not match their contents"
+                       f"{' - corrected' if fix else ''}")
+    return drift
@@ -0,0 +1,291 @@
+"""
+Unified global search for the header search bar (SQL Server).
+
+Identifier-shaped terms (SMP-12, CNT-7, TST-004, TSK-003, T1234.5_1, BC...)
+are resolved with exact lookups. Everything else runs as one UNION ALL batch
+over samples, containers, tests, tasks and locations, ranked by match quality
+(exact > prefix > contains) with a per-type row limit and a query timeout as
+the total latency budget. Candidate IDs come from the trigram index when it
+is warm, so the batch only does primary-key lookups.
+"""
+import math
+import os
+import re
+import time
+import logging
+
+from app.utils.mssql_db import mssql_db
+from app.utils.search_index import search_index, SAMPLE, CONTAINER, TEST, TASK, LOCATION
+
+logger = logging.getLogger(__name__)
+
+# Max rows returned per result type
+RESULT_LIMITS = {
+    'Sample': 10,
+    'Container': 5,
+    'Test': 5,
+    'Task': 5,
+    'Location': 5
+}
+
+# Candidate IDs taken from the trigram index per type before ranking in SQL.
+# The index ranks exact/prefix matches first, so old exact hits are not cut off.
+INDEX_CANDIDATES = 200
+
+# Total latency budget for the search batch
+SEARCH_BUDGET_SECONDS = float(os.getenv('SEARCH_BUDGET_SECONDS', '2'))
+
+# Match quality ranks
+RANK_EXACT = 100
+RANK_PREFIX = 75
+RANK_CONTAINS = 50
+
+TYPE_ORDER = ['Sample', 'Container', 'Test', 'Task', 'Location']
+
+IDENTIFIER_PATTERNS = [
+    (re.compile(r'^SMP-?(\d+)$', re.IGNORECASE), 'sample_id'),
+    (re.compile(r'^CNT-?(\d+)$', re.IGNORECASE), 'container_id'),
+    (re.compile(r'^TST-?(\d+)$', re.IGNORECASE), 'test_no'),
+    (re.compile(r'^TSK-?(\d+)$', re.IGNORECASE), 'task_no'),
+    (re.compile(r'^T\d+(\.\d+)?_\d+$', re.IGNORECASE), 'test_sample'),
+    (re.compile(r'^BC\w+$', re.IGNORECASE), 'barcode'),
+]
+
+# Every branch returns: result_type, id, title, subtitle, status, url, rank, sort_id
+_SAMPLE_COLUMNS = """
+    'Sample' AS result_type, 'SMP-' + CAST(s.[SampleID] AS NVARCHAR) AS id, s.[Description] AS title,
+    ISNULL(s.[PartNumber], 'No part number') AS subtitle, s.[Status] AS status,
+    '/storage?search=' + @term AS url
+"""
+_CONTAINER_COLUMNS = """
+    'Container' AS result_type, 'CNT-' + CAST(c.[ContainerID] AS NVARCHAR) AS id, c.[Description] AS title,
+    ISNULL(c.[Barcode], '') AS subtitle, ISNULL(c.[ContainerStatus], 'Active') AS status,
+    '/containers' AS url
+"""
+_TEST_COLUMNS = """
+    'Test' AS result_type, ISNULL(t.[TestNo], 'TST-' + CAST(t.[TestID] AS NVARCHAR)) AS id,
+    ISNULL(t.[TestName], 'Test #' + CAST(t.[TestID] AS NVARCHAR)) AS title,
+    ISNULL(t.[Description], '') AS subtitle, t.[Status] AS status, '/testing' AS url
+"""
+_TASK_COLUMNS = """
+    'Task' AS result_type, ISNULL(t.[TaskNumber], 'TSK-' + CAST(t.[TaskID] AS NVARCHAR)) AS id,
+    t.[TaskName] AS title, ISNULL(t.[Description], '') AS subtitle, t.[Status] AS status,
+    '/tasks' AS url
+"""
+_LOCATION_COLUMNS = """
+    'Location' AS result_type, 'LOC-' + CAST(sl.[LocationID] AS NVARCHAR) AS id, sl.[LocationName] AS title,
+    ISNULL(l.[LabName], '') AS subtitle, 'Active' AS status,
+    '/storage?location=' + CAST(sl.[LocationID] AS NVARCHAR) AS url
+"""
+
+
+def escape_like(term):
+    """Escape LIKE wildcards so user input matches literally"""
+    return term.replace('[', '[[]').replace('%', '[%]').replace('_', '[_]')
+
+
+def _rank(*columns):
+    """CASE expression ranking a row by its best matching column"""
+    exact = ' OR '.join(f"{c} = @term" for c in columns)
+    prefix = ' OR '.join(f"{c} LIKE @prefix" for c in columns)
+    return f"CASE WHEN {exact} THEN {RANK_EXACT} WHEN {prefix} THEN {RANK_PREFIX} ELSE {RANK_CONTAINS} END"
+
+
+def _branch(key_column, like_columns, candidate_var, candidates):
+    """WHERE fragment: index candidates when warm, LIKE scan otherwise"""
+    if candidates is not None:
+        return f"{key_column} IN (SELECT CAST([value] AS INT) FROM STRING_SPLIT({candidate_var}, ','))"
+    return '(' + ' OR '.join(f"{c} LIKE @contains" for c in like_columns) + ')'
+
+
+def _to_result(row):
+    return {
+        'result_type': row[0],
+        'id': row[1],
+        'title': row[2],
+        'subtitle': row[3],
+        'status': row[4],
+        'url': row[5],
+        'rank': row[6]
+    }
+
+
+def _execute(sql, params):
+    """Run one batch on one connection within the latency budget"""
+    with mssql_db.get_connection() as conn:
+        # The connection may be shared (/api/batch), so put its timeout back afterwards
+        previous_timeout = conn.timeout
+        conn.timeout = max(1, math.ceil(SEARCH_BUDGET_SECONDS))
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.timeout = previous_timeout
+
+
+def _identifier_lookup(term):
+    """Exact lookup for identifier-shaped terms. Returns None if term is not an identifier."""
+    for pattern, kind in IDENTIFIER_PATTERNS:
+        match = pattern.match(term)
+        if not match:
+            continue
+
+        prologue = "SET NOCOUNT ON; DECLARE @term NVARCHAR(200) = ?;"
+        if kind == 'sample_id':
+            sql = f"""{prologue}
+                SELECT {_SAMPLE_COLUMNS}, {RANK_EXACT}, s.[SampleID]
+                FROM [sample] s WHERE s.[SampleID] = ?"""
+            params = (term, int(match.group(1)))
+        elif kind == 'container_id':
+            sql = f"""{prologue}
+                SELECT {_CONTAINER_COLUMNS}, {RANK_EXACT}, c.[ContainerID]
+                FROM [container] c WHERE c.[ContainerID] = ? OR c.[Barcode] = @term"""
+            params = (term, int(match.group(1)))
+        elif kind == 'test_no':
+            sql = f"""{prologue}
+                SELECT TOP ({RESULT_LIMITS['Test']}) {_TEST_COLUMNS}, {RANK_EXACT}, t.[TestID]
+                FROM [test] t WHERE t.[TestNo] = @term OR t.[TestID] = ?
+                ORDER BY CASE WHEN t.[TestNo] = @term THEN 0 ELSE 1 END"""
+            params = (term, int(match.group(1)))
+        elif kind == 'task_no':
+            sql = f"""{prologue}
+                SELECT TOP ({RESULT_LIMITS['Task']}) {_TASK_COLUMNS}, {RANK_EXACT}, t.[TaskID]
+                FROM [task] t WHERE t.[TaskNumber] = @term OR t.[TaskID] = ?
+                ORDER BY CASE WHEN t.[TaskNumber] = @term THEN 0 ELSE 1 END"""
+            params = (term, int(match.group(1)))
+        elif kind == 'test_sample':
+            sql = f"""{prologue}
+                SELECT TOP (1) 'Sample', 'SMP-' + CAST(s.[SampleID] AS NVARCHAR), s.[Description],
+                       tsu.[SampleIdentifier] + ' in ' + ISNULL(t.[TestNo], ''), s.[Status],
+                       '/testing', {RANK_EXACT}, s.[SampleID]
+                FROM [testsampleusage] tsu
+                JOIN [test] t ON tsu.[TestID] = t.[TestID]
+                JOIN [sample] s ON tsu.[SampleID] = s.[SampleID]
+                WHERE tsu.[SampleIdentifier] = @term"""
+            params = (term,)
+        else:
+            sql = f"""{prologue}
+                SELECT {_SAMPLE_COLUMNS}, {RANK_EXACT}, s.[SampleID]
+                FROM [sample] s WHERE s.[Barcode] = @term
+                UNION ALL
+                SELECT {_CONTAINER_COLUMNS}, {RANK_EXACT}, c.[ContainerID]
+                FROM [container] c WHERE c.[Barcode] = @term"""
+            params = (term,)
+
+        return [_to_result(row) for row in _execute(sql, params) or []]
+    return None
+
+
+def _ranked_search(term):
+    """One UNION ALL batch over all result types, ranked by match quality"""
+    candidates = {
+        doc_type: search_index.search(doc_type, term, limit=INDEX_CANDIDATES, ranked=True)
+        for doc_type in (SAMPLE, CONTAINER, TEST, TASK, LOCATION)
+    }
+
+    branches = []
+    if candidates[SAMPLE] != []:
+        where = _branch("s.[SampleID]", ["s.[Description]", "s.[PartNumber]", "s.[Barcode]"],
+                        "@sample_ids", candidates[SAMPLE])
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT TOP ({RESULT_LIMITS['Sample']}) {_SAMPLE_COLUMNS},
+                       {_rank("s.[Barcode]", "s.[PartNumber]", "s.[Description]")} AS [Rank], s.[SampleID] AS SortID
+                FROM [sample] s WHERE {where}
+                ORDER BY [Rank] DESC, s.[SampleID] DESC
+            ) samples""")
+    if candidates[CONTAINER] != []:
+        where = _branch("c.[ContainerID]", ["c.[Description]", "c.[Barcode]"],
+                        "@container_ids", candidates[CONTAINER])
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT TOP ({RESULT_LIMITS['Container']}) {_CONTAINER_COLUMNS},
+                       {_rank("c.[Barcode]", "c.[Description]")} AS [Rank], c.[ContainerID] AS SortID
+                FROM [container] c WHERE {where}
+                ORDER BY [Rank] DESC, c.[ContainerID] DESC
+            ) containers""")
+    if candidates[TEST] != []:
+        where = _branch("t.[TestID]", ["t.[TestNo]", "t.[TestName]"],
+                        "@test_ids", candidates[TEST])
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT TOP ({RESULT_LIMITS['Test']}) {_TEST_COLUMNS},
+                       {_rank("t.[TestNo]", "t.[TestName]")} AS [Rank], t.[TestID] AS SortID
+                FROM [test] t WHERE {where}
+                ORDER BY [Rank] DESC, t.[TestID] DESC
+            ) tests""")
+    if candidates[TASK] != []:
+        where = _branch("t.[TaskID]", ["t.[TaskNumber]", "t.[TaskName]"],
+                        "@task_ids", candidates[TASK])
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT TOP ({RESULT_LIMITS['Task']}) {_TASK_COLUMNS},
+                       {_rank("t.[TaskNumber]", "t.[TaskName]")} AS [Rank], t.[TaskID] AS SortID
+                FROM [task] t WHERE {where}
+                ORDER BY [Rank] DESC, t.[TaskID] DESC
+            ) tasks""")
+    if candidates[LOCATION] != []:
+        where = _branch("sl.[LocationID]", ["sl.[LocationName]"],
+                        "@location_ids", candidates[LOCATION])
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT TOP ({RESULT_LIMITS['Location']}) {_LOCATION_COLUMNS},
+                       {_rank("sl.[LocationName]")} AS [Rank], sl.[LocationID] AS SortID
+                FROM [storagelocation] sl
+                LEFT JOIN [lab] l ON sl.[LabID] = l.[LabID]
+                WHERE {where}
+                ORDER BY [Rank] DESC, sl.[LocationID] DESC
+            ) locations""")
+
+    if not branches:
+        return []
+
+    escaped = escape_like(term)
+    sql = f"""
+        SET NOCOUNT ON;
+        DECLARE @term NVARCHAR(200) = ?, @prefix NVARCHAR(210) = ?, @contains NVARCHAR(220) = ?;
+        DECLARE @sample_ids NVARCHAR(MAX) = ?, @container_ids NVARCHAR(MAX) = ?, @test_ids NVARCHAR(MAX) = ?,
+                @task_ids NVARCHAR(MAX) = ?, @location_ids NVARCHAR(MAX) = ?;
+        {' UNION ALL '.join(branches)}
+    """
+
+    def ids(doc_type):
+        return ','.join(str(i) for i in candidates[doc_type]) if candidates[doc_type] else ''
+
+    params = (
+        term, f"{escaped}%", f"%{escaped}%",
+        ids(SAMPLE), ids(CONTAINER), ids(TEST), ids(TASK), ids(LOCATION)
+    )
+    return [_to_result(row) for row in _execute(sql, params) or []]
+
+
+def global_search(term):
+    """
+    Search everything for term. Returns (results, meta) where results are
+    sorted by rank, then by type, and meta describes how the search ran.
+    """
+    started = time.time()
+    term = term.strip()
+    meta = {'mode': 'ranked', 'index_ready': search_index.ready, 'timed_out': False}
+
+    results = []
+    try:
+        exact = _identifier_lookup(term)
+        if exact:
+            meta['mode'] = 'identifier'
+            results = exact
+        else:
+            results = _ranked_search(term)
+    except Exception as e:
+        # A timeout past the latency budget returns no results (meta.timed_out) instead of failing
+        if 'HYT00' in str(e) or 'timeout' in str(e).lower():
+            logger.warning(f"Global search for '{term}' exceeded {SEARCH_BUDGET_SECONDS}s budget")
+            meta['timed_out'] = True
+        else:
+            raise
+
+    results.sort(key=lambda r: (-r['rank'], TYPE_ORDER.index(r['result_type'])))
+    meta['elapsed_ms'] = int((time.time() - started) * 1000)
+    return results, meta
@@ -0,0 +1,52 @@
+"""
+Background label printing.
+
+Bulk operations queue their labels here instead of printing inline, so the
+request returns as soon as the data is committed. A single daemon worker
+prints the queued labels in order inside an application context.
+"""
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+_label_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _run(app):
+    from app.routes.printer import print_sample_label
+
+    while True:
+        sample_data = _label_queue.get()
+        try:
+            with app.app_context():
+                result = print_sample_label(sample_data, auto_print=True)
+            if result.get('status') != 'success':
+                logger.warning(f"Queued label for {sample_data.get('SampleIDFormatted')} failed: {result.get('message')}")
+        except Exception as e:
+            logger.error(f"Queued label for {sample_data.get('SampleIDFormatted')} failed: {e}")
+        finally:
+            _label_queue.task_done()
+
+
+def _ensure_worker(app):
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, args=(app,), name='label-printer', daemon=True)
+            _worker.start()
+
+
+def queue_sample_labels(app, labels):
+    """Queue sample label dicts (print_sample_label format). Returns the queue length."""
+    _ensure_worker(app)
+    for sample_data in labels:
+        _label_queue.put(sample_data)
+    return _label_queue.qsize()
+
+
+def pending_labels():
+    return _label_queue.qsize()
@@ -6,6 +6,7 @@ import pyodbc
 import os
 from contextlib import contextmanager
 import logging
+from flask import g, has_app_context
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -49,6 +50,12 @@ class MSSQLConnection:
     @contextmanager
     def get_connection(self):
         """Context manager for database connections"""
+        # Reuse the request-scoped connection opened by shared_connection()
+        shared = g.get('mssql_shared_connection') if has_app_context() else None
+        if shared is not None:
+            yield shared
+            return
+        
         conn = None
         try:
             conn_str = self.get_connection_string()
@@ -65,6 +72,24 @@ class MSSQLConnection:
                 conn.close()
                 logger.debug("Database connection closed")
     
+    @contextmanager
+    def shared_connection(self):
+        """
+        Open one connection for the rest of the current app context; every
+        get_connection() call inside the block reuses it instead of connecting
+        again. Used by /api/batch so its sub-requests share a connection.
+        """
+        if g.get('mssql_shared_connection') is not None:
+            yield g.mssql_shared_connection
+            return
+        
+        with self.get_connection() as conn:
+            g.mssql_shared_connection = conn
+            try:
+                yield conn
+            finally:
+                g.pop('mssql_shared_connection', None)
+    
     def execute_query(self, query, params=None, fetch_one=False, fetch_all=False):
         """Execute a query and return results"""
         with self.get_connection() as conn:
@@ -127,11 +152,40 @@ class MSSQLConnection:
 # Global instance
 mssql_db = MSSQLConnection()
 
+def id_list_filter(column):
+    """
+    SQL fragment matching column against a comma separated ID list passed as
+    a single parameter (see id_list_param). Avoids the 2100 parameter limit
+    and keeps one cached plan regardless of list length.
+    """
+    return f"{column} IN (SELECT CAST([value] AS INT) FROM STRING_SPLIT(?, ','))"
+
+def id_list_param(ids):
+    """Serialize integer IDs for use with id_list_filter"""
+    return ','.join(str(int(i)) for i in ids)
+
+def fetch_result_sets(cursor, count):
+    """Read count result sets from a multi-statement batch (SET NOCOUNT ON first)"""
+    result_sets = [cursor.fetchall()]
+    for _ in range(count - 1):
+        cursor.nextset()
+        result_sets.append(cursor.fetchall())
+    return result_sets
+
 def get_current_user_mssql(user_login=None):
     """
     Gets or creates a user in SQL Server database based on Windows/domain authentication.
     Compatible with the existing get_current_user function.
+    The result is kept for the rest of the request (and its /api/batch sub-requests).
     """
+    if user_login or not has_app_context():
+        return _load_current_user(user_login)
+    
+    if 'mssql_current_user' not in g:
+        g.mssql_current_user = _load_current_user()
+    return dict(g.mssql_current_user)
+
+def _load_current_user(user_login=None):
     # Default admin user as fallback
     default_user = {"UserID": 1, "Name": "System Admin", "WindowsLogin": "SYSTEM", "Role": "Admin"}
     
@@ -177,6 +231,10 @@ def get_current_user_mssql(user_login=None):
         """
         mssql_db.execute_query(insert_query, (display_name, user_login, 'Admin'))
         
+        # Imported here - reference_cache depends on this module
+        from app.utils.reference_cache import bump_version, USER
+        bump_version(USER)
+        
         # Get the new user
         user = mssql_db.execute_query(query, (user_login,), fetch_one=True)
         
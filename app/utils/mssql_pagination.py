@@ -0,0 +1,130 @@
+"""
+Keyset (seek) pagination helpers for SQL Server listings.
+Cursors are opaque tokens holding the sort value and the SampleID tiebreaker
+of the last row on a page, so the next page can be fetched with an index seek
+instead of OFFSET/FETCH.
+"""
+import base64
+import json
+import time
+import logging
+from datetime import datetime, date
+from decimal import Decimal
+
+from app.utils.mssql_db import mssql_db
+
+logger = logging.getLogger(__name__)
+
+# Approximate row counts are cached per table for this many seconds
+APPROX_COUNT_TTL = 30
+
+_approx_count_cache = {}
+
+
+def normalize_sort_order(sort_order, default='DESC'):
+    """Return 'ASC' or 'DESC' - never splice raw request values into ORDER BY"""
+    sort_order = (sort_order or default).upper()
+    return sort_order if sort_order in ('ASC', 'DESC') else default
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'t': 'dt', 'v': value.isoformat()}
+    if isinstance(value, date):
+        return {'t': 'd', 'v': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'t': 'dec', 'v': str(value)}
+    return {'t': 'raw', 'v': value}
+
+
+def _decode_value(item):
+    kind = item.get('t')
+    value = item.get('v')
+    if kind == 'dt':
+        return datetime.fromisoformat(value)
+    if kind == 'd':
+        return date.fromisoformat(value)
+    if kind == 'dec':
+        return Decimal(value)
+    return value
+
+
+def encode_cursor(values):
+    """Encode a tuple of sort values into a URL-safe cursor token"""
+    payload = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token. Returns None for missing or malformed cursors."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        return [_decode_value(item) for item in payload]
+    except Exception as e:
+        logger.warning(f"Ignoring invalid pagination cursor: {e}")
+        return None
+
+
+def keyset_predicate(sort_expression, tiebreaker, sort_order, cursor_values, backwards=False, nullable=False):
+    """
+    Build the seek predicate for (sort_expression, tiebreaker) tuples.
+    cursor_values is the decoded (sort_value, tiebreaker_value) pair.
+    Pass nullable for a raw nullable column: SQL Server sorts NULLs first, so
+    they come before every value ascending and after every value descending.
+    Returns (sql, params).
+    """
+    sort_value, tiebreaker_value = cursor_values
+    ascending = (sort_order == 'ASC') != backwards
+    op = '>' if ascending else '<'
+    if sort_expression == tiebreaker:
+        # Unique key: the tuple comparison collapses to a single seek
+        return f"{tiebreaker} {op} ?", [tiebreaker_value]
+    if nullable and sort_value is None:
+        if ascending:
+            return (
+                f"(({sort_expression} IS NULL AND {tiebreaker} > ?) OR {sort_expression} IS NOT NULL)",
+                [tiebreaker_value]
+            )
+        return f"({sort_expression} IS NULL AND {tiebreaker} < ?)", [tiebreaker_value]
+    if nullable and not ascending:
+        return (
+            f"({sort_expression} < ? OR {sort_expression} IS NULL"
+            f" OR ({sort_expression} = ? AND {tiebreaker} < ?))",
+            [sort_value, sort_value, tiebreaker_value]
+        )
+    return (
+        f"({sort_expression} {op} ? OR ({sort_expression} = ? AND {tiebreaker} {op} ?))",
+        [sort_value, sort_value, tiebreaker_value]
+    )
+
+
+def keyset_order_by(sort_expression, tiebreaker, sort_order, backwards=False):
+    """ORDER BY clause matching keyset_predicate"""
+    if backwards:
+        sort_order = 'ASC' if sort_order == 'DESC' else 'DESC'
+    if sort_expression == tiebreaker:
+        return f"ORDER BY {sort_expression} {sort_order}"
+    return f"ORDER BY {sort_expression} {sort_order}, {tiebreaker} {sort_order}"
+
+
+def approximate_row_count(table_name):
+    """
+    Cheap row count from partition metadata instead of COUNT(*).
+    Used for unfiltered listings where an exact total is not needed.
+    """
+    cached = _approx_count_cache.get(table_name)
+    if cached and time.time() - cached[1] < APPROX_COUNT_TTL:
+        return cached[0]
+
+    result = mssql_db.execute_query("""
+        SELECT ISNULL(SUM(p.[rows]), 0)
+        FROM sys.partitions p
+        WHERE p.[object_id] = OBJECT_ID(?) AND p.[index_id] IN (0, 1)
+    """, (f"dbo.{table_name}",), fetch_one=True)
+    count = int(result[0]) if result and result[0] is not None else 0
+
+    _approx_count_cache[table_name] = (count, time.time())
+    return count
@@ -0,0 +1,167 @@
+"""
+Process-wide cache for reference data (SQL Server).
+
+Units, suppliers, users, storage locations, container types, tasks and the
+set of sample statuses change rarely but are read by almost every page. Each table is cached with a version
+stamp: routes that mutate a table call bump_version(<table>) and the next read
+reloads it. Entries also expire after REFERENCE_CACHE_TTL seconds as a safety
+net for writes made by other processes or directly in the database.
+
+Accessors return copies, so callers may modify the rows they get back.
+"""
+import os
+import threading
+import time
+import logging
+
+from app.utils.mssql_db import mssql_db, fetch_result_sets
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', '300'))
+
+SUPPLIER = 'supplier'
+USER = 'user'
+UNIT = 'unit'
+LOCATION = 'storagelocation'
+CONTAINER_TYPE = 'containertype'
+TASK = 'task'
+SAMPLE_STATUS = 'sample_status'
+
+ACTIVE_TASK_STATUSES = ('Planning', 'Active', 'On Hold')
+
+_QUERIES = {
+    SUPPLIER: "SELECT [SupplierID], [SupplierName] FROM [supplier] ORDER BY [SupplierName]",
+    USER: "SELECT [UserID], [Name] FROM [user] ORDER BY [Name]",
+    UNIT: "SELECT [UnitID], [UnitName] FROM [unit] ORDER BY [UnitName]",
+    LOCATION: """
+        SELECT sl.[LocationID], sl.[LocationName], sl.[LabID], lb.[LabName],
+               sl.[Rack], sl.[Section], sl.[Shelf]
+        FROM [storagelocation] sl
+        LEFT JOIN [lab] lb ON sl.[LabID] = lb.[LabID]
+        ORDER BY sl.[LocationName]
+    """,
+    CONTAINER_TYPE: """
+        SELECT [ContainerTypeID], [TypeName], [Description], [DefaultCapacity]
+        FROM [containertype]
+    """,
+    TASK: "SELECT [TaskID], [TaskNumber], [TaskName], [Status] FROM [task] ORDER BY [TaskNumber] DESC",
+    # Distinct values of the leading key of IX_sample_Status_SampleID; refreshed by TTL only
+    SAMPLE_STATUS: "SELECT DISTINCT [Status] FROM [sample] WHERE [Status] IS NOT NULL ORDER BY [Status]",
+}
+
+
+def _unit_name(name):
+    # Translate 'stk' to 'pcs' for consistency
+    return 'pcs' if (name or '').lower() == 'stk' else name
+
+
+_BUILDERS = {
+    SUPPLIER: lambda row: {'SupplierID': row[0], 'SupplierName': row[1]},
+    USER: lambda row: {'UserID': row[0], 'Name': row[1]},
+    UNIT: lambda row: {'UnitID': row[0], 'UnitName': _unit_name(row[1])},
+    LOCATION: lambda row: {
+        'LocationID': row[0], 'LocationName': row[1], 'LabID': row[2], 'LabName': row[3],
+        'Rack': row[4], 'Section': row[5], 'Shelf': row[6]
+    },
+    CONTAINER_TYPE: lambda row: {
+        'ContainerTypeID': row[0], 'TypeName': row[1], 'Description': row[2], 'DefaultCapacity': row[3]
+    },
+    TASK: lambda row: {'TaskID': row[0], 'TaskNumber': row[1], 'TaskName': row[2], 'Status': row[3]},
+    SAMPLE_STATUS: lambda row: {'Status': row[0]},
+}
+
+TABLES = tuple(_QUERIES)
+
+_lock = threading.Lock()
+_versions = {table: 0 for table in TABLES}
+# table -> (version, loaded_at, rows)
+_entries = {}
+
+
+def bump_version(*tables):
+    """Mark tables as changed; the next read reloads them"""
+    with _lock:
+        for table in tables:
+            _versions[table] += 1
+            _entries.pop(table, None)
+
+
+def _store(table, version, rows):
+    with _lock:
+        # Skip if the table was bumped while we were loading
+        if _versions[table] == version:
+            _entries[table] = (version, time.time(), [_BUILDERS[table](row) for row in rows or []])
+
+
+def _get(table):
+    with _lock:
+        version = _versions[table]
+        entry = _entries.get(table)
+        if entry and entry[0] == version and time.time() - entry[1] < REFERENCE_CACHE_TTL:
+            return [dict(row) for row in entry[2]]
+
+    rows = mssql_db.execute_query(_QUERIES[table], fetch_all=True)
+    _store(table, version, rows)
+    return [_BUILDERS[table](row) for row in rows or []]
+
+
+def get_suppliers():
+    return _get(SUPPLIER)
+
+
+def get_users():
+    return _get(USER)
+
+
+def get_units():
+    return _get(UNIT)
+
+
+def get_locations(with_lab_only=False):
+    locations = _get(LOCATION)
+    if with_lab_only:
+        locations = [location for location in locations if location['LabName'] is not None]
+    return locations
+
+
+def get_container_types():
+    return _get(CONTAINER_TYPE)
+
+
+def get_tasks(active_only=False):
+    tasks = _get(TASK)
+    if active_only:
+        tasks = [task for task in tasks if task['Status'] in ACTIVE_TASK_STATUSES]
+    return tasks
+
+
+def get_sample_statuses():
+    return [row['Status'] for row in _get(SAMPLE_STATUS)]
+
+
+def warm_reference_cache():
+    """Load every table in one round trip (one result set per table)"""
+    with _lock:
+        versions = dict(_versions)
+    started = time.time()
+    with mssql_db.get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(';\n'.join(_QUERIES[table] for table in TABLES))
+            for table, rows in zip(TABLES, fetch_result_sets(cursor, len(TABLES))):
+                _store(table, versions[table], rows)
+        finally:
+            cursor.close()
+    logger.info(f"Reference cache warmed in {time.time() - started:.2f}s")
+
+
+def warm_reference_cache_async():
+    """Warm at startup without blocking the app; reads fall back to queries until done"""
+    def run():
+        try:
+            warm_reference_cache()
+        except Exception as e:
+            logger.error(f"Reference cache warm-up failed: {e}")
+
+    threading.Thread(target=run, name='reference-cache-warm', daemon=True).start()
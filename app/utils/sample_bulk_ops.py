@@ -0,0 +1,204 @@
+"""
+Set-based bulk move and disposal of samples (SQL Server).
+
+Each operation is one batch on the caller's transaction cursor: the IDs go
+in as a single parameter, the UPDATEs and the history INSERT run over the
+whole set, and a final SELECT reports the outcome per requested sample.
+Samples that cannot be processed are reported and skipped; the rest are
+applied in the same transaction.
+"""
+import json
+
+from app.utils.mssql_db import id_list_param
+
+MAX_BULK_OPERATION_SAMPLES = 1000
+
+
+class BulkOperationError(ValueError):
+    """The request as a whole is invalid (no samples, unknown location, ...)"""
+
+
+def parse_sample_ids(values):
+    """Distinct sample IDs in request order; accepts 123 or 'SMP-123'"""
+    if not isinstance(values, list) or not values:
+        raise BulkOperationError('sampleIds must be a non-empty list')
+    if len(values) > MAX_BULK_OPERATION_SAMPLES:
+        raise BulkOperationError(f'At most {MAX_BULK_OPERATION_SAMPLES} samples can be processed at once')
+    sample_ids = []
+    for value in values:
+        try:
+            sample_ids.append(int(str(value).upper().replace('SMP-', '')))
+        except ValueError:
+            raise BulkOperationError(f'Invalid sample ID: {value}')
+    return list(dict.fromkeys(sample_ids))
+
+
+_MOVE_BATCH = """
+    SET NOCOUNT ON;
+    DECLARE @ids NVARCHAR(MAX) = ?, @location_id INT = ?, @user_id INT = ?;
+    DECLARE @location_name NVARCHAR(255);
+    DECLARE @moved TABLE ([SampleID] INT);
+
+    SELECT @location_name = [LocationName] FROM [storagelocation] WHERE [LocationID] = @location_id;
+
+    IF @location_name IS NOT NULL
+    BEGIN
+        UPDATE ss
+        SET ss.[LocationID] = @location_id
+        OUTPUT INSERTED.[SampleID] INTO @moved
+        FROM [samplestorage] ss
+        JOIN [sample] s ON s.[SampleID] = ss.[SampleID]
+        WHERE ss.[SampleID] IN (SELECT CAST([value] AS INT) FROM STRING_SPLIT(@ids, ','))
+          AND s.[Status] <> 'Disposed';
+
+        INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [Notes])
+        SELECT GETDATE(), 'Sample moved', @user_id, m.[SampleID], N'Sample moved to ' + @location_name
+        FROM (SELECT DISTINCT [SampleID] FROM @moved) m;
+    END
+
+    SELECT @location_name;
+    SELECT r.[SampleID], s.[Status], CASE WHEN m.[SampleID] IS NULL THEN 0 ELSE 1 END
+    FROM (SELECT DISTINCT CAST([value] AS INT) AS [SampleID] FROM STRING_SPLIT(@ids, ',')) r
+    LEFT JOIN [sample] s ON s.[SampleID] = r.[SampleID]
+    LEFT JOIN (SELECT DISTINCT [SampleID] FROM @moved) m ON m.[SampleID] = r.[SampleID];
+"""
+
+
+def bulk_move(cursor, sample_ids, location_id, user_id):
+    """
+    Move samples to a storage location in one batch.
+    Returns (location_name, moved_ids, failures) where failures is
+    [{'sample_id', 'error'}] in request order.
+    """
+    cursor.execute(_MOVE_BATCH, (id_list_param(sample_ids), location_id, user_id))
+    location_row = cursor.fetchone()
+    if not location_row or location_row[0] is None:
+        raise BulkOperationError(f'Storage location {location_id} not found')
+    cursor.nextset()
+    outcome = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    moved = []
+    failures = []
+    for sample_id in sample_ids:
+        status, was_moved = outcome.get(sample_id, (None, 0))
+        if was_moved:
+            moved.append(sample_id)
+        elif status is None:
+            failures.append({'sample_id': sample_id, 'error': f'Sample with ID {sample_id} not found'})
+        elif status == 'Disposed':
+            failures.append({'sample_id': sample_id, 'error': 'Cannot move a disposed sample'})
+        else:
+            failures.append({'sample_id': sample_id, 'error': 'Sample has no storage record'})
+    return location_row[0], moved, failures
+
+
+_DISPOSE_BATCH = """
+    SET NOCOUNT ON;
+    DECLARE @items NVARCHAR(MAX) = ?, @user_id INT = ?, @notes NVARCHAR(1000) = ?;
+    DECLARE @requested TABLE ([RowIndex] INT PRIMARY KEY, [SampleID] INT, [Amount] INT NULL);
+    DECLARE @targets TABLE ([RowIndex] INT PRIMARY KEY, [StorageID] INT, [SampleID] INT, [Amount] INT, [Available] INT);
+    DECLARE @disposed TABLE ([RowIndex] INT, [SampleID] INT, [Amount] INT, [Remaining] INT);
+
+    INSERT INTO @requested ([RowIndex], [SampleID], [Amount])
+    SELECT [RowIndex], [SampleID], [Amount]
+    FROM OPENJSON(@items) WITH ([RowIndex] INT, [SampleID] INT, [Amount] INT);
+
+    -- The storage row with stock, as the single-sample disposal picks it
+    INSERT INTO @targets ([RowIndex], [StorageID], [SampleID], [Amount], [Available])
+    SELECT r.[RowIndex], st.[StorageID], r.[SampleID], ISNULL(r.[Amount], st.[AmountRemaining]), st.[AmountRemaining]
+    FROM @requested r
+    CROSS APPLY (
+        SELECT TOP 1 [StorageID], [AmountRemaining]
+        FROM [samplestorage]
+        WHERE [SampleID] = r.[SampleID] AND [AmountRemaining] > 0
+        ORDER BY [StorageID]
+    ) st;
+
+    -- Guarded: a row whose stock dropped below the amount since it was read is left alone
+    UPDATE ss
+    SET ss.[AmountRemaining] = ss.[AmountRemaining] - t.[Amount]
+    OUTPUT t.[RowIndex], t.[SampleID], t.[Amount], INSERTED.[AmountRemaining] INTO @disposed
+    FROM [samplestorage] ss
+    JOIN @targets t ON t.[StorageID] = ss.[StorageID]
+    WHERE ss.[AmountRemaining] >= t.[Amount];
+
+    UPDATE s
+    SET s.[Status] = 'Consumed'
+    FROM [sample] s
+    JOIN @disposed d ON d.[SampleID] = s.[SampleID]
+    WHERE d.[Remaining] = 0;
+
+    INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [Notes])
+    SELECT GETDATE(), 'Disposed', @user_id, d.[SampleID], CONCAT(N'Amount: ', d.[Amount], N' - ', @notes)
+    FROM @disposed d;
+
+    SELECT r.[RowIndex], r.[SampleID], s.[SampleID], t.[Amount], t.[Available], d.[Amount], d.[Remaining]
+    FROM @requested r
+    LEFT JOIN [sample] s ON s.[SampleID] = r.[SampleID]
+    LEFT JOIN @targets t ON t.[RowIndex] = r.[RowIndex]
+    LEFT JOIN @disposed d ON d.[RowIndex] = r.[RowIndex]
+    ORDER BY r.[RowIndex];
+"""
+
+
+def parse_disposal_items(data):
+    """
+    Accept {samples: [{sampleId, amount}]} or {sampleIds: [...], amount}.
+    A missing amount disposes everything remaining. Returns [(sample_id, amount or None)].
+    """
+    if data.get('samples') is not None:
+        entries = data.get('samples')
+        if not isinstance(entries, list) or not entries:
+            raise BulkOperationError('samples must be a non-empty list')
+        sample_ids = parse_sample_ids([entry.get('sampleId') for entry in entries if isinstance(entry, dict)])
+        if len(sample_ids) != len(entries):
+            raise BulkOperationError('Each sample must be listed once with a sampleId')
+        amounts = [entry.get('amount') for entry in entries]
+    else:
+        sample_ids = parse_sample_ids(data.get('sampleIds'))
+        amounts = [data.get('amount')] * len(sample_ids)
+
+    items = []
+    for sample_id, amount in zip(sample_ids, amounts):
+        if amount in (None, '', 'all'):
+            items.append((sample_id, None))
+            continue
+        try:
+            amount = int(amount)
+        except (ValueError, TypeError):
+            raise BulkOperationError(f'Invalid amount for sample SMP-{sample_id}')
+        if amount <= 0:
+            raise BulkOperationError(f'Amount for sample SMP-{sample_id} must be greater than 0')
+        items.append((sample_id, amount))
+    return items
+
+
+def bulk_dispose(cursor, items, user_id, notes=None):
+    """
+    Dispose amounts from many samples in one batch. items is [(sample_id, amount or None)].
+    Returns (disposed, failures): disposed is [{'sample_id', 'amount', 'remaining'}],
+    failures is [{'sample_id', 'error'}], both in request order.
+    """
+    cursor.execute(_DISPOSE_BATCH, (
+        json.dumps([{'RowIndex': index, 'SampleID': sample_id, 'Amount': amount}
+                    for index, (sample_id, amount) in enumerate(items)]),
+        user_id,
+        notes or 'Disposed through system'
+    ))
+
+    disposed = []
+    failures = []
+    for row in cursor.fetchall():
+        _, sample_id, found, amount, available, disposed_amount, remaining = row
+        if disposed_amount is not None:
+            disposed.append({'sample_id': sample_id, 'amount': disposed_amount, 'remaining': remaining})
+        elif found is None:
+            failures.append({'sample_id': sample_id, 'error': f'Sample with ID {sample_id} not found'})
+        elif available is None:
+            failures.append({'sample_id': sample_id, 'error': 'No available storage for this sample'})
+        else:
+            failures.append({
+                'sample_id': sample_id,
+                'error': f'Requested amount ({amount}) exceeds available amount ({available})'
+            })
+    return disposed, failures
@@ -0,0 +1,396 @@
+"""
+Streaming CSV/XLSX sample import for SQL Server.
+
+Supplier manifests are read one row at a time and registered in chunks of
+IMPORT_CHUNK_SIZE rows, so memory use depends on the chunk size rather than
+the file size. Each chunk is:
+
+    1. mapped to registration specs, resolving unit/owner/task/location/
+       container type names against the reference cache (no queries)
+    2. validated with prepare_specs and check_against_database (one batch,
+       including set-wise serial uniqueness)
+    3. written with insert_registration in its own transaction
+
+Rows that fail are reported with their file row number and left out; the
+rest of the chunk is still imported. Serials repeated across chunks are
+caught by the database check because earlier chunks are already committed.
+If a whole chunk fails, the import stops there and the report says so; the
+chunks before it stay imported and are listed in reception_ids.
+
+The report keeps counters, not per-row state: row errors go to error_sink
+(the CLI writes them to a file) or are kept up to max_errors.
+
+XLSX files need openpyxl; CSV files only need the standard library.
+"""
+import csv
+import io
+import itertools
+import logging
+import time
+from datetime import datetime, date
+
+from app.utils.mssql_db import mssql_db
+from app.utils.reference_cache import (
+    get_units, get_users, get_locations, get_container_types, get_tasks, get_suppliers
+)
+from app.utils.sample_registration import (
+    RegistrationError, MAX_BULK_SAMPLES, prepare_specs, check_against_database, insert_registration
+)
+from app.utils.search_index import index_sample, index_container
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 500
+
+# Normalized header -> registration payload key
+COLUMN_ALIASES = {
+    'description': 'description',
+    'partnumber': 'partNumber',
+    'barcode': 'barcode',
+    'amount': 'totalAmount',
+    'totalamount': 'totalAmount',
+    'quantity': 'totalAmount',
+    'unit': 'unit',
+    'owner': 'owner',
+    'task': 'task',
+    'location': 'storageLocation',
+    'storagelocation': 'storageLocation',
+    'expiredate': 'expireDate',
+    'expirationdate': 'expireDate',
+    'type': 'sampleType',
+    'sampletype': 'sampleType',
+    'serialnumber': 'serialNumbers',
+    'serialnumbers': 'serialNumbers',
+    'serials': 'serialNumbers',
+    'containertype': 'containerTypeId',
+    'containerid': 'existingContainerId',
+    'existingcontainer': 'existingContainerId',
+    'containercount': 'containerCount',
+    'containerdescription': 'containerDescription',
+}
+
+# Several serial numbers in one cell
+SERIAL_SEPARATORS = (';', '|', ',')
+
+
+class SampleImportError(Exception):
+    """The file itself cannot be imported (format, headers, missing openpyxl)"""
+
+
+def _normalize_header(header):
+    return ''.join(ch for ch in str(header or '').lower() if ch.isalnum())
+
+
+def _map_headers(headers):
+    columns = [COLUMN_ALIASES.get(_normalize_header(header)) for header in headers]
+    if 'description' not in columns:
+        raise SampleImportError('The file must have a Description column')
+    return columns
+
+
+def _iter_csv(stream):
+    text = stream if isinstance(stream, io.TextIOBase) else io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    # Sniff the delimiter from the header line only; Excel exports often use ';'
+    header = text.readline()
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(itertools.chain([header], text), dialect)
+
+
+def _iter_xlsx(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise SampleImportError('XLSX import requires openpyxl (pip install openpyxl); save the file as CSV instead')
+    # read_only streams the sheet instead of loading every cell
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_import_rows(stream, filename):
+    """
+    Yield (row_number, {payload_key: value}) for every non-empty data row.
+    row_number is the 1-based line in the file, as shown in spreadsheets.
+    """
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        rows = _iter_xlsx(stream)
+    elif filename.lower().endswith(('.csv', '.txt')):
+        rows = _iter_csv(stream)
+    else:
+        raise SampleImportError('Only .csv and .xlsx files can be imported')
+
+    columns = None
+    for row_number, row in enumerate(rows, start=1):
+        if columns is None:
+            columns = _map_headers(row)
+            continue
+        values = {}
+        for column, value in zip(columns, row):
+            if column and value not in (None, ''):
+                values[column] = value.strip() if isinstance(value, str) else value
+        if values:
+            yield row_number, values
+
+    if columns is None:
+        raise SampleImportError('The file is empty')
+
+
+class ReferenceLookup:
+    """Resolve names from a manifest to IDs using the reference cache"""
+
+    def __init__(self):
+        self.units = self._by_name(get_units(), 'UnitName', 'UnitID')
+        # Manifests may still say 'stk' for pieces
+        if 'pcs' in self.units:
+            self.units.setdefault('stk', self.units['pcs'])
+        self.users = self._by_name(get_users(), 'Name', 'UserID')
+        self.locations = self._by_name(get_locations(), 'LocationName', 'LocationID')
+        self.container_types = self._by_name(get_container_types(), 'TypeName', 'ContainerTypeID')
+        self.tasks = self._by_name(get_tasks(), 'TaskNumber', 'TaskID')
+        self.tasks.update(self._by_name(get_tasks(), 'TaskName', 'TaskID'))
+        self.suppliers = self._by_name(get_suppliers(), 'SupplierName', 'SupplierID')
+
+    @staticmethod
+    def _by_name(rows, name_key, id_key):
+        return {str(row[name_key]).strip().lower(): row[id_key] for row in rows if row[name_key]}
+
+    @staticmethod
+    def _resolve(table, value):
+        if isinstance(value, (int, float)) or str(value).isdigit():
+            return int(value)
+        return table.get(str(value).strip().lower())
+
+    def resolve(self, values, field, table, label):
+        """Replace a name with its ID; returns an error message or None"""
+        if field not in values:
+            return None
+        resolved = self._resolve(table, values[field])
+        if resolved is None:
+            return f'Unknown {label} "{values[field]}"'
+        values[field] = resolved
+        return None
+
+    def supplier_id(self, supplier):
+        if supplier in (None, ''):
+            return None
+        return self._resolve(self.suppliers, supplier)
+
+
+def row_to_spec(values, lookup):
+    """
+    Turn a mapped row into a POST /api/samples payload.
+    Returns (spec, errors) where errors is a list of (field, message).
+    """
+    spec = dict(values)
+    errors = []
+    for field, table, label in (
+        ('unit', lookup.units, 'unit'),
+        ('owner', lookup.users, 'owner'),
+        ('task', lookup.tasks, 'task'),
+        ('storageLocation', lookup.locations, 'location'),
+        ('containerTypeId', lookup.container_types, 'container type'),
+    ):
+        error = lookup.resolve(spec, field, table, label)
+        if error:
+            errors.append((field, error))
+
+    expire_date = spec.get('expireDate')
+    if isinstance(expire_date, (datetime, date)):
+        spec['expireDate'] = expire_date.strftime('%Y-%m-%d')
+    elif expire_date:
+        for fmt in ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y'):
+            try:
+                spec['expireDate'] = datetime.strptime(str(expire_date), fmt).strftime('%Y-%m-%d')
+                break
+            except ValueError:
+                continue
+        else:
+            errors.append(('expireDate', f'Unrecognized date "{expire_date}"'))
+
+    serials = spec.pop('serialNumbers', None)
+    if serials not in (None, ''):
+        serials = str(serials)
+        for separator in SERIAL_SEPARATORS:
+            if separator in serials:
+                serials = serials.split(separator)
+                break
+        else:
+            serials = [serials]
+        spec['hasSerialNumbers'] = True
+        spec['serialNumbers'] = serials
+
+    if 'existingContainerId' in spec:
+        spec['storageOption'] = 'container'
+        spec['useExistingContainer'] = True
+    elif 'containerTypeId' in spec:
+        spec['storageOption'] = 'container'
+
+    return spec, errors
+
+
+class ImportReport:
+    """Running totals and (up to max_errors) row errors for one import"""
+
+    def __init__(self, filename, dry_run=False, error_sink=None, max_errors=None):
+        self.filename = filename
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.error_count = 0
+        self.errors = []
+        self.reception_ids = []
+        self.stopped = None
+        self.started = time.time()
+        self._error_sink = error_sink
+        self._max_errors = max_errors
+
+    def add_row_errors(self, row_number, errors):
+        """Record a failed row; errors is [(field, message)]. row_number is None for a whole chunk."""
+        if row_number is not None:
+            self.failed += 1
+        for field, error in errors:
+            self.error_count += 1
+            entry = {'row': row_number, 'field': field, 'error': error}
+            if self._error_sink:
+                self._error_sink(entry)
+            elif self._max_errors is None or len(self.errors) < self._max_errors:
+                self.errors.append(entry)
+
+    def as_dict(self):
+        return {
+            'filename': self.filename,
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'imported': self.imported,
+            'failed': self.failed,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'errors_truncated': not self._error_sink and len(self.errors) < self.error_count,
+            'reception_ids': self.reception_ids,
+            'stopped': self.stopped,
+            'seconds': round(time.time() - self.started, 2)
+        }
+
+
+def _validate_chunk(cursor, chunk, supplier_id, report):
+    """
+    Prepare and check a chunk, dropping failing rows until the rest is clean.
+    chunk is [(row_number, spec)]. Returns (prepared, row_numbers, supplier_id).
+    """
+    while chunk:
+        specs = [spec for _, spec in chunk]
+        row_numbers = [row_number for row_number, _ in chunk]
+        try:
+            prepared = prepare_specs(specs)
+            supplier_id = check_against_database(cursor, prepared, supplier_id)
+            return prepared, row_numbers, supplier_id
+        except RegistrationError as e:
+            if any(error['index'] is None for error in e.errors):
+                # Not about particular rows - the caller stops the import
+                raise
+            failed = {}
+            for error in e.errors:
+                failed.setdefault(error['index'], []).append((error['field'], error['error']))
+            for index, errors in failed.items():
+                report.add_row_errors(row_numbers[index], errors)
+            chunk = [item for index, item in enumerate(chunk) if index not in failed]
+    return [], [], supplier_id
+
+
+def _import_chunk(chunk, reception, user_id, report):
+    """Import one chunk; returns False (with report.stopped set) if the import must stop"""
+    if not chunk:
+        return True
+    try:
+        _write_chunk(chunk, reception, user_id, report)
+    except RegistrationError as e:
+        error = f"Rows {chunk[0][0]}-{chunk[-1][0]}: {e}"
+    except Exception as e:
+        logger.exception(f"Import chunk starting at row {chunk[0][0]} failed")
+        error = f"Rows {chunk[0][0]}-{chunk[-1][0]}: {e}"
+    else:
+        return True
+    # Earlier chunks are committed; stop here and report what was imported
+    report.stopped = error
+    report.add_row_errors(None, [('chunk', error)])
+    return False
+
+
+def _write_chunk(chunk, reception, user_id, report):
+
+    with mssql_db.transaction() as cursor:
+        prepared, row_numbers, supplier_id = _validate_chunk(
+            cursor, chunk, reception['supplier_id'], report
+        )
+        if not prepared or report.dry_run:
+            report.imported += len(prepared)
+            return
+        chunk_reception = dict(reception, supplier_id=supplier_id)
+        reception_id, results = insert_registration(cursor, chunk_reception, prepared, user_id)
+
+    report.imported += len(results)
+    report.reception_ids.append(reception_id)
+    for spec, result in zip(prepared, results):
+        index_sample(result['sample_id'], spec['description'], spec['part_number'], spec['barcode'])
+        container = spec['container'] or {}
+        for container_id, container_barcode in result['container_barcodes'].items():
+            index_container(container_id, container.get('description', ''), container_barcode)
+
+
+def import_samples(stream, filename, supplier=None, tracking_number='', user_id=1,
+                   chunk_size=IMPORT_CHUNK_SIZE, dry_run=False, progress=None, error_sink=None,
+                   max_errors=None):
+    """
+    Import samples from a CSV/XLSX stream. Each chunk is committed on its own;
+    with dry_run every chunk is validated but nothing is written.
+    progress(report) is called after each chunk; error_sink(entry) receives
+    row errors as they happen instead of collecting them on the report, where
+    at most max_errors are kept. If a chunk fails as a whole the import stops
+    and report.stopped says why.
+    Returns the ImportReport. Raises SampleImportError if the file cannot be read.
+    """
+    report = ImportReport(filename, dry_run, error_sink, max_errors)
+    chunk_size = max(1, min(int(chunk_size), MAX_BULK_SAMPLES))
+    lookup = ReferenceLookup()
+
+    supplier_id = lookup.supplier_id(supplier)
+    if supplier not in (None, '') and supplier_id is None:
+        raise SampleImportError(f'Unknown supplier "{supplier}"')
+    reception = {
+        'supplier_id': supplier_id,
+        'tracking_number': tracking_number or '',
+        'notes': f'Imported from {filename}'
+    }
+
+    chunk = []
+    for row_number, values in iter_import_rows(stream, filename):
+        report.rows += 1
+        spec, errors = row_to_spec(values, lookup)
+        if errors:
+            report.add_row_errors(row_number, errors)
+            continue
+        chunk.append((row_number, spec))
+
+        if len(chunk) >= chunk_size:
+            completed = _import_chunk(chunk, reception, user_id, report)
+            chunk = []
+            if progress:
+                progress(report)
+            if not completed:
+                break
+    else:
+        _import_chunk(chunk, reception, user_id, report)
+        if progress:
+            progress(report)
+
+    logger.info(f"Import of {filename}: {report.imported} imported, {report.failed} rows failed, "
+                f"{report.rows} rows in {time.time() - report.started:.1f}s"
+                f"{f' - stopped: {report.stopped}' if report.stopped else ''}")
+    return report
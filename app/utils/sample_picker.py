@@ -0,0 +1,52 @@
+"""
+Search predicates for sample pickers (SQL Server).
+
+Pickers page through samples with TOP and a SampleID cursor, so the search
+condition has to stay seekable: PartNumber and Barcode are matched by
+prefix, 'SMP-123' and bare numbers hit the primary key, and descriptions go
+through the trigram search index instead of a leading-wildcard LIKE while
+the index is warm.
+"""
+import re
+
+from app.utils.mssql_db import id_list_filter, id_list_param
+from app.utils.search_index import search_index, SAMPLE
+
+# Above this many index hits a search term is too unselective for an ID list
+# and the LIKE predicate is used instead
+SEARCH_CANDIDATE_LIMIT = 2000
+
+
+def like_prefix(term):
+    """Escape LIKE wildcards so term is matched literally as a prefix"""
+    return term.replace('[', '[[]').replace('%', '[%]').replace('_', '[_]') + '%'
+
+
+def picker_search_condition(search, alias='s'):
+    """
+    WHERE fragment for sample pickers. Returns (sql, params).
+    'SMP-123' is an exact SampleID lookup. Anything else matches PartNumber and
+    Barcode by prefix (index seeks), a bare number also matches the SampleID,
+    and descriptions are matched through the trigram index when it is warm.
+    """
+    smp_match = re.fullmatch(r'smp-?(\d+)', search, re.IGNORECASE)
+    if smp_match:
+        return f"{alias}.[SampleID] = ?", [int(smp_match.group(1))]
+
+    prefix = like_prefix(search)
+    clauses = [f"{alias}.[PartNumber] LIKE ?", f"{alias}.[Barcode] LIKE ?"]
+    params = [prefix, prefix]
+    if search.isdigit():
+        clauses.append(f"{alias}.[SampleID] = ?")
+        params.append(int(search))
+
+    candidate_ids = search_index.search(SAMPLE, search, limit=SEARCH_CANDIDATE_LIMIT + 1)
+    if candidate_ids is not None and len(candidate_ids) <= SEARCH_CANDIDATE_LIMIT:
+        if candidate_ids:
+            clauses.append(id_list_filter(f"{alias}.[SampleID]"))
+            params.append(id_list_param(candidate_ids))
+    else:
+        clauses.append(f"{alias}.[Description] LIKE ?")
+        params.append(f"%{search}%")
+
+    return "(" + " OR ".join(clauses) + ")", params
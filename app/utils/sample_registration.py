@@ -0,0 +1,504 @@
+"""
+Set-based sample registration for SQL Server.
+
+Registration takes one reception and a list of sample specs (the same keys as
+the POST /api/samples payload) and runs on the caller's transaction cursor.
+Everything is validated up front in one batch (check_against_database), then
+all rows are written with one more batch (insert_registration):
+
+    reception -> sample (MERGE ... OUTPUT maps spec index to SampleID)
+              -> samplestorage -> history -> sampleserialnumber
+              -> container / containersample
+
+Specs are shipped as JSON parameters and expanded with OPENJSON, so the batch
+size does not depend on the number of samples and stays under the 2100
+parameter limit.
+"""
+import json
+
+from app.utils.mssql_db import id_list_filter, id_list_param, fetch_result_sets
+from app.utils.serial_numbers import normalize_serial_numbers, serial_key, serial_list_param, EXISTING_SERIALS_QUERY
+from app.utils.sequences import next_sample_barcodes, next_container_barcodes
+
+# Upper bound for one bulk registration request
+MAX_BULK_SAMPLES = 1000
+
+DEFAULT_CONTAINER_CAPACITY = 50
+
+
+class RegistrationError(Exception):
+    """Validation failed - errors is a list of {'index', 'field', 'error'}"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(errors[0]['error'] if errors else 'Invalid registration')
+
+
+def _optional_int(value):
+    if value in (None, '', 'null', 'undefined'):
+        return None
+    return int(value)
+
+
+def _optional_date(value):
+    return value or None
+
+
+def prepare_reception(data):
+    """Reception fields shared by every sample in the registration"""
+    return {
+        'supplier_id': data.get('supplier'),
+        'tracking_number': data.get('trackingNumber', ''),
+        'notes': data.get('other', 'Registered via lab system')
+    }
+
+
+def prepare_specs(specs):
+    """
+    Normalize request specs. Raises RegistrationError listing every problem
+    found without touching the database.
+    """
+    if not specs:
+        raise RegistrationError([{'index': None, 'field': 'samples', 'error': 'At least one sample is required'}])
+    if len(specs) > MAX_BULK_SAMPLES:
+        raise RegistrationError([{
+            'index': None, 'field': 'samples',
+            'error': f'At most {MAX_BULK_SAMPLES} samples can be registered at once'
+        }])
+
+    errors = []
+    prepared = []
+    seen_serials = {}
+
+    for index, data in enumerate(specs):
+        def fail(field, error):
+            errors.append({'index': index, 'field': field, 'error': error})
+
+        if not data.get('description'):
+            fail('description', 'Description is required')
+
+        try:
+            amount = int(data.get('totalAmount', 1))
+            if amount <= 0:
+                fail('totalAmount', 'Amount must be greater than 0')
+        except (ValueError, TypeError):
+            amount = 0
+            fail('totalAmount', 'Amount must be a number')
+
+        ids = {}
+        for field, label in (('unit', 'Unit'), ('owner', 'Owner'), ('task', 'Task'), ('storageLocation', 'Location')):
+            try:
+                ids[field] = _optional_int(data.get(field))
+            except (ValueError, TypeError):
+                fail(field, f'{label} must be an ID')
+        if len(ids) < 4:
+            continue
+        unit_id, owner_id, task_id = ids['unit'], ids['owner'], ids['task']
+        location_id = ids['storageLocation'] or 1
+
+        has_serials = bool(data.get('hasSerialNumbers'))
+        serial_numbers = normalize_serial_numbers(data.get('serialNumbers', [])) if has_serials else []
+        for serial_number in serial_numbers:
+            # Case-insensitive, like the unique index on active serials
+            key = serial_key(serial_number)
+            if key in seen_serials:
+                fail('serialNumbers', f'Serial number "{serial_number}" is entered more than once')
+            seen_serials[key] = index
+
+        container = None
+        if data.get('storageOption') == 'container':
+            if data.get('useExistingContainer') and data.get('existingContainerId'):
+                try:
+                    container = {'existing_id': int(data.get('existingContainerId'))}
+                except (ValueError, TypeError):
+                    fail('existingContainerId', 'Container must be an ID')
+            else:
+                container_type_id = data.get('containerTypeId')
+                if container_type_id and str(container_type_id).isdigit():
+                    container_type_id = int(container_type_id)
+                if not container_type_id and not data.get('newContainerType'):
+                    fail('containerTypeId', 'Container type is required')
+                try:
+                    container_count = max(1, int(data.get('containerCount', 1)))
+                except (ValueError, TypeError):
+                    container_count = 1
+                    fail('containerCount', 'Container count must be a number')
+                container = {
+                    'type_id': container_type_id or None,
+                    'new_type': data.get('newContainerType'),
+                    'count': container_count,
+                    'description': data.get('containerDescription', ''),
+                    'is_mixed': bool(data.get('containerIsMixed', False))
+                }
+
+        prepared.append({
+            'index': index,
+            'description': data.get('description'),
+            'part_number': data.get('partNumber', ''),
+            # None until insert_registration draws one from the barcode sequence
+            'barcode': data.get('barcode') or None,
+            'is_unique': has_serials,
+            'type': (data.get('sampleType') or 'single').lower(),
+            'amount': amount,
+            'unit_id': unit_id,
+            'owner_id': owner_id,
+            'task_id': task_id,
+            'expire_date': _optional_date(data.get('expireDate')),
+            'location_id': location_id,
+            'serial_numbers': serial_numbers,
+            'container': container
+        })
+
+    if errors:
+        raise RegistrationError(errors)
+    return prepared
+
+
+def _supplier_param(supplier_id):
+    try:
+        supplier_id = _optional_int(supplier_id)
+    except (ValueError, TypeError):
+        return None
+    return supplier_id or None
+
+
+def check_against_database(cursor, prepared, supplier_id=None):
+    """
+    Validate supplier, serials, locations and existing containers in one
+    round trip (one result set per concern, regardless of the number of specs).
+    Returns the SupplierID to use - unknown suppliers register as internal.
+    """
+    # serial_key -> (spec index, serial as entered)
+    serial_owner = {}
+    for spec in prepared:
+        for serial_number in spec['serial_numbers']:
+            serial_owner[serial_key(serial_number)] = (spec['index'], serial_number)
+
+    requested = {}
+    for spec in prepared:
+        container = spec['container']
+        if container and 'existing_id' in container:
+            requested[container['existing_id']] = requested.get(container['existing_id'], 0) + spec['amount']
+
+    cursor.execute(f"""
+        SET NOCOUNT ON;
+        SELECT [SupplierID] FROM [supplier] WHERE [SupplierID] = ?;
+        {EXISTING_SERIALS_QUERY};
+        SELECT [LocationID] FROM [storagelocation] WHERE {id_list_filter('[LocationID]')};
+        SELECT [ContainerID], [ContainerCapacity], [CurrentAmount]
+        FROM [container]
+        WHERE {id_list_filter('[ContainerID]')};
+    """, (
+        _supplier_param(supplier_id),
+        serial_list_param(serial for _, serial in serial_owner.values()),
+        id_list_param({spec['location_id'] for spec in prepared}),
+        id_list_param(requested)
+    ))
+    supplier_rows, serial_rows, location_rows, container_rows = fetch_result_sets(cursor, 4)
+
+    errors = []
+    for row in serial_rows:
+        index, entered = serial_owner[serial_key(row[0])]
+        errors.append({
+            'index': index, 'field': 'serialNumbers',
+            'error': f'Serial number "{entered}" already exists in the system'
+        })
+
+    known_locations = {row[0] for row in location_rows}
+    for spec in prepared:
+        if spec['location_id'] not in known_locations:
+            errors.append({'index': spec['index'], 'field': 'storageLocation',
+                           'error': f"Storage location {spec['location_id']} not found"})
+
+    capacity = {row[0]: (row[1], row[2] or 0) for row in container_rows}
+    for spec in prepared:
+        container = spec['container']
+        if not container or 'existing_id' not in container:
+            continue
+        container_id = container['existing_id']
+        if container_id not in capacity:
+            errors.append({'index': spec['index'], 'field': 'existingContainerId',
+                           'error': f'Container {container_id} not found'})
+            continue
+        container_capacity, current_amount = capacity[container_id]
+        total_amount = requested[container_id]
+        if container_capacity and current_amount + total_amount > container_capacity:
+            errors.append({
+                'index': spec['index'], 'field': 'existingContainerId',
+                'error': f'Cannot add {total_amount} samples to container. Current: {current_amount}, '
+                         f'Capacity: {container_capacity}, Available: {container_capacity - current_amount}'
+            })
+
+    if errors:
+        raise RegistrationError(errors)
+    return supplier_rows[0][0] if supplier_rows else None
+
+
+def create_container_types(cursor, prepared, user_id):
+    """Create container types requested inline (newContainerType) and point the specs at them"""
+    for spec in prepared:
+        container = spec['container']
+        if not container or container.get('type_id') or not container.get('new_type'):
+            continue
+        new_type = container['new_type']
+        cursor.execute("""
+            INSERT INTO [containertype] ([TypeName], [Description], [DefaultCapacity])
+            OUTPUT INSERTED.ContainerTypeID
+            VALUES (?, ?, ?);
+            INSERT INTO [history] ([ActionType], [UserID], [Notes], [Timestamp])
+            VALUES ('Container type created', ?, ?, GETDATE());
+        """, (
+            new_type.get('typeName'),
+            new_type.get('description', ''),
+            int(new_type.get('capacity', DEFAULT_CONTAINER_CAPACITY)),
+            user_id,
+            f"Container type '{new_type.get('typeName')}' created"
+        ))
+        type_result = cursor.fetchone()
+        if not type_result:
+            raise Exception('Failed to create new container type')
+        container['type_id'] = type_result[0]
+
+
+_REGISTRATION_BATCH = """
+    SET NOCOUNT ON;
+    DECLARE @specs NVARCHAR(MAX) = ?, @serials NVARCHAR(MAX) = ?, @containers NVARCHAR(MAX) = ?;
+    DECLARE @reception_ids TABLE ([ReceptionID] INT);
+    DECLARE @samples TABLE ([RowIndex] INT PRIMARY KEY, [SampleID] INT);
+    DECLARE @storage TABLE ([SampleID] INT PRIMARY KEY, [StorageID] INT);
+    DECLARE @new_containers TABLE ([Seq] INT PRIMARY KEY, [ContainerID] INT);
+    DECLARE @requested TABLE ([ContainerID] INT PRIMARY KEY, [Amount] INT);
+    DECLARE @reserved TABLE ([ContainerID] INT);
+    DECLARE @reception_id INT;
+
+    -- Existing containers: the same guarded reserve as reserve_capacity, for all
+    -- of them at once. The capacity check in check_against_database is only
+    -- for early messages; this is what holds under concurrent registrations.
+    INSERT INTO @requested ([ContainerID], [Amount])
+    SELECT [ContainerID], SUM([Amount])
+    FROM OPENJSON(@containers) WITH ([ContainerID] INT, [Amount] INT)
+    WHERE [ContainerID] IS NOT NULL
+    GROUP BY [ContainerID];
+
+    UPDATE c
+    SET c.[CurrentAmount] = c.[CurrentAmount] + r.[Amount]
+    OUTPUT INSERTED.[ContainerID] INTO @reserved
+    FROM [container] c
+    JOIN @requested r ON r.[ContainerID] = c.[ContainerID]
+    WHERE ISNULL(c.[ContainerCapacity], 0) = 0 OR c.[CurrentAmount] + r.[Amount] <= c.[ContainerCapacity];
+
+    -- Containers that did not fit (empty when every reserve succeeded)
+    SELECT r.[ContainerID], r.[Amount], c.[ContainerCapacity], c.[CurrentAmount]
+    FROM @requested r
+    LEFT JOIN [container] c ON c.[ContainerID] = r.[ContainerID]
+    WHERE r.[ContainerID] NOT IN (SELECT [ContainerID] FROM @reserved);
+    IF (SELECT COUNT(*) FROM @reserved) <> (SELECT COUNT(*) FROM @requested)
+        RETURN;
+
+    INSERT INTO [reception] ([SupplierID], [ReceivedDate], [UserID], [TrackingNumber], [SourceType], [Notes])
+    OUTPUT INSERTED.[ReceptionID] INTO @reception_ids
+    VALUES (?, GETDATE(), ?, ?, ?, ?);
+    SELECT @reception_id = [ReceptionID] FROM @reception_ids;
+
+    MERGE INTO [sample] AS target
+    USING (
+        SELECT * FROM OPENJSON(@specs) WITH (
+            [RowIndex] INT, [Barcode] NVARCHAR(100), [PartNumber] NVARCHAR(100), [IsUnique] BIT,
+            [Type] NVARCHAR(50), [Description] NVARCHAR(500), [Amount] INT, [UnitID] INT,
+            [OwnerID] INT, [TaskID] INT, [ExpireDate] DATE
+        )
+    ) AS src
+    ON 1 = 0
+    WHEN NOT MATCHED THEN
+        INSERT ([Barcode], [PartNumber], [IsUnique], [Type], [Description], [Status],
+                [Amount], [UnitID], [OwnerID], [ReceptionID], [TaskID], [ExpireDate])
+        VALUES (src.[Barcode], src.[PartNumber], src.[IsUnique], src.[Type], src.[Description], 'In Storage',
+                src.[Amount], src.[UnitID], src.[OwnerID], @reception_id, src.[TaskID], src.[ExpireDate])
+    OUTPUT src.[RowIndex], INSERTED.[SampleID] INTO @samples;
+
+    INSERT INTO [samplestorage] ([SampleID], [LocationID], [AmountRemaining], [ExpireDate])
+    OUTPUT INSERTED.[SampleID], INSERTED.[StorageID] INTO @storage
+    SELECT ns.[SampleID], src.[LocationID], src.[Amount], src.[ExpireDate]
+    FROM @samples ns
+    JOIN OPENJSON(@specs) WITH ([RowIndex] INT, [LocationID] INT, [Amount] INT, [ExpireDate] DATE) src
+        ON src.[RowIndex] = ns.[RowIndex];
+
+    INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [Notes])
+    SELECT GETDATE(), 'Sample registered', ?, ns.[SampleID], src.[Notes]
+    FROM @samples ns
+    JOIN OPENJSON(@specs) WITH ([RowIndex] INT, [Notes] NVARCHAR(1000)) src
+        ON src.[RowIndex] = ns.[RowIndex];
+
+    INSERT INTO [sampleserialnumber] ([SampleID], [SerialNumber], [CreatedDate], [IsActive])
+    SELECT ns.[SampleID], src.[SerialNumber], GETDATE(), 1
+    FROM OPENJSON(@serials) WITH ([RowIndex] INT, [SerialNumber] NVARCHAR(255)) src
+    JOIN @samples ns ON ns.[RowIndex] = src.[RowIndex];
+
+    MERGE INTO [container] AS target
+    USING (
+        SELECT src.*, ISNULL(ct.[DefaultCapacity], {default_capacity}) AS [Capacity]
+        FROM OPENJSON(@containers) WITH (
+            [Seq] INT, [RowIndex] INT, [ContainerID] INT, [Barcode] NVARCHAR(100), [ContainerTypeID] INT,
+            [Description] NVARCHAR(500), [LocationID] INT, [IsMixed] BIT, [Amount] INT
+        ) src
+        LEFT JOIN [containertype] ct ON ct.[ContainerTypeID] = src.[ContainerTypeID]
+        WHERE src.[ContainerID] IS NULL
+    ) AS src
+    ON 1 = 0
+    WHEN NOT MATCHED THEN
+        INSERT ([Barcode], [ContainerTypeID], [Description], [LocationID], [ContainerCapacity], [IsMixed], [ContainerStatus])
+        VALUES (src.[Barcode], src.[ContainerTypeID], src.[Description], src.[LocationID], src.[Capacity], src.[IsMixed], 'Active')
+    OUTPUT src.[Seq], INSERTED.[ContainerID] INTO @new_containers;
+
+    INSERT INTO [containersample] ([ContainerID], [SampleStorageID], [Amount])
+    SELECT ISNULL(src.[ContainerID], nc.[ContainerID]), st.[StorageID], src.[Amount]
+    FROM OPENJSON(@containers) WITH ([Seq] INT, [RowIndex] INT, [ContainerID] INT, [Amount] INT) src
+    LEFT JOIN @new_containers nc ON nc.[Seq] = src.[Seq]
+    JOIN @samples ns ON ns.[RowIndex] = src.[RowIndex]
+    JOIN @storage st ON st.[SampleID] = ns.[SampleID]
+    WHERE ISNULL(src.[ContainerID], nc.[ContainerID]) IS NOT NULL;
+
+    -- Fill level of the new containers (existing ones were reserved above)
+    UPDATE c
+    SET c.[CurrentAmount] = c.[CurrentAmount] + a.[Amount]
+    FROM [container] c
+    JOIN (
+        SELECT nc.[ContainerID], SUM(src.[Amount]) AS [Amount]
+        FROM OPENJSON(@containers) WITH ([Seq] INT, [Amount] INT) src
+        JOIN @new_containers nc ON nc.[Seq] = src.[Seq]
+        GROUP BY nc.[ContainerID]
+    ) a ON a.[ContainerID] = c.[ContainerID];
+
+    SELECT @reception_id, ns.[RowIndex], ns.[SampleID], st.[StorageID], nc.[Seq], nc.[ContainerID],
+           u.[UnitName], sl.[LocationName], t.[TaskName]
+    FROM @samples ns
+    JOIN OPENJSON(@specs) WITH ([RowIndex] INT, [UnitID] INT, [LocationID] INT, [TaskID] INT) sp
+        ON sp.[RowIndex] = ns.[RowIndex]
+    LEFT JOIN [unit] u ON u.[UnitID] = sp.[UnitID]
+    LEFT JOIN [storagelocation] sl ON sl.[LocationID] = sp.[LocationID]
+    LEFT JOIN [task] t ON t.[TaskID] = sp.[TaskID]
+    LEFT JOIN @storage st ON st.[SampleID] = ns.[SampleID]
+    LEFT JOIN OPENJSON(@containers) WITH ([Seq] INT, [RowIndex] INT) c ON c.[RowIndex] = ns.[RowIndex]
+    LEFT JOIN @new_containers nc ON nc.[Seq] = c.[Seq]
+    ORDER BY ns.[RowIndex], nc.[Seq];
+""".replace('{default_capacity}', str(DEFAULT_CONTAINER_CAPACITY))
+
+
+def insert_registration(cursor, reception, prepared, user_id):
+    """
+    Write the reception and every prepared spec in one batch.
+    Returns (reception_id, results) with one result per spec in input order:
+    {'index', 'sample_id', 'storage_id', 'barcode', 'container_ids',
+     'container_barcodes', 'unit_name', 'location_name', 'task_name'}.
+    Raises RegistrationError, before writing anything, if an existing
+    container no longer has room (capacity is reserved with a guarded UPDATE).
+    """
+    # Generated barcodes are reserved only for specs that are actually written
+    missing = [spec for spec in prepared if not spec['barcode']]
+    for spec, barcode in zip(missing, next_sample_barcodes(len(missing))):
+        spec['barcode'] = barcode
+    new_container_count = sum(
+        spec['container']['count'] for spec in prepared
+        if spec['container'] and 'existing_id' not in spec['container']
+    )
+    new_container_barcodes = iter(next_container_barcodes(new_container_count))
+
+    spec_rows = []
+    serial_rows = []
+    container_rows = []
+    container_barcodes = {}
+    for spec in prepared:
+        index = spec['index']
+        spec_rows.append({
+            'RowIndex': index,
+            'Barcode': spec['barcode'],
+            'PartNumber': spec['part_number'],
+            'IsUnique': 1 if spec['is_unique'] else 0,
+            'Type': spec['type'],
+            'Description': spec['description'],
+            'Amount': spec['amount'],
+            'UnitID': spec['unit_id'],
+            'OwnerID': spec['owner_id'],
+            'TaskID': spec['task_id'],
+            'ExpireDate': spec['expire_date'],
+            'LocationID': spec['location_id'],
+            'Notes': f"Sample '{spec['description']}' registered with {spec['amount']} units"
+        })
+        serial_rows.extend({'RowIndex': index, 'SerialNumber': s} for s in spec['serial_numbers'])
+
+        container = spec['container']
+        if not container:
+            continue
+        if 'existing_id' in container:
+            container_rows.append({
+                'Seq': len(container_rows), 'RowIndex': index, 'ContainerID': container['existing_id'],
+                'Amount': spec['amount']
+            })
+            continue
+        for i in range(container['count']):
+            seq = len(container_rows)
+            barcode = next(new_container_barcodes)
+            container_barcodes[seq] = barcode
+            container_rows.append({
+                'Seq': seq, 'RowIndex': index, 'ContainerID': None, 'Barcode': barcode,
+                'ContainerTypeID': container['type_id'], 'Description': container['description'],
+                'LocationID': spec['location_id'], 'IsMixed': 1 if container['is_mixed'] else 0,
+                'Amount': spec['amount'] // container['count']
+            })
+
+    supplier_id = _supplier_param(reception['supplier_id'])
+    cursor.execute(_REGISTRATION_BATCH, (
+        json.dumps(spec_rows, default=str),
+        json.dumps(serial_rows),
+        json.dumps(container_rows),
+        supplier_id,
+        user_id,
+        reception['tracking_number'],
+        'External' if supplier_id else 'Internal',
+        reception['notes'],
+        user_id
+    ))
+    rejected = cursor.fetchall()
+    if rejected:
+        # Filled up since check_against_database; the caller's transaction rolls back
+        first_index = {}
+        for row in container_rows:
+            if row['ContainerID']:
+                first_index.setdefault(row['ContainerID'], row['RowIndex'])
+        raise RegistrationError([{
+            'index': first_index.get(container_id), 'field': 'existingContainerId',
+            'error': f'Container {container_id} not found' if capacity is None else
+                     f'Cannot add {requested} samples to container. Current: {current_amount}, '
+                     f'Capacity: {capacity}, Available: {capacity - current_amount}'
+        } for container_id, requested, capacity, current_amount in rejected])
+    cursor.nextset()
+    rows = cursor.fetchall()
+    if not rows:
+        raise Exception('Failed to create samples')
+
+    existing_containers = {row['RowIndex']: row['ContainerID'] for row in container_rows if row['ContainerID']}
+    by_index = {}
+    reception_id = rows[0][0]
+    for row in rows:
+        result = by_index.setdefault(row[1], {
+            'index': row[1],
+            'sample_id': row[2],
+            'storage_id': row[3],
+            'container_ids': [existing_containers[row[1]]] if row[1] in existing_containers else [],
+            'container_barcodes': {},
+            'unit_name': row[6],
+            'location_name': row[7],
+            'task_name': row[8]
+        })
+        if row[5] is not None:
+            result['container_ids'].append(row[5])
+            result['container_barcodes'][row[5]] = container_barcodes.get(row[4])
+
+    results = []
+    for spec in prepared:
+        result = by_index.get(spec['index'])
+        if not result:
+            raise Exception(f"Sample {spec['index']} was not created")
+        result['barcode'] = spec['barcode']
+        results.append(result)
+    return reception_id, results
@@ -0,0 +1,286 @@
+"""
+In-memory trigram index for sample, container, test, task and location search.
+
+The index maps lower-cased character trigrams to document IDs per document
+type. Searches intersect the posting sets of the query's trigrams, verify the
+substring against the stored text and return candidate IDs, which the routes
+then fetch by primary key instead of running LIKE '%term%' scans.
+
+Lifecycle:
+- warm_search_index() loads everything at startup (background thread)
+- write paths call index_sample/index_container/index_test/index_task/
+  remove_document
+- a daemon timer rebuilds the whole index periodically to pick up writes
+  made outside this process
+"""
+import os
+import threading
+import time
+import logging
+
+from app.utils.mssql_db import mssql_db
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 3
+REBUILD_INTERVAL = int(os.getenv('SEARCH_INDEX_REBUILD_SECONDS', '900'))
+WARM_BATCH_SIZE = 5000
+
+SAMPLE = 'sample'
+CONTAINER = 'container'
+TEST = 'test'
+LOCATION = 'location'
+TASK = 'task'
+DOC_TYPES = (SAMPLE, CONTAINER, TEST, LOCATION, TASK)
+
+
+def _normalize(text):
+    return ' '.join(str(text).lower().split()) if text is not None else ''
+
+
+def _match_rank(text, term):
+    """2 if a field equals term, 1 if a field starts with it, 0 for a substring match"""
+    fields = text.split('\x1f')
+    if term in fields:
+        return 2
+    return 1 if any(field.startswith(term) for field in fields) else 0
+
+
+def _ngrams(text):
+    if len(text) < NGRAM_SIZE:
+        return set()
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class TrigramIndex:
+    """Thread-safe trigram index keyed by (doc_type, doc_id)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {doc_type: {} for doc_type in DOC_TYPES}
+        self._texts = {doc_type: {} for doc_type in DOC_TYPES}
+        self._ready = False
+        self._rebuilding = False
+        self._pending = []
+        self.last_built = None
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def _add(self, postings, texts, doc_type, doc_id, fields):
+        text = '\x1f'.join(_normalize(f) for f in fields if f is not None)
+        old_text = texts[doc_type].get(doc_id)
+        if old_text is not None:
+            self._remove(postings, texts, doc_type, doc_id)
+        texts[doc_type][doc_id] = text
+        type_postings = postings[doc_type]
+        for gram in _ngrams(text):
+            type_postings.setdefault(gram, set()).add(doc_id)
+
+    def _remove(self, postings, texts, doc_type, doc_id):
+        text = texts[doc_type].pop(doc_id, None)
+        if text is None:
+            return
+        type_postings = postings[doc_type]
+        for gram in _ngrams(text):
+            ids = type_postings.get(gram)
+            if ids:
+                ids.discard(doc_id)
+                if not ids:
+                    del type_postings[gram]
+
+    def upsert(self, doc_type, doc_id, *fields):
+        """Add or replace a document. Fields are concatenated for matching."""
+        with self._lock:
+            self._add(self._postings, self._texts, doc_type, doc_id, fields)
+            if self._rebuilding:
+                self._pending.append(('upsert', doc_type, doc_id, fields))
+
+    def remove(self, doc_type, doc_id):
+        with self._lock:
+            self._remove(self._postings, self._texts, doc_type, doc_id)
+            if self._rebuilding:
+                self._pending.append(('remove', doc_type, doc_id, None))
+
+    def search(self, doc_type, term, limit=None, ranked=False):
+        """
+        Return matching IDs for doc_type, highest ID (newest) first.
+        With ranked, exact and prefix field matches come before substring
+        matches, so truncating to limit never drops a better match.
+        Returns None when the index is not ready so callers can fall back to SQL.
+        """
+        if not self._ready:
+            return None
+        term = _normalize(term)
+        if not term:
+            return []
+
+        with self._lock:
+            texts = self._texts[doc_type]
+            grams = _ngrams(term)
+            if grams:
+                type_postings = self._postings[doc_type]
+                posting_sets = [type_postings.get(gram) for gram in grams]
+                if not all(posting_sets):
+                    return []
+                posting_sets.sort(key=len)
+                candidates = set(posting_sets[0])
+                for ids in posting_sets[1:]:
+                    candidates &= ids
+                    if not candidates:
+                        return []
+                # Trigram hits can be false positives - verify the substring
+                matches = [doc_id for doc_id in candidates if term in texts.get(doc_id, '')]
+            else:
+                # Terms shorter than one trigram: scan stored texts
+                matches = [doc_id for doc_id, text in texts.items() if term in text]
+
+            if ranked:
+                matches.sort(key=lambda doc_id: (_match_rank(texts[doc_id], term), doc_id), reverse=True)
+            else:
+                matches.sort(reverse=True)
+        return matches[:limit] if limit else matches
+
+    def rebuild(self, loader):
+        """
+        Build a fresh index from loader(add) off-lock and swap it in.
+        Writes that arrive during the build are replayed on the new index.
+        """
+        with self._lock:
+            self._rebuilding = True
+            self._pending = []
+
+        postings = {doc_type: {} for doc_type in DOC_TYPES}
+        texts = {doc_type: {} for doc_type in DOC_TYPES}
+        try:
+            loader(lambda doc_type, doc_id, *fields: self._add(postings, texts, doc_type, doc_id, fields))
+        except Exception:
+            with self._lock:
+                self._rebuilding = False
+                self._pending = []
+            raise
+
+        with self._lock:
+            for action, doc_type, doc_id, fields in self._pending:
+                if action == 'upsert':
+                    self._add(postings, texts, doc_type, doc_id, fields)
+                else:
+                    self._remove(postings, texts, doc_type, doc_id)
+            self._postings = postings
+            self._texts = texts
+            self._pending = []
+            self._rebuilding = False
+            self._ready = True
+            self.last_built = time.time()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready,
+                'last_built': self.last_built,
+                'documents': {doc_type: len(self._texts[doc_type]) for doc_type in DOC_TYPES},
+                'ngrams': {doc_type: len(self._postings[doc_type]) for doc_type in DOC_TYPES}
+            }
+
+
+# Global instance
+search_index = TrigramIndex()
+
+
+# ---- Document builders (keep the indexed fields in one place) ----
+
+def index_sample(sample_id, description=None, part_number=None, barcode=None):
+    search_index.upsert(SAMPLE, sample_id, f"SMP-{sample_id}", description, part_number, barcode)
+
+
+def index_container(container_id, description=None, barcode=None):
+    search_index.upsert(CONTAINER, container_id, f"CNT-{container_id}", description, barcode)
+
+
+def index_test(test_id, test_no=None, test_name=None):
+    search_index.upsert(TEST, test_id, f"TST-{test_id}", test_no, test_name)
+
+
+def index_task(task_id, task_number=None, task_name=None):
+    search_index.upsert(TASK, task_id, f"TSK-{task_id}", task_number, task_name)
+
+
+def index_location(location_id, location_name=None, lab_name=None):
+    search_index.upsert(LOCATION, location_id, location_name, lab_name)
+
+
+def remove_document(doc_type, doc_id):
+    search_index.remove(doc_type, doc_id)
+
+
+def _stream_rows(cursor, query):
+    cursor.execute(query)
+    while True:
+        rows = cursor.fetchmany(WARM_BATCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
+
+def _load_from_database(add):
+    with mssql_db.get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for row in _stream_rows(cursor, "SELECT [SampleID], [Description], [PartNumber], [Barcode] FROM [sample]"):
+                add(SAMPLE, row[0], f"SMP-{row[0]}", row[1], row[2], row[3])
+            for row in _stream_rows(cursor, "SELECT [ContainerID], [Description], [Barcode] FROM [container]"):
+                add(CONTAINER, row[0], f"CNT-{row[0]}", row[1], row[2])
+            for row in _stream_rows(cursor, "SELECT [TestID], [TestNo], [TestName] FROM [test]"):
+                add(TEST, row[0], f"TST-{row[0]}", row[1], row[2])
+            for row in _stream_rows(cursor, "SELECT [TaskID], [TaskNumber], [TaskName] FROM [task]"):
+                add(TASK, row[0], f"TSK-{row[0]}", row[1], row[2])
+            for row in _stream_rows(cursor, """
+                SELECT sl.[LocationID], sl.[LocationName], lb.[LabName]
+                FROM [storagelocation] sl
+                LEFT JOIN [lab] lb ON sl.[LabID] = lb.[LabID]
+            """):
+                add(LOCATION, row[0], row[1], row[2])
+        finally:
+            cursor.close()
+
+
+def rebuild_search_index():
+    """Rebuild the whole index from the database"""
+    started = time.time()
+    try:
+        search_index.rebuild(_load_from_database)
+        logger.info(f"Search index rebuilt in {time.time() - started:.2f}s: {search_index.stats()['documents']}")
+    except Exception as e:
+        logger.error(f"Search index rebuild failed: {e}")
+
+
+def schedule_rebuild():
+    """Rebuild in the background, e.g. after bulk changes to locations"""
+    threading.Thread(target=rebuild_search_index, name='search-index-rebuild', daemon=True).start()
+
+
+_rebuild_timer = None
+
+
+def _periodic_rebuild():
+    global _rebuild_timer
+    rebuild_search_index()
+    _rebuild_timer = threading.Timer(REBUILD_INTERVAL, _periodic_rebuild)
+    _rebuild_timer.daemon = True
+    _rebuild_timer.start()
+
+
+def warm_search_index():
+    """
+    Warm the index at startup without blocking the app, then keep it fresh
+    with a periodic rebuild. Until the first build finishes, search() returns
+    None and callers use their SQL fallback.
+    """
+    global _rebuild_timer
+    if _rebuild_timer is not None:
+        return
+    _rebuild_timer = threading.Timer(0, _periodic_rebuild)
+    _rebuild_timer.daemon = True
+    _rebuild_timer.start()
@@ -0,0 +1,266 @@
+"""
+Block-allocated numbers for barcodes, task numbers and test numbers.
+
+Barcodes used to be built from timestamps (two registrations in the same
+second collided) or probed against the database one candidate at a time,
+and task and test numbers came from a MAX() scan over existing rows, so two
+concurrent creates got the same number. Numbers now come from a database
+sequence, handed out in blocks per process: one query reserves a block, and
+the numbers in it are given out from memory. Numbers left unused when the
+process stops are skipped; they only need to be unique, not gap-free.
+Task and test numbers are user-facing, so they use the smaller
+NUMBER_BLOCK_SIZE.
+
+SQL Server uses a SEQUENCE object via sp_sequence_get_range. The MySQL app
+uses a hi/lo table instead (call use_mysql_hilo(mysql) at startup).
+Sequences that replace existing numbering are seeded from the highest
+number in use when they are created, which is the only time it is scanned.
+"""
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_BLOCK_SIZE = int(os.getenv('SEQUENCE_BLOCK_SIZE', '100'))
+NUMBER_BLOCK_SIZE = int(os.getenv('NUMBER_BLOCK_SIZE', '10'))
+
+SAMPLE_BARCODE = 'SampleBarcodeSeq'
+CONTAINER_BARCODE = 'ContainerBarcodeSeq'
+LABEL_BARCODE = 'LabelBarcodeSeq'
+TASK_NUMBER = 'TaskNumberSeq'
+TEST_NUMBER = 'TestNumberSeq'
+
+BLOCK_SIZES = {
+    TASK_NUMBER: NUMBER_BLOCK_SIZE,
+    TEST_NUMBER: NUMBER_BLOCK_SIZE,
+}
+
+# Highest number already in use, read once when the sequence is created.
+# Test iterations (TST-001-1) are not base numbers and are skipped.
+MSSQL_SEEDS = {
+    TASK_NUMBER: """
+        SELECT MAX(TRY_CAST(SUBSTRING([TaskNumber], 5, 20) AS BIGINT))
+        FROM [task] WHERE [TaskNumber] LIKE 'TSK-%'
+    """,
+    TEST_NUMBER: """
+        SELECT MAX(TRY_CAST(SUBSTRING([TestNo], 5, 20) AS BIGINT))
+        FROM [test] WHERE [TestNo] LIKE 'TST-%' AND [TestNo] NOT LIKE 'TST-%-[0-9]%'
+    """,
+}
+
+MYSQL_SEEDS = {
+    TASK_NUMBER: ("""
+        SELECT MAX(CAST(SUBSTRING(TaskNumber, 5) AS UNSIGNED))
+        FROM task WHERE TaskNumber LIKE 'TSK-%%'
+    """, ()),
+    TEST_NUMBER: ("""
+        SELECT MAX(CAST(SUBSTRING(TestNo, 5) AS UNSIGNED))
+        FROM test WHERE TestNo LIKE 'TST-%%' AND TestNo NOT LIKE 'TST-%%-%%'
+    """, ()),
+}
+
+
+class BlockAllocator:
+    """Hands out numbers from blocks reserved with fetch_block(size) -> first number"""
+
+    def __init__(self, fetch_block, block_size=SEQUENCE_BLOCK_SIZE):
+        self.fetch_block = fetch_block
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def take(self, count=1):
+        """Return count unique numbers; queries only when the current block runs out"""
+        numbers = []
+        with self._lock:
+            while len(numbers) < count:
+                if self._next >= self._end:
+                    # Large requests reserve everything they need in one call
+                    size = max(self.block_size, count - len(numbers))
+                    self._next = int(self.fetch_block(size))
+                    self._end = self._next + size
+                available = min(self._end - self._next, count - len(numbers))
+                numbers.extend(range(self._next, self._next + available))
+                self._next += available
+        return numbers
+
+    def next(self):
+        return self.take(1)[0]
+
+    def peek(self):
+        """The number next() would return, without handing it out (reserves a block if needed)"""
+        with self._lock:
+            if self._next >= self._end:
+                self._next = int(self.fetch_block(self.block_size))
+                self._end = self._next + self.block_size
+            return self._next
+
+
+def mssql_sequence_block(sequence, seed=None):
+    """
+    Block source backed by a SQL Server SEQUENCE (created on first use if
+    missing). seed is a query for the highest number already in use; the new
+    sequence starts after it.
+    """
+    from app.utils.mssql_db import mssql_db
+
+    start = f"ISNULL(({seed}), 0) + 1" if seed else "1"
+    query = f"""
+        SET NOCOUNT ON;
+        IF OBJECT_ID(N'dbo.{sequence}', N'SO') IS NULL
+        BEGIN
+            DECLARE @start BIGINT = {start};
+            DECLARE @create NVARCHAR(200) = N'CREATE SEQUENCE [dbo].[{sequence}] AS BIGINT START WITH '
+                + CAST(@start AS NVARCHAR(20)) + N' INCREMENT BY 1';
+            BEGIN TRY
+                EXEC(@create);
+            END TRY
+            BEGIN CATCH
+                -- Another process created it first
+                IF ERROR_NUMBER() <> 2714 THROW;
+            END CATCH
+        END
+        DECLARE @first SQL_VARIANT;
+        EXEC sys.sp_sequence_get_range
+            @sequence_name = N'dbo.{sequence}',
+            @range_size = ?,
+            @range_first_value = @first OUTPUT;
+        SELECT CAST(@first AS BIGINT);
+    """
+
+    def fetch_block(size):
+        return mssql_db.execute_query(query, (size,), fetch_one=True)[0]
+    return fetch_block
+
+
+def mysql_hilo_block(mysql, sequence, seed=None):
+    """
+    Block source backed by a hi/lo row in [barcode_sequence] (MySQL).
+    Uses its own connection so reserving a block never commits the caller's transaction.
+    seed is (query, params) for the highest number already in use; it only
+    runs when the row is created.
+    """
+    def fetch_block(size):
+        conn = mysql.connect
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS barcode_sequence (
+                    Name VARCHAR(50) PRIMARY KEY,
+                    NextValue BIGINT NOT NULL
+                )
+            """)
+            # LAST_INSERT_ID(expr) makes the new value readable on this connection only
+            reserve = "UPDATE barcode_sequence SET NextValue = LAST_INSERT_ID(NextValue + %s) WHERE Name = %s"
+            if cursor.execute(reserve, (size, sequence)) == 0:
+                start = 1
+                if seed:
+                    cursor.execute(*seed)
+                    row = cursor.fetchone()
+                    start = (row[0] or 0) + 1 if row else 1
+                cursor.execute("INSERT IGNORE INTO barcode_sequence (Name, NextValue) VALUES (%s, %s)",
+                               (sequence, start))
+                cursor.execute(reserve, (size, sequence))
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            end = cursor.fetchone()[0]
+            conn.commit()
+            cursor.close()
+            return end - size
+        finally:
+            conn.close()
+    return fetch_block
+
+
+def _mssql_source(sequence):
+    return mssql_sequence_block(sequence, MSSQL_SEEDS.get(sequence))
+
+
+_block_source = _mssql_source
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def use_mysql_hilo(mysql):
+    """Switch the allocators to the MySQL hi/lo table (MySQL app startup)"""
+    global _block_source
+    with _allocators_lock:
+        _block_source = lambda sequence: mysql_hilo_block(mysql, sequence, MYSQL_SEEDS.get(sequence))
+        _allocators.clear()
+
+
+def get_allocator(sequence):
+    with _allocators_lock:
+        allocator = _allocators.get(sequence)
+        if allocator is None:
+            allocator = _allocators[sequence] = BlockAllocator(
+                _block_source(sequence), BLOCK_SIZES.get(sequence, SEQUENCE_BLOCK_SIZE)
+            )
+        return allocator
+
+
+def next_numbers(sequence, count=1):
+    return get_allocator(sequence).take(count)
+
+
+def next_sample_barcodes(count):
+    return [f"BC{number:08d}" for number in next_numbers(SAMPLE_BARCODE, count)]
+
+
+def next_sample_barcode():
+    return next_sample_barcodes(1)[0]
+
+
+def next_container_barcodes(count):
+    return [f"CNT{number:08d}" for number in next_numbers(CONTAINER_BARCODE, count)]
+
+
+def next_container_barcode():
+    return next_container_barcodes(1)[0]
+
+
+def next_task_number():
+    return f"TSK-{next_numbers(TASK_NUMBER)[0]:03d}"
+
+
+def next_test_number():
+    return f"TST-{next_numbers(TEST_NUMBER)[0]:03d}"
+
+
+def peek_test_number():
+    """The test number the next create will most likely get (for previews; not reserved)"""
+    return f"TST-{get_allocator(TEST_NUMBER).peek():03d}"
+
+
+def mysql_task_test_block(mysql, task_id):
+    """
+    Per-task test counter for the MySQL app (T<task><nn>.1). One hi/lo row per
+    task, seeded from the task's existing tests, so only that task's rows are
+    read and only once.
+    """
+    prefix = f"T{task_id}"
+    seed = ("""
+        SELECT MAX(CAST(SUBSTRING_INDEX(SUBSTRING(TestNo, %s), '.', 1) AS UNSIGNED))
+        FROM test WHERE TaskID = %s AND TestNo LIKE %s
+    """, (len(prefix) + 1, task_id, f"{prefix}%.%"))
+    return mysql_hilo_block(mysql, f"TaskTest{task_id}", seed)
+
+
+def _task_test_allocator(mysql, task_id):
+    # No block caching: numbers are per task, so a reserved block would mostly be skipped
+    key = f"TaskTest{task_id}"
+    with _allocators_lock:
+        allocator = _allocators.get(key)
+        if allocator is None:
+            allocator = _allocators[key] = BlockAllocator(mysql_task_test_block(mysql, task_id), 1)
+        return allocator
+
+
+def next_task_test_number(mysql, task_id):
+    return f"T{task_id}{_task_test_allocator(mysql, task_id).next():02d}.1"
+
+
+def peek_task_test_number(mysql, task_id):
+    """The per-task test number the next create will get (for previews; not reserved)"""
+    return f"T{task_id}{_task_test_allocator(mysql, task_id).peek():02d}.1"
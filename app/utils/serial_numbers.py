@@ -0,0 +1,146 @@
+"""
+Set-based serial number checks for SQL Server.
+
+A batch of serial numbers is sent as one JSON array parameter and joined
+against [sampleserialnumber] with OPENJSON, so validating 1000 serials is a
+single round trip instead of one query per serial. Duplicates inside the
+batch itself are found in Python before touching the database.
+
+The unique index on active serials uses the database's case-insensitive
+collation, so "ABC" and "abc" are the same serial. Python-side comparisons
+go through serial_key to agree with it.
+"""
+import json
+import logging
+
+from app.utils.mssql_db import mssql_db, id_list_filter, id_list_param
+
+logger = logging.getLogger(__name__)
+
+
+# Active serials from a JSON array parameter (see serial_list_param)
+EXISTING_SERIALS_QUERY = """
+    SELECT sn.[SerialNumber], sn.[SampleID], s.[Description]
+    FROM OPENJSON(?) WITH ([SerialNumber] NVARCHAR(255) '$') batch
+    JOIN [sampleserialnumber] sn ON sn.[SerialNumber] = batch.[SerialNumber] AND sn.[IsActive] = 1
+    JOIN [sample] s ON sn.[SampleID] = s.[SampleID]
+"""
+
+
+def serial_list_param(serial_numbers):
+    """Serialize serial numbers for EXISTING_SERIALS_QUERY"""
+    return json.dumps(list(serial_numbers))
+
+
+def normalize_serial_numbers(serial_numbers):
+    """Strip whitespace and drop empty entries, keeping the input order"""
+    return [str(s).strip() for s in serial_numbers or [] if s is not None and str(s).strip()]
+
+
+def serial_key(serial_number):
+    """Comparison key matching the database collation (trimmed, case-insensitive)"""
+    return str(serial_number).strip().casefold()
+
+
+def find_batch_duplicates(serial_numbers):
+    """Return the serial numbers that occur more than once in the batch"""
+    seen = set()
+    reported = set()
+    duplicates = []
+    for serial_number in serial_numbers:
+        key = serial_key(serial_number)
+        if key in seen and key not in reported:
+            duplicates.append(serial_number)
+            reported.add(key)
+        seen.add(key)
+    return duplicates
+
+
+def find_existing_serial_numbers(serial_numbers, exclude_sample_id=None, cursor=None):
+    """
+    Look up which serial numbers are already active on a sample.
+    Returns {serial_key(serial_number): (SampleID, Description)}.
+    Pass cursor to run inside an existing transaction.
+    """
+    unique_serials = list({serial_key(s): s for s in serial_numbers}.values())
+    if not unique_serials:
+        return {}
+
+    query = EXISTING_SERIALS_QUERY
+    params = [serial_list_param(unique_serials)]
+    if exclude_sample_id:
+        query += " WHERE sn.[SampleID] != ?"
+        params.append(exclude_sample_id)
+
+    if cursor is not None:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    else:
+        rows = mssql_db.execute_query(query, tuple(params), fetch_all=True)
+
+    existing = {}
+    for row in rows or []:
+        existing.setdefault(serial_key(row[0]), (row[1], row[2]))
+    return existing
+
+
+def validate_serial_numbers(serial_numbers, exclude_sample_id=None):
+    """
+    Validate a batch of serial numbers in one query.
+    Returns (validation_results, duplicates) with one result per input serial:
+    {'serial_number', 'valid', 'error'}.
+    """
+    checked = normalize_serial_numbers(serial_numbers)
+    existing = find_existing_serial_numbers(checked, exclude_sample_id)
+
+    validation_results = []
+    duplicates = []
+    seen = set()
+    for serial_number in serial_numbers:
+        key = serial_key(serial_number) if serial_number is not None else ''
+        error = None
+        if key in existing:
+            sample_id, description = existing[key]
+            error = f'Already used by sample {sample_id}: {description}'
+        elif key and key in seen:
+            error = 'Duplicate serial number in this batch'
+        seen.add(key)
+
+        if error:
+            duplicates.append(serial_number)
+        validation_results.append({
+            'serial_number': serial_number,
+            'valid': error is None,
+            'error': error
+        })
+
+    return validation_results, duplicates
+
+
+def fetch_serial_numbers(sample_ids, cursor=None):
+    """
+    Active serial numbers for many samples in one query.
+    Returns {sample_id: [serial, ...]} in registration order; samples without
+    serials are absent, so use .get(sample_id, []).
+    """
+    sample_ids = list(dict.fromkeys(sample_id for sample_id in sample_ids if sample_id is not None))
+    if not sample_ids:
+        return {}
+
+    query = f"""
+        SELECT [SampleID], [SerialNumber]
+        FROM [sampleserialnumber]
+        WHERE {id_list_filter('[SampleID]')} AND [IsActive] = 1
+        ORDER BY [SampleID], [CreatedDate]
+    """
+    params = (id_list_param(sample_ids),)
+    if cursor is not None:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    else:
+        rows = mssql_db.execute_query(query, params, fetch_all=True)
+
+    serials = {}
+    for row in rows or []:
+        serials.setdefault(row[0], []).append(row[1])
+    return serials
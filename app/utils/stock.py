@@ -0,0 +1,149 @@
+"""
+Guarded stock updates for [samplestorage].[AmountRemaining] (SQL Server).
+
+Allocations used to read AmountRemaining, check it in Python and subtract it
+later on another connection, so two technicians allocating from the same
+sample at once could overdraw it. Every change now goes through a single
+guarded statement:
+
+    UPDATE ... SET [AmountRemaining] = [AmountRemaining] - @amount
+    WHERE ... AND [AmountRemaining] >= @amount
+
+SQL Server re-checks the predicate on the row it updates, so the decrement
+and the check are atomic without serializable transactions or extra locks.
+Zero affected rows means someone else got there first: the stock is re-read
+and the update retried while enough is left, and InsufficientStockError is
+raised once it is not.
+"""
+import logging
+
+from app.utils.container_fill import reserve_capacity
+
+logger = logging.getLogger(__name__)
+
+STOCK_UPDATE_RETRIES = 5
+
+
+class InsufficientStockError(Exception):
+    """Not enough AmountRemaining (or allocated amount) for the requested change"""
+
+    def __init__(self, message, sample_id=None, requested=None, available=None):
+        self.sample_id = sample_id
+        self.requested = requested
+        self.available = available
+        super().__init__(message)
+
+
+_TAKE_STOCK = """
+    UPDATE ss
+    SET ss.[AmountRemaining] = ss.[AmountRemaining] - ?
+    OUTPUT INSERTED.[StorageID], INSERTED.[AmountRemaining]
+    FROM [samplestorage] ss
+    WHERE ss.[StorageID] = (
+        SELECT TOP 1 [StorageID] FROM [samplestorage]
+        WHERE [SampleID] = ? AND [AmountRemaining] >= ?
+        ORDER BY [StorageID]
+    )
+      AND ss.[AmountRemaining] >= ?
+"""
+
+_STOCK_LEVEL = """
+    SELECT s.[SampleID], s.[Amount], COUNT(ss.[StorageID]), ISNULL(MAX(ss.[AmountRemaining]), 0)
+    FROM [sample] s
+    LEFT JOIN [samplestorage] ss ON s.[SampleID] = ss.[SampleID]
+    WHERE s.[SampleID] = ?
+    GROUP BY s.[SampleID], s.[Amount]
+"""
+
+
+def take_stock(cursor, sample_id, amount, retries=STOCK_UPDATE_RETRIES):
+    """
+    Subtract amount from the sample's stock on the caller's cursor.
+    Returns (storage_id, amount_remaining); (None, None) for samples without a
+    storage row, which are checked against [sample].[Amount] but not tracked.
+    """
+    available = None
+    for attempt in range(retries):
+        cursor.execute(_TAKE_STOCK, (amount, sample_id, amount, amount))
+        row = cursor.fetchone()
+        if row:
+            return row[0], row[1]
+
+        cursor.execute(_STOCK_LEVEL, (sample_id,))
+        level = cursor.fetchone()
+        if not level:
+            raise InsufficientStockError(f'Sample with ID {sample_id} not found', sample_id, amount, None)
+        _, sample_amount, storage_rows, available = level
+        if storage_rows == 0:
+            available = sample_amount or 0
+            if available >= amount:
+                return None, None
+        if available < amount:
+            break
+        # Enough stock on re-read: a concurrent allocation changed the row between our lookup and update
+        logger.info(f"Stock for sample {sample_id} changed concurrently, retrying ({attempt + 1}/{retries})")
+
+    raise InsufficientStockError(
+        f'Insufficient amount available for sample {sample_id}. Requested: {amount}, available: {available}',
+        sample_id, amount, available
+    )
+
+
+def return_stock(cursor, sample_id, amount):
+    """Add amount back to the sample's first storage row; returns the new AmountRemaining or None"""
+    cursor.execute("""
+        UPDATE ss
+        SET ss.[AmountRemaining] = ss.[AmountRemaining] + ?
+        OUTPUT INSERTED.[AmountRemaining]
+        FROM [samplestorage] ss
+        WHERE ss.[StorageID] = (
+            SELECT TOP 1 [StorageID] FROM [samplestorage] WHERE [SampleID] = ? ORDER BY [StorageID]
+        )
+    """, (amount, sample_id))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def release_allocation(cursor, usage_id, amount):
+    """
+    Mark amount of a test allocation as handed back, guarded so two returns of
+    the same allocation cannot both succeed. Returns (test_id, sample_id).
+    """
+    cursor.execute("""
+        UPDATE [testsampleusage]
+        SET [AmountUsed] = ISNULL([AmountUsed], 0) + ?,
+            [Status] = CASE
+                WHEN ([AmountAllocated] - (ISNULL([AmountUsed], 0) + ?)) <= 0 THEN 'Completed'
+                ELSE [Status]
+            END
+        OUTPUT INSERTED.[TestID], INSERTED.[SampleID]
+        WHERE [UsageID] = ? AND ISNULL([AmountAllocated], 0) - ISNULL([AmountUsed], 0) >= ?
+    """, (amount, amount, usage_id, amount))
+    row = cursor.fetchone()
+    if row:
+        return row[0], row[1]
+
+    cursor.execute("""
+        SELECT ISNULL([AmountAllocated], 0) - ISNULL([AmountUsed], 0)
+        FROM [testsampleusage] WHERE [UsageID] = ?
+    """, (usage_id,))
+    level = cursor.fetchone()
+    if not level:
+        raise InsufficientStockError('Sample usage not found')
+    raise InsufficientStockError(f'Cannot return {amount}. Only {level[0]} available.', requested=amount, available=level[0])
+
+
+def add_to_container(cursor, container_id, storage_id, amount, force=False):
+    """
+    Insert a containersample row only if it fits the container's capacity.
+    The fit is checked and reserved with one guarded update of
+    [container].[CurrentAmount] (see container_fill), so concurrent adds to
+    the same container cannot overfill it. Returns True if the row was added.
+    """
+    if not reserve_capacity(cursor, container_id, amount, force):
+        return False
+    cursor.execute("""
+        INSERT INTO [containersample] ([ContainerID], [SampleStorageID], [Amount])
+        VALUES (?, ?, ?)
+    """, (container_id, storage_id, amount))
+    return True
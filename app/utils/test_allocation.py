@@ -0,0 +1,188 @@
+"""
+All-or-nothing allocation of samples to a test (SQL Server).
+
+Adding samples to a test used to take stock, insert the usage, update the
+sample and write history one sample at a time, re-reading the test number
+for each. The whole request is now one batch on the caller's transaction
+cursor:
+
+1. the requested amounts are totalled per sample and checked against stock
+   in one query, locking the storage rows that will be drawn from;
+2. if every sample has enough, stock is decremented with one guarded UPDATE
+   (the same AmountRemaining >= amount predicate as take_stock), all
+   testsampleusage rows are inserted with one MERGE ... OUTPUT and the
+   sample status and history rows follow set-wise.
+
+If any sample is short nothing is written and every shortage is reported.
+Like take_stock, each sample is drawn from its first storage row with
+enough stock; samples without a storage row are checked against
+[sample].[Amount] but not tracked.
+"""
+import json
+
+from app.utils.stock import InsufficientStockError
+
+MAX_TEST_ALLOCATION_SAMPLES = 1000
+
+
+class TestAllocationError(ValueError):
+    """The allocation request is invalid or the test does not exist"""
+
+    def __init__(self, message, status_code=400):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def parse_test_assignments(values):
+    """
+    Validate samples: [{sample_id, amount, notes}] (amount defaults to 1).
+    Returns [(sample_id, amount, notes)] in request order.
+    """
+    if not isinstance(values, list) or not values:
+        raise TestAllocationError('samples must be a non-empty list')
+    if len(values) > MAX_TEST_ALLOCATION_SAMPLES:
+        raise TestAllocationError(f'At most {MAX_TEST_ALLOCATION_SAMPLES} samples can be added at once')
+
+    assignments = []
+    for entry in values:
+        if not isinstance(entry, dict):
+            raise TestAllocationError('Each sample must be an object with a sample_id')
+        try:
+            sample_id = int(str(entry.get('sample_id')).upper().replace('SMP-', ''))
+        except ValueError:
+            raise TestAllocationError(f"Invalid sample ID: {entry.get('sample_id')}")
+        amount = entry.get('amount', 1)
+        try:
+            amount = int(amount)
+        except (ValueError, TypeError):
+            raise TestAllocationError(f'Invalid amount for sample SMP-{sample_id}')
+        if amount <= 0:
+            raise TestAllocationError(f'Amount for sample SMP-{sample_id} must be greater than 0')
+        assignments.append((sample_id, amount, entry.get('notes') or ''))
+    return assignments
+
+
+_ALLOCATE_BATCH = """
+    SET NOCOUNT ON;
+    DECLARE @test_id INT = ?, @items NVARCHAR(MAX) = ?, @user_id INT = ?;
+    DECLARE @test_found BIT = 0, @test_no NVARCHAR(100), @conflict BIT = 0;
+    DECLARE @requested TABLE ([RowIndex] INT PRIMARY KEY, [SampleID] INT, [Amount] INT, [Notes] NVARCHAR(MAX));
+    DECLARE @targets TABLE (
+        [SampleID] INT PRIMARY KEY, [Requested] INT, [StorageID] INT NULL,
+        [Found] BIT, [StorageRows] INT, [Available] INT
+    );
+    DECLARE @taken TABLE ([StorageID] INT);
+    DECLARE @usages TABLE ([RowIndex] INT PRIMARY KEY, [UsageID] INT);
+
+    SELECT @test_found = 1, @test_no = ISNULL([TestNo], CONCAT('T', @test_id))
+    FROM [test] WHERE [TestID] = @test_id;
+
+    INSERT INTO @requested ([RowIndex], [SampleID], [Amount], [Notes])
+    SELECT [RowIndex], [SampleID], [Amount], [Notes]
+    FROM OPENJSON(@items) WITH ([RowIndex] INT, [SampleID] INT, [Amount] INT, [Notes] NVARCHAR(MAX));
+
+    -- Availability for the whole set, per sample; the rows to draw from stay locked
+    INSERT INTO @targets ([SampleID], [Requested], [StorageID], [Found], [StorageRows], [Available])
+    SELECT t.[SampleID], t.[Requested], pick.[StorageID],
+           CASE WHEN s.[SampleID] IS NULL THEN 0 ELSE 1 END, lvl.[StorageRows],
+           CASE WHEN lvl.[StorageRows] = 0 THEN ISNULL(s.[Amount], 0) ELSE lvl.[MaxRemaining] END
+    FROM (SELECT [SampleID], SUM([Amount]) AS [Requested] FROM @requested GROUP BY [SampleID]) t
+    LEFT JOIN [sample] s ON s.[SampleID] = t.[SampleID]
+    OUTER APPLY (
+        SELECT TOP 1 [StorageID] FROM [samplestorage] WITH (UPDLOCK)
+        WHERE [SampleID] = t.[SampleID] AND [AmountRemaining] >= t.[Requested]
+        ORDER BY [StorageID]
+    ) pick
+    OUTER APPLY (
+        SELECT COUNT(*) AS [StorageRows], ISNULL(MAX([AmountRemaining]), 0) AS [MaxRemaining]
+        FROM [samplestorage] WHERE [SampleID] = t.[SampleID]
+    ) lvl;
+
+    IF @test_found = 1 AND NOT EXISTS (
+        SELECT 1 FROM @targets
+        WHERE [Found] = 0 OR ([StorageID] IS NULL AND ([StorageRows] > 0 OR [Available] < [Requested]))
+    )
+    BEGIN
+        UPDATE ss
+        SET ss.[AmountRemaining] = ss.[AmountRemaining] - t.[Requested]
+        OUTPUT INSERTED.[StorageID] INTO @taken
+        FROM [samplestorage] ss
+        JOIN @targets t ON t.[StorageID] = ss.[StorageID]
+        WHERE ss.[AmountRemaining] >= t.[Requested];
+
+        IF (SELECT COUNT(*) FROM @taken) <> (SELECT COUNT(*) FROM @targets WHERE [StorageID] IS NOT NULL)
+            SET @conflict = 1;
+        ELSE
+        BEGIN
+            MERGE INTO [testsampleusage] AS target
+            USING @requested AS src
+            ON 1 = 0
+            WHEN NOT MATCHED THEN
+                INSERT ([TestID], [SampleID], [SampleIdentifier], [AmountAllocated], [AmountUsed],
+                        [Status], [CreatedDate], [Notes], [CreatedBy])
+                VALUES (@test_id, src.[SampleID], CONCAT(@test_no, '_', src.[SampleID], '_', src.[Amount]),
+                        src.[Amount], 0, 'Allocated', GETDATE(), src.[Notes], @user_id)
+            OUTPUT src.[RowIndex], INSERTED.[UsageID] INTO @usages;
+
+            UPDATE s
+            SET s.[Status] = 'In Testing'
+            FROM [sample] s
+            JOIN @targets t ON t.[SampleID] = s.[SampleID];
+
+            INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [Notes])
+            SELECT GETDATE(), 'Sample added to test', @user_id, r.[SampleID],
+                   CONCAT(N'Sample ', r.[SampleID], N' added to test ', @test_id, N' with amount ', r.[Amount])
+            FROM @requested r
+            ORDER BY r.[RowIndex];
+        END
+    END
+
+    SELECT @test_found, @test_no, @conflict;
+    SELECT [SampleID], [Found], [Requested], [Available] FROM @targets
+    WHERE [Found] = 0 OR ([StorageID] IS NULL AND ([StorageRows] > 0 OR [Available] < [Requested]));
+    SELECT [RowIndex], [UsageID] FROM @usages ORDER BY [RowIndex];
+"""
+
+
+def allocate_samples(cursor, test_id, assignments, user_id):
+    """
+    Allocate every assignment to the test, or nothing. assignments comes from
+    parse_test_assignments. Returns [{'usage_id', 'sample_id', 'amount'}] in
+    request order. Raises InsufficientStockError (with .shortages listing every
+    short sample) when any sample lacks stock, TestAllocationError if the test
+    does not exist. Nothing has been written when either is raised.
+    """
+    cursor.execute(_ALLOCATE_BATCH, (
+        test_id,
+        json.dumps([{'RowIndex': index, 'SampleID': sample_id, 'Amount': amount, 'Notes': notes}
+                    for index, (sample_id, amount, notes) in enumerate(assignments)]),
+        user_id
+    ))
+    test_found, _, conflict = cursor.fetchone()
+    cursor.nextset()
+    shortages = [{
+        'sample_id': row[0],
+        'error': (f'Sample with ID {row[0]} not found' if not row[1] else
+                  f'Insufficient amount available for sample {row[0]}. Requested: {row[2]}, available: {row[3]}'),
+        'requested': row[2],
+        'available': row[3] if row[1] else None
+    } for row in cursor.fetchall()]
+    cursor.nextset()
+    usage_ids = {row[0]: row[1] for row in cursor.fetchall()}
+
+    if not test_found:
+        raise TestAllocationError(f'Test {test_id} not found', 404)
+    if shortages:
+        first = shortages[0]
+        error = InsufficientStockError(
+            '; '.join(shortage['error'] for shortage in shortages),
+            first['sample_id'], first['requested'], first['available']
+        )
+        error.shortages = shortages
+        raise error
+    if conflict:
+        # Stock rows are locked when picked, so this only happens if they changed outside the lock
+        raise InsufficientStockError('Stock changed while allocating, please try again')
+
+    return [{'usage_id': usage_ids[index], 'sample_id': sample_id, 'amount': amount}
+            for index, (sample_id, amount, _) in enumerate(assignments)]
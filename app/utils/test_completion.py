@@ -0,0 +1,209 @@
+"""
+Set-based test completion (SQL Server).
+
+Completing a test used to run half a dozen statements per sample usage, each
+on its own autocommitted connection, so a test with a few hundred samples
+took over a thousand round trips and could stop half-way. Completion now
+runs on the caller's transaction cursor in two batches:
+
+1. mark the test completed and load every requested usage, together with
+   the number of other active allocations of its sample;
+2. apply the outcomes computed in Python with one UPDATE per table, joined
+   against JSON array parameters (OPENJSON), and one multi-row history insert.
+
+Usages are applied in request order, as before: when one sample has several
+usages in the test, its final status is the outcome of the last one.
+"""
+import json
+
+
+class TestCompletionError(ValueError):
+    """The completion request is invalid (bad amounts, unknown test, ...)"""
+
+    def __init__(self, message, status_code=400):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def _non_negative_int(value, field, usage_id):
+    if value in (None, ''):
+        return 0
+    try:
+        value = int(value)
+    except (ValueError, TypeError):
+        raise TestCompletionError(f'Invalid {field} for usage {usage_id}')
+    if value < 0:
+        raise TestCompletionError(f'{field} for usage {usage_id} cannot be negative')
+    return value
+
+
+def parse_sample_completions(values):
+    """
+    Validate sample_completions: [{usage_id, amount_used, amount_returned, notes}].
+    Returns [{'usage_id', 'amount_used', 'amount_returned', 'notes'}] in request order.
+    """
+    if values is None:
+        return []
+    if not isinstance(values, list):
+        raise TestCompletionError('sample_completions must be a list')
+
+    completions = []
+    seen = set()
+    for entry in values:
+        if not isinstance(entry, dict):
+            raise TestCompletionError('Each sample completion must be an object')
+        try:
+            usage_id = int(entry.get('usage_id'))
+        except (ValueError, TypeError):
+            raise TestCompletionError(f"Invalid usage_id: {entry.get('usage_id')}")
+        if usage_id in seen:
+            raise TestCompletionError(f'Usage {usage_id} is listed more than once')
+        seen.add(usage_id)
+        completions.append({
+            'usage_id': usage_id,
+            'amount_used': _non_negative_int(entry.get('amount_used'), 'amount_used', usage_id),
+            'amount_returned': _non_negative_int(entry.get('amount_returned'), 'amount_returned', usage_id),
+            'notes': entry.get('notes') or ''
+        })
+    return completions
+
+
+_LOAD_BATCH = """
+    SET NOCOUNT ON;
+    DECLARE @test_id INT = ?, @usage_ids NVARCHAR(MAX) = ?;
+
+    UPDATE [test] SET [Status] = 'Completed' WHERE [TestID] = @test_id;
+    SELECT [TestNo] FROM [test] WHERE [TestID] = @test_id;
+
+    -- Other active allocations are counted after this test is marked completed
+    SELECT tu.[UsageID], tu.[SampleID], ISNULL(tu.[AmountAllocated], 0), ISNULL(tu.[AmountUsed], 0),
+           (SELECT COUNT(*)
+            FROM [testsampleusage] tsu
+            JOIN [test] t ON tsu.[TestID] = t.[TestID]
+            WHERE tsu.[SampleID] = tu.[SampleID]
+              AND t.[Status] != 'Completed'
+              AND tsu.[Status] IN ('Allocated', 'Active'))
+    FROM [testsampleusage] tu
+    WHERE tu.[TestID] = @test_id
+      AND tu.[UsageID] IN (SELECT CAST([value] AS INT) FROM OPENJSON(@usage_ids));
+"""
+
+_APPLY_BATCH = """
+    SET NOCOUNT ON;
+    DECLARE @usages NVARCHAR(MAX) = ?, @samples NVARCHAR(MAX) = ?, @history NVARCHAR(MAX) = ?,
+            @user_id INT = ?, @test_id INT = ?;
+
+    UPDATE tu
+    SET tu.[AmountUsed] = u.[AmountUsed], tu.[Status] = u.[Status], tu.[Notes] = u.[Notes]
+    FROM [testsampleusage] tu
+    JOIN OPENJSON(@usages) WITH (
+        [UsageID] INT, [AmountUsed] INT, [Status] NVARCHAR(50), [Notes] NVARCHAR(MAX)
+    ) u ON u.[UsageID] = tu.[UsageID];
+
+    UPDATE s
+    SET s.[Status] = c.[Status], s.[Amount] = s.[Amount] - c.[AmountConsumed]
+    FROM [sample] s
+    JOIN OPENJSON(@samples) WITH (
+        [SampleID] INT, [Status] NVARCHAR(50), [AmountConsumed] INT
+    ) c ON c.[SampleID] = s.[SampleID];
+
+    -- Consumed samples are zeroed on every storage row; returns go back to the first one
+    UPDATE ss
+    SET ss.[AmountRemaining] =
+        CASE WHEN c.[ResetStorage] = 1 THEN 0 ELSE ss.[AmountRemaining] END
+        + CASE WHEN ss.[StorageID] = f.[FirstStorageID] THEN c.[Returned] ELSE 0 END
+    FROM [samplestorage] ss
+    JOIN OPENJSON(@samples) WITH (
+        [SampleID] INT, [ResetStorage] BIT, [Returned] INT
+    ) c ON c.[SampleID] = ss.[SampleID]
+    JOIN (
+        SELECT [SampleID], MIN([StorageID]) AS [FirstStorageID] FROM [samplestorage] GROUP BY [SampleID]
+    ) f ON f.[SampleID] = ss.[SampleID]
+    WHERE c.[ResetStorage] = 1 OR c.[Returned] > 0;
+
+    INSERT INTO [history] ([Timestamp], [ActionType], [UserID], [SampleID], [TestID], [Notes])
+    SELECT GETDATE(), h.[ActionType], @user_id, h.[SampleID], @test_id, h.[Notes]
+    FROM OPENJSON(@history) WITH (
+        [Seq] INT, [ActionType] NVARCHAR(100), [SampleID] INT, [Notes] NVARCHAR(MAX)
+    ) h
+    ORDER BY h.[Seq];
+"""
+
+
+def complete_test(cursor, test_id, completions, user_id):
+    """
+    Mark a test completed and settle its sample usages in one transaction.
+    completions comes from parse_sample_completions. Returns
+    {'test_no', 'completed': [usage_id], 'skipped': [usage_id]} where skipped
+    usages do not belong to the test.
+    """
+    cursor.execute(_LOAD_BATCH, (test_id, json.dumps([c['usage_id'] for c in completions])))
+    test_row = cursor.fetchone()
+    if not test_row:
+        raise TestCompletionError(f'Test {test_id} not found', 404)
+    test_no = test_row[0] or f"TST-{test_id}"
+    cursor.nextset()
+    usages = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    usage_rows = []
+    samples = {}
+    history = []
+    completed = []
+    skipped = []
+    for completion in completions:
+        usage_id = completion['usage_id']
+        if usage_id not in usages:
+            skipped.append(usage_id)
+            continue
+        sample_id, amount_allocated, current_amount_used, other_active = usages[usage_id]
+        amount_used = completion['amount_used']
+        amount_returned = completion['amount_returned']
+        total_amount_used = current_amount_used + amount_used
+        fully_used = total_amount_used >= amount_allocated
+
+        usage_rows.append({
+            'UsageID': usage_id,
+            'AmountUsed': total_amount_used,
+            'Status': 'Completed' if fully_used else 'Partial',
+            'Notes': completion['notes']
+        })
+        completed.append(usage_id)
+
+        # Fold this usage into the sample's outcome: returns go back to storage
+        # first, a full consumption then zeroes it
+        sample = samples.setdefault(sample_id, {
+            'SampleID': sample_id, 'Status': None, 'AmountConsumed': 0, 'ResetStorage': 0, 'Returned': 0
+        })
+        sample['Returned'] += amount_returned
+        if fully_used:
+            sample['Status'] = 'Consumed'
+            sample['ResetStorage'] = 1
+            sample['Returned'] = 0
+            sample['AmountConsumed'] += amount_allocated
+            history.append({
+                'Seq': len(history), 'ActionType': 'Sample consumed', 'SampleID': sample_id,
+                'Notes': f"{amount_allocated}/{amount_allocated} of SMP-{sample_id} consumed in test {test_no}"
+            })
+        else:
+            sample['Status'] = 'In Testing' if other_active > 0 else 'In Storage'
+            sample['AmountConsumed'] += amount_used
+            if amount_used > 0:
+                history.append({
+                    'Seq': len(history), 'ActionType': 'Sample partially consumed', 'SampleID': sample_id,
+                    'Notes': f"{amount_used}/{amount_allocated} of SMP-{sample_id} consumed in test {test_no}, "
+                             f"{amount_returned} returned"
+                })
+
+    history.append({
+        'Seq': len(history), 'ActionType': 'Test completed', 'SampleID': None,
+        'Notes': f"Test {test_id} completed with {len(completions)} sample completions"
+    })
+
+    cursor.execute(_APPLY_BATCH, (
+        json.dumps(usage_rows),
+        json.dumps(list(samples.values())),
+        json.dumps(history),
+        user_id,
+        test_id
+    ))
+    return {'test_no': test_no, 'completed': completed, 'skipped': skipped}
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Import samples from a supplier manifest (CSV or XLSX) into SQL Server.
+
+    python import_samples_mssql.py manifest.xlsx --supplier "Acme" --report errors.csv
+    python import_samples_mssql.py manifest.csv --dry-run
+
+Rows are validated and registered in chunks; rows that fail are written to
+the report file (row, field, error) and the rest are imported.
+"""
+import argparse
+import csv
+import os
+import sys
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add app to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.sample_import import import_samples, SampleImportError, IMPORT_CHUNK_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import samples from a CSV/XLSX manifest')
+    parser.add_argument('file', help='CSV or XLSX file with a header row')
+    parser.add_argument('--supplier', help='Supplier name or ID (omit for internal samples)')
+    parser.add_argument('--tracking-number', default='', help='Tracking number for the reception')
+    parser.add_argument('--user-id', type=int, default=1, help='UserID recorded in history')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Rows per transaction')
+    parser.add_argument('--report', default='import_errors.csv', help='Where to write row errors')
+    parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+    args = parser.parse_args()
+
+    with open(args.report, 'w', newline='', encoding='utf-8') as report_file:
+        writer = csv.DictWriter(report_file, fieldnames=['row', 'field', 'error'])
+        writer.writeheader()
+
+        def show_progress(report):
+            print(f"  {report.rows} rows read, {report.imported} imported, {report.failed} failed", flush=True)
+
+        print(f"Importing {args.file}{' (dry run)' if args.dry_run else ''}...")
+        try:
+            with open(args.file, 'rb') as stream:
+                report = import_samples(
+                    stream,
+                    args.file,
+                    supplier=args.supplier,
+                    tracking_number=args.tracking_number,
+                    user_id=args.user_id,
+                    chunk_size=args.chunk_size,
+                    dry_run=args.dry_run,
+                    progress=show_progress,
+                    error_sink=writer.writerow
+                )
+        except SampleImportError as e:
+            print(f"❌ {e}")
+            return 1
+
+    summary = report.as_dict()
+    print(f"✅ {summary['imported']} of {summary['rows']} rows "
+          f"{'valid' if args.dry_run else 'imported'} in {summary['seconds']}s")
+    if report.stopped:
+        print(f"❌ Import stopped: {report.stopped}")
+        return 1
+    if report.failed:
+        print(f"⚠️  {report.failed} rows failed - see {args.report}")
+    return 0 if not report.failed else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+-- Performance indexes for LabSystem on SQL Server.
+-- Safe to re-run: every statement checks for an existing index first.
+-- Kør i SSMS / Azure Data Studio mod LabSystem databasen.
+
+-- ============================================================
+-- /samples listing: keyset pagination per sort key
+-- Every sort key is a raw column paired with SampleID as tiebreaker, so
+-- each index is (sort column, SampleID) and covers the seek predicate
+--   (key < @k OR key IS NULL OR (key = @k AND SampleID < @id))
+-- (NULLs sort first; the IS NULL arm is a second range on the same index)
+-- ============================================================
+
+-- sample_id: clustered primary key on [sample] already serves this sort.
+
+-- part_number
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_sample_PartNumber_SampleID' AND object_id = OBJECT_ID('dbo.sample'))
+    CREATE NONCLUSTERED INDEX [IX_sample_PartNumber_SampleID]
+        ON [dbo].[sample] ([PartNumber], [SampleID])
+        INCLUDE ([Description], [Status], [ReceptionID], [UnitID]);
+GO
+
+-- description
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_sample_Description_SampleID' AND object_id = OBJECT_ID('dbo.sample'))
+    CREATE NONCLUSTERED INDEX [IX_sample_Description_SampleID]
+        ON [dbo].[sample] ([Description], [SampleID])
+        INCLUDE ([PartNumber], [Status], [ReceptionID], [UnitID]);
+GO
+
+-- status (also serves the status filter)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_sample_Status_SampleID' AND object_id = OBJECT_ID('dbo.sample'))
+    CREATE NONCLUSTERED INDEX [IX_sample_Status_SampleID]
+        ON [dbo].[sample] ([Status], [SampleID])
+        INCLUDE ([PartNumber], [Description], [ReceptionID], [UnitID]);
+GO
+
+-- registered_date / reception_date: seek on reception, join back to sample
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_reception_ReceivedDate' AND object_id = OBJECT_ID('dbo.reception'))
+    CREATE NONCLUSTERED INDEX [IX_reception_ReceivedDate]
+        ON [dbo].[reception] ([ReceivedDate], [ReceptionID]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_sample_ReceptionID' AND object_id = OBJECT_ID('dbo.sample'))
+    CREATE NONCLUSTERED INDEX [IX_sample_ReceptionID]
+        ON [dbo].[sample] ([ReceptionID], [SampleID]);
+GO
+
+-- location / amount: drive from samplestorage; the listing joins it on SampleID.
+-- amount seeks IX_samplestorage_AmountRemaining_SampleID; location seeks
+-- storagelocation by name and then each location's samples in SampleID order.
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_samplestorage_SampleID' AND object_id = OBJECT_ID('dbo.samplestorage'))
+    CREATE NONCLUSTERED INDEX [IX_samplestorage_SampleID]
+        ON [dbo].[samplestorage] ([SampleID])
+        INCLUDE ([LocationID], [AmountRemaining]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_samplestorage_LocationID_SampleID' AND object_id = OBJECT_ID('dbo.samplestorage'))
+    CREATE NONCLUSTERED INDEX [IX_samplestorage_LocationID_SampleID]
+        ON [dbo].[samplestorage] ([LocationID], [SampleID])
+        INCLUDE ([AmountRemaining]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_samplestorage_AmountRemaining_SampleID' AND object_id = OBJECT_ID('dbo.samplestorage'))
+    CREATE NONCLUSTERED INDEX [IX_samplestorage_AmountRemaining_SampleID]
+        ON [dbo].[samplestorage] ([AmountRemaining], [SampleID])
+        INCLUDE ([LocationID]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_storagelocation_LocationName' AND object_id = OBJECT_ID('dbo.storagelocation'))
+    CREATE NONCLUSTERED INDEX [IX_storagelocation_LocationName]
+        ON [dbo].[storagelocation] ([LocationName], [LocationID]);
+GO
+
+-- ============================================================
+-- Sample pickers (/api/samples/available-for-task): search terms match
+-- PartNumber and Barcode by prefix, so both need a seekable index.
+-- PartNumber is served by IX_sample_PartNumber_SampleID above.
+-- ============================================================
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_sample_Barcode_SampleID' AND object_id = OBJECT_ID('dbo.sample'))
+    CREATE NONCLUSTERED INDEX [IX_sample_Barcode_SampleID]
+        ON [dbo].[sample] ([Barcode], [SampleID])
+        INCLUDE ([Status], [TaskID]);
+GO
+
+-- ============================================================
+-- Serial numbers: registration validates a whole batch with one join on
+-- SerialNumber, and an active serial may only belong to one sample.
+-- Skipped (with a message) while duplicate active serials exist - clean
+-- those up first and re-run.
+-- ============================================================
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_sampleserialnumber_SerialNumber_Active' AND object_id = OBJECT_ID('dbo.sampleserialnumber'))
+BEGIN
+    IF EXISTS (
+        SELECT [SerialNumber] FROM [dbo].[sampleserialnumber]
+        WHERE [IsActive] = 1
+        GROUP BY [SerialNumber] HAVING COUNT(*) > 1
+    )
+        PRINT 'Duplicate active serial numbers found - UX_sampleserialnumber_SerialNumber_Active not created';
+    ELSE
+        CREATE UNIQUE NONCLUSTERED INDEX [UX_sampleserialnumber_SerialNumber_Active]
+            ON [dbo].[sampleserialnumber] ([SerialNumber])
+            INCLUDE ([SampleID])
+            WHERE [IsActive] = 1;
+END
+GO
+
+-- ============================================================
+-- Barcode sequences (app/utils/sequences.py). The app reserves numbers in
+-- blocks with sp_sequence_get_range and creates missing sequences on first
+-- use; creating them here lets the app run without DDL permissions.
+-- ============================================================
+
+IF OBJECT_ID(N'dbo.SampleBarcodeSeq', N'SO') IS NULL
+    CREATE SEQUENCE [dbo].[SampleBarcodeSeq] AS BIGINT START WITH 1 INCREMENT BY 1;
+GO
+
+IF OBJECT_ID(N'dbo.ContainerBarcodeSeq', N'SO') IS NULL
+    CREATE SEQUENCE [dbo].[ContainerBarcodeSeq] AS BIGINT START WITH 1 INCREMENT BY 1;
+GO
+
+IF OBJECT_ID(N'dbo.LabelBarcodeSeq', N'SO') IS NULL
+    CREATE SEQUENCE [dbo].[LabelBarcodeSeq] AS BIGINT START WITH 1 INCREMENT BY 1;
+GO
+
+-- Task and test number sequences (TSK-001, TST-001). They continue from the
+-- highest number already in use; test iterations (TST-001-1) are skipped.
+IF OBJECT_ID(N'dbo.TaskNumberSeq', N'SO') IS NULL
+BEGIN
+    DECLARE @start BIGINT = ISNULL((
+        SELECT MAX(TRY_CAST(SUBSTRING([TaskNumber], 5, 20) AS BIGINT))
+        FROM [dbo].[task] WHERE [TaskNumber] LIKE 'TSK-%'
+    ), 0) + 1;
+    DECLARE @create NVARCHAR(200) = N'CREATE SEQUENCE [dbo].[TaskNumberSeq] AS BIGINT START WITH '
+        + CAST(@start AS NVARCHAR(20)) + N' INCREMENT BY 1';
+    EXEC(@create);
+END
+GO
+
+IF OBJECT_ID(N'dbo.TestNumberSeq', N'SO') IS NULL
+BEGIN
+    DECLARE @start BIGINT = ISNULL((
+        SELECT MAX(TRY_CAST(SUBSTRING([TestNo], 5, 20) AS BIGINT))
+        FROM [dbo].[test] WHERE [TestNo] LIKE 'TST-%' AND [TestNo] NOT LIKE 'TST-%-[0-9]%'
+    ), 0) + 1;
+    DECLARE @create NVARCHAR(200) = N'CREATE SEQUENCE [dbo].[TestNumberSeq] AS BIGINT START WITH '
+        + CAST(@start AS NVARCHAR(20)) + N' INCREMENT BY 1';
+    EXEC(@create);
+END
+GO
+
+-- ============================================================
+-- Maintained container fill level (app/utils/container_fill.py). Adds are
+-- checked with a guarded UPDATE on CurrentAmount instead of summing
+-- containersample per add. The backfill below is also the reconciliation:
+-- re-running it corrects any container whose total drifted.
+-- ============================================================
+
+IF COL_LENGTH('dbo.container', 'CurrentAmount') IS NULL
+    ALTER TABLE [dbo].[container]
+        ADD [CurrentAmount] INT NOT NULL CONSTRAINT [DF_container_CurrentAmount] DEFAULT 0;
+GO
+
+UPDATE c
+SET c.[CurrentAmount] = ISNULL(t.[Total], 0)
+FROM [dbo].[container] c
+LEFT JOIN (
+    SELECT [ContainerID], SUM([Amount]) AS [Total]
+    FROM [dbo].[containersample]
+    GROUP BY [ContainerID]
+) t ON t.[ContainerID] = c.[ContainerID]
+WHERE c.[CurrentAmount] <> ISNULL(t.[Total], 0);
+GO
+
+-- ============================================================
+-- /containers page: per-row sample counts and the "not in a container"
+-- check of the sample picker both seek containersample instead of scanning it
+-- ============================================================
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_containersample_ContainerID' AND object_id = OBJECT_ID('dbo.containersample'))
+    CREATE NONCLUSTERED INDEX [IX_containersample_ContainerID]
+        ON [dbo].[containersample] ([ContainerID])
+        INCLUDE ([SampleStorageID], [Amount]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_containersample_SampleStorageID' AND object_id = OBJECT_ID('dbo.containersample'))
+    CREATE NONCLUSTERED INDEX [IX_containersample_SampleStorageID]
+        ON [dbo].[containersample] ([SampleStorageID])
+        INCLUDE ([ContainerID]);
+GO
+
+-- ============================================================
+-- /testing page: active tests are paged by (CreatedDate, TestID) within
+-- the active statuses, and sample counts aggregate only the page's usages
+-- ============================================================
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_test_Status_CreatedDate_TestID' AND object_id = OBJECT_ID('dbo.test'))
+    CREATE NONCLUSTERED INDEX [IX_test_Status_CreatedDate_TestID]
+        ON [dbo].[test] ([Status], [CreatedDate], [TestID])
+        INCLUDE ([TestNo], [TestName], [UserID]);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_testsampleusage_TestID' AND object_id = OBJECT_ID('dbo.testsampleusage'))
+    CREATE NONCLUSTERED INDEX [IX_testsampleusage_TestID]
+        ON [dbo].[testsampleusage] ([TestID])
+        INCLUDE ([Status], [SampleID]);
+GO
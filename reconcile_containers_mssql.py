@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Check container.CurrentAmount against the containersample totals (SQL Server).
+
+    python reconcile_containers_mssql.py            # correct drifted containers
+    python reconcile_containers_mssql.py --dry-run  # only report them
+
+CurrentAmount is maintained by the app on every add and removal; this repairs
+containers changed outside it (manual SQL, old app versions).
+"""
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add app to path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.mssql_db import mssql_db
+from app.utils.container_fill import reconcile_container_amounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile container fill levels')
+    parser.add_argument('--dry-run', action='store_true', help='Report drift without correcting it')
+    args = parser.parse_args()
+
+    with mssql_db.transaction() as cursor:
+        drift = reconcile_container_amounts(cursor, fix=not args.dry_run)
+
+    if not drift:
+        print("✅ All container amounts match their contents")
+        return 0
+
+    for entry in drift:
+        print(f"  Container {entry['container_id']}: recorded {entry['recorded']}, actual {entry['actual']}")
+    if args.dry_run:
+        print(f"⚠️  {len(drift)} containers out of step - run without --dry-run to correct them")
+        return 2
+    print(f"✅ {len(drift)} containers corrected")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())